@@ -41,6 +41,8 @@ const Editor = () => {
     const [selectedBlockId, setSelectedBlockId] = useState(null);
     const [viewMode, setViewMode] = useState('desktop');
     const [sidebarTab, setSidebarTab] = useState('library'); // 'library' or 'settings'
+    const [showPreview, setShowPreview] = useState(false);
+    const [previewHtml, setPreviewHtml] = useState('');
 
     // Sidebar state for responsiveness
     const [sidebarOpen, setSidebarOpen] = useState(window.innerWidth > 1024);
@@ -55,6 +57,23 @@ const Editor = () => {
         return () => window.removeEventListener('resize', handleResize);
     }, [id]);
 
+    // Re-render the preview once edits pause; rendered in memory by the API, nothing is saved
+    useEffect(() => {
+        if (!showPreview) return;
+        const controller = new AbortController();
+        const timer = setTimeout(async () => {
+            try {
+                const response = await axios.post('http://localhost:8000/api/preview',
+                    { ...formData, title: formData.title || 'Untitled Page', body: '' },
+                    { signal: controller.signal, responseType: 'text' });
+                setPreviewHtml(response.data);
+            } catch (error) {
+                if (!axios.isCancel(error)) toast.error("Error rendering preview");
+            }
+        }, 400);
+        return () => { clearTimeout(timer); controller.abort(); };
+    }, [formData, showPreview]);
+
     const fetchPage = async () => {
         try {
             const response = await axios.get(`http://localhost:8000/api/pages/${id}`);
@@ -151,6 +170,14 @@ const Editor = () => {
                         ))}
                     </div>
 
+                    <button
+                        onClick={() => setShowPreview(!showPreview)}
+                        className={`flex h-9 md:h-10 items-center gap-2 rounded-lg border px-3 text-xs md:text-sm font-bold transition-all ${showPreview ? 'bg-primary border-primary text-white' : 'bg-white dark:bg-slate-800 border-slate-200 dark:border-slate-700 text-slate-500'}`}
+                    >
+                        <span className="material-symbols-outlined !text-[18px] md:!text-[20px]">{showPreview ? 'edit' : 'visibility'}</span>
+                        <span className="hidden md:inline">{showPreview ? 'Edit' : 'Preview'}</span>
+                    </button>
+
                     {/* Sidebar Toggle */}
                     <button
                         onClick={() => setSidebarOpen(!sidebarOpen)}
@@ -264,6 +291,13 @@ const Editor = () => {
 
                 {/* Center Panel: Live Canvas */}
                 <section className="flex-1 overflow-y-auto p-4 md:p-8 canvas-bg custom-scrollbar flex flex-col items-center">
+                    {showPreview ? (
+                        <iframe
+                            title="Page preview"
+                            srcDoc={previewHtml}
+                            className={`w-full flex-1 min-h-[80vh] rounded-xl border border-slate-200 dark:border-slate-800 bg-white shadow-xl transition-all duration-300 ${viewMode === 'mobile' ? 'max-w-[375px]' : viewMode === 'tablet' ? 'max-w-[768px]' : ''}`}
+                        />
+                    ) : (
                     <div className={`w-full transition-all duration-300 ${viewMode === 'mobile' ? 'max-w-[375px]' : viewMode === 'tablet' ? 'max-w-[768px]' : 'max-w-4xl'}`}>
                         {formData.blocks.length === 0 ? (
                             <div className="border-2 border-dashed border-slate-200 dark:border-slate-700 rounded-2xl p-10 md:p-20 text-center bg-white/50 dark:bg-slate-900/50 backdrop-blur-sm">
@@ -377,6 +411,7 @@ const Editor = () => {
                             <p className="mt-4 text-[10px] font-black uppercase tracking-widest text-slate-400 group-hover:text-primary transition-colors px-4 text-center">Tap to explore block library</p>
                         </div>
                     </div>
+                    )}
                 </section>
             </main>
         </div>
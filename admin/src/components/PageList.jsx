@@ -3,34 +3,39 @@ import { Link } from 'react-router-dom';
 import axios from 'axios';
 import { toast } from 'react-toastify';
 
+const PAGE_SIZE = 50;
+
 const PageList = () => {
     const [pages, setPages] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loading, setLoading] = useState(false);
     const [searchTerm, setSearchTerm] = useState('');
     const [filterStatus, setFilterStatus] = useState('All');
 
     useEffect(() => {
-        fetchPages();
-    }, []);
+        // Filtering happens server-side; wait for typing to pause before refetching
+        const timer = setTimeout(() => fetchPages(), searchTerm ? 300 : 0);
+        return () => clearTimeout(timer);
+    }, [searchTerm, filterStatus]);
 
-    const fetchPages = async () => {
+    const fetchPages = async (cursor = null) => {
+        const params = { limit: PAGE_SIZE };
+        if (cursor) params.cursor = cursor;
+        if (searchTerm) params.q = searchTerm;
+        if (filterStatus !== 'All') params.published = filterStatus === 'Published';
+        setLoading(true);
         try {
-            const response = await axios.get('http://localhost:8000/api/pages');
-            setPages(response.data);
+            const response = await axios.get('http://localhost:8000/api/pages/summary', { params });
+            setPages(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+            setNextCursor(response.data.next_cursor);
         } catch (error) {
             console.error("Error fetching pages", error);
             toast.error("Failed to load pages");
+        } finally {
+            setLoading(false);
         }
     };
 
-    const filteredPages = pages.filter(page => {
-        const matchesSearch = page.title.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            page.slug.toLowerCase().includes(searchTerm.toLowerCase());
-        const matchesStatus = filterStatus === 'All' ||
-            (filterStatus === 'Published' && page.is_published) ||
-            (filterStatus === 'Draft' && !page.is_published);
-        return matchesSearch && matchesStatus;
-    });
-
     return (
         <div className="min-h-screen bg-background-light dark:bg-background-dark">
             {/* Top Bar */}
@@ -85,7 +90,7 @@ const PageList = () => {
                                 </tr>
                             </thead>
                             <tbody className="divide-y divide-slate-100 dark:divide-slate-800">
-                                {filteredPages.map((page) => (
+                                {pages.map((page) => (
                                     <tr key={page.id} className="hover:bg-slate-50/80 dark:hover:bg-slate-800/50 transition-colors group">
                                         <td className="py-4 px-6">
                                             <div className="flex flex-col">
@@ -138,7 +143,7 @@ const PageList = () => {
                                         </td>
                                     </tr>
                                 ))}
-                                {filteredPages.length === 0 && (
+                                {pages.length === 0 && (
                                     <tr>
                                         <td colSpan="4" className="py-20 text-center">
                                             <div className="flex flex-col items-center justify-center text-slate-400">
@@ -152,6 +157,17 @@ const PageList = () => {
                             </tbody>
                         </table>
                     </div>
+                    {nextCursor && (
+                        <div className="border-t border-slate-100 dark:border-slate-800 p-4 flex justify-center">
+                            <button
+                                onClick={() => fetchPages(nextCursor)}
+                                disabled={loading}
+                                className="px-4 py-2 text-sm font-medium text-slate-600 dark:text-slate-300 bg-slate-50 dark:bg-slate-800 border border-slate-200 dark:border-slate-700 rounded-lg hover:bg-slate-100 transition-all disabled:opacity-50"
+                            >
+                                {loading ? 'Loading...' : 'Load more'}
+                            </button>
+                        </div>
+                    )}
                 </div>
             </div>
         </div>
@@ -0,0 +1,306 @@
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+import logging
+import platform
+import tempfile
+import subprocess
+import urllib.request
+from typing import Iterable, Optional
+
+from .releases import atomic_write, link_or_copy
+from .templating import TemplateRegistry
+
+logger = logging.getLogger(__name__)
+
+# Build stage for the site's CSS and JS. Instead of the Tailwind Play CDN
+# (which compiles CSS in every visitor's browser) and unpinned CDN scripts,
+# pages get one purged, minified stylesheet built by the Tailwind CLI from
+# the class names the templates and page blocks use, plus vendored copies of
+# the pinned JS libraries. Everything lands in assets/ under content-hashed
+# names, so it is served with an immutable Cache-Control. Builds never touch
+# the network: `python -m backend.assets fetch` downloads the pinned files
+# into VENDOR_DIR once, checking them against checksums. Without a Tailwind
+# binary or a vendored file, pages fall back to the pinned CDN URLs and the
+# build says so (once per process).
+ASSETS_DIR = "assets"
+TAILWIND_VERSION = "3.4.17"
+TAILWIND_RELEASE_URL = f"https://github.com/tailwindlabs/tailwindcss/releases/download/v{TAILWIND_VERSION}"
+# Tailwind v3 standalone CLI; without it the one `fetch` puts in VENDOR_DIR/bin,
+# then `tailwindcss` on PATH
+TAILWIND_BIN = os.getenv("TAILWIND_BIN", "")
+TAILWIND_CDN = f"https://cdn.tailwindcss.com/{TAILWIND_VERSION}"
+TAILWIND_TIMEOUT_SECONDS = 120
+TAILWIND_INPUT = "@tailwind base;\n@tailwind components;\n@tailwind utilities;\n"
+VENDOR_DIR = os.path.join(os.path.dirname(__file__), "vendor")
+# Template name -> (file in VENDOR_DIR, pinned upstream URL)
+VENDOR_ASSETS = {
+    "lucide_js": ("lucide-0.460.0.min.js", "https://unpkg.com/lucide@0.460.0/dist/umd/lucide.min.js"),
+    "swiper_css": ("swiper-bundle-11.1.15.min.css",
+                   "https://cdn.jsdelivr.net/npm/swiper@11.1.15/swiper-bundle.min.css"),
+    "swiper_js": ("swiper-bundle-11.1.15.min.js",
+                  "https://cdn.jsdelivr.net/npm/swiper@11.1.15/swiper-bundle.min.js"),
+}
+# "<sha256>  <file>" lines for everything `fetch` downloaded; commit it with
+# the files, so a later fetch only accepts the same bytes
+VENDOR_CHECKSUMS = os.path.join(VENDOR_DIR, "SHA256SUMS")
+FETCH_TIMEOUT_SECONDS = 60
+
+# Fallback warnings already logged by this process
+_warned = set()
+
+_CLASS_ATTR_RE = re.compile(r"""class\s*=\s*["']([^"']*)["']""", re.IGNORECASE)
+
+
+def cdn_assets() -> dict:
+    """Asset URLs for pages rendered without a build (previews): pinned CDNs."""
+    urls = {name: url for name, (_, url) in VENDOR_ASSETS.items()}
+    urls.update(css=None, tailwind_cdn=TAILWIND_CDN)
+    return urls
+
+
+def block_classes(page_blocks: list) -> list:
+    """Class names found in HTML inside block data (e.g. rich text)."""
+    classes = set()
+
+    def walk(value):
+        if isinstance(value, dict):
+            for item in value.values():
+                walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+        elif isinstance(value, str) and "class" in value:
+            for attr in _CLASS_ATTR_RE.findall(value):
+                classes.update(attr.split())
+
+    for block in page_blocks:
+        walk(block.get("data") or {})
+    return sorted(classes)
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _fingerprinted(name: str, digest: str) -> str:
+    # "name.<hash>.ext", the shape static.py serves as immutable
+    stem, ext = os.path.splitext(name)
+    return f"{ASSETS_DIR}/{stem}.{digest[:12]}{ext}"
+
+
+def _file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _template_sources(templates: TemplateRegistry) -> str:
+    # Tailwind scans these the way it would scan the template files
+    parts = []
+    for name in sorted(templates.hashes()):
+        with open(os.path.join(templates.template_dir, name), "r", encoding="utf-8") as f:
+            parts.append(f.read())
+    return "\n".join(parts)
+
+
+def _tailwind_binary_name() -> Optional[str]:
+    # Asset names of the standalone CLI releases
+    system = {"Linux": "linux", "Darwin": "macos", "Windows": "windows"}.get(platform.system())
+    machine = {"x86_64": "x64", "amd64": "x64", "arm64": "arm64", "aarch64": "arm64"}.get(platform.machine().lower())
+    if system is None or machine is None:
+        return None
+    return f"tailwindcss-{system}-{machine}" + (".exe" if system == "windows" else "")
+
+
+def tailwind_bin() -> str:
+    """The Tailwind CLI builds run, or "" when there is none."""
+    if TAILWIND_BIN:
+        return TAILWIND_BIN
+    name = _tailwind_binary_name()
+    vendored = os.path.join(VENDOR_DIR, "bin", name) if name else ""
+    if vendored and os.access(vendored, os.X_OK):
+        return vendored
+    return shutil.which("tailwindcss") or ""
+
+
+def _run_tailwind(binary: str, content: str) -> bytes:
+    with tempfile.TemporaryDirectory(prefix="staticcms-css-") as work:
+        content_path = os.path.join(work, "content.html")
+        input_path = os.path.join(work, "input.css")
+        output_path = os.path.join(work, "site.css")
+        with open(content_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write(TAILWIND_INPUT)
+        subprocess.run([binary, "-i", input_path, "-o", output_path, "--content", content_path, "--minify"],
+                       check=True, capture_output=True, timeout=TAILWIND_TIMEOUT_SECONDS, cwd=work)
+        with open(output_path, "rb") as f:
+            return f.read()
+
+
+def _build_css(output_dir: str, templates: TemplateRegistry, classes: list, previous: dict,
+               result: dict) -> Optional[str]:
+    binary = tailwind_bin()
+    if not binary:
+        _warn(result, "No Tailwind CLI found (run python -m backend.assets fetch or set TAILWIND_BIN): "
+                      "the site's CSS was not built and pages load the Tailwind Play CDN")
+        return None
+    inputs = _hash(TAILWIND_VERSION, TAILWIND_INPUT, templates.hashes(), classes)
+    css = previous.get("css")
+    # Same templates and classes as last build: the stylesheet can't differ
+    if previous.get("css_inputs") == inputs and css and os.path.exists(os.path.join(output_dir, css)):
+        result["css_inputs"] = inputs
+        return css
+    try:
+        data = _run_tailwind(binary, _template_sources(templates) + "\n" + " ".join(classes))
+    except (OSError, subprocess.SubprocessError) as e:
+        stderr = (getattr(e, "stderr", b"") or b"").decode("utf-8", "replace").strip()
+        _warn(result, f"Tailwind build failed, the site's CSS was not built and pages load the "
+                      f"Tailwind Play CDN: {e} {stderr}".strip())
+        return None
+    css = _fingerprinted("site.css", hashlib.sha256(data).hexdigest())
+    path = os.path.join(output_dir, css)
+    if not os.path.exists(path):
+        with atomic_write(path, "wb") as f:
+            f.write(data)
+        result["written"].append(css)
+        result["bytes_written"] += len(data)
+    result["css_inputs"] = inputs
+    return css
+
+
+def _warn(result: dict, message: str):
+    # Once per process: watch mode and the build queue would repeat it every build
+    if message in _warned:
+        return
+    _warned.add(message)
+    logger.error(message)
+    result["warnings"].append(message)
+
+
+def build_assets(output_dir: str, templates: TemplateRegistry, classes: Iterable[str],
+                 previous: Optional[dict] = None) -> dict:
+    """Write the site's CSS and vendored JS into ``output_dir``/assets.
+
+    ``classes`` are class names from page content, on top of those in the
+    templates. Returns ``{"urls", "css_inputs", "written", "removed",
+    "bytes_written", "warnings"}``; ``urls`` is what base.html links to and
+    ``warnings`` lists what fell back to a CDN, if not reported before.
+    """
+    previous = previous or {}
+    os.makedirs(os.path.join(output_dir, ASSETS_DIR), exist_ok=True)
+    result = {"urls": cdn_assets(), "css_inputs": None, "written": [], "removed": [], "bytes_written": 0,
+              "warnings": []}
+
+    for name, (file_name, _) in VENDOR_ASSETS.items():
+        source = os.path.join(VENDOR_DIR, file_name)
+        if not os.path.exists(source):
+            _warn(result, f"{file_name} is not vendored (run python -m backend.assets fetch), "
+                          "pages load it from the CDN")
+            continue
+        target = _fingerprinted(file_name, _file_digest(source))
+        path = os.path.join(output_dir, target)
+        if not os.path.exists(path):
+            link_or_copy(source, path)
+            result["written"].append(target)
+            result["bytes_written"] += os.path.getsize(path)
+        result["urls"][name] = target
+
+    result["urls"]["css"] = _build_css(output_dir, templates, sorted(set(classes)), previous, result)
+
+    # Files no page links to any more (older releases keep their own copies)
+    live = set(result["urls"].values())
+    assets_path = os.path.join(output_dir, ASSETS_DIR)
+    for name in os.listdir(assets_path):
+        rel = f"{ASSETS_DIR}/{name}"
+        if rel not in live and not name.endswith((".gz", ".br")):
+            os.remove(os.path.join(assets_path, name))
+            result["removed"].append(rel)
+    return result
+
+
+def _read_checksums() -> dict:
+    try:
+        with open(VENDOR_CHECKSUMS, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return {}
+    return {name: digest for digest, name in (line.split(None, 1) for line in lines if line.strip())}
+
+
+def _download(url: str) -> bytes:
+    with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT_SECONDS) as response:
+        return response.read()
+
+
+def _verified(name: str, data: bytes, expected: Optional[str]) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    if expected and digest != expected:
+        raise ValueError(f"Checksum mismatch for {name}: expected {expected}, got {digest}")
+    return digest
+
+
+def fetch_vendor_assets(force: bool = False, tailwind: bool = True) -> list:
+    """Download the pinned libraries and, with ``tailwind``, this platform's
+    Tailwind CLI into VENDOR_DIR; returns the files fetched.
+
+    Needs the network and is never called by builds. Files listed in
+    SHA256SUMS must match it, the Tailwind CLI must match the release's
+    published checksums, and new files are added to SHA256SUMS.
+    """
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    checksums = _read_checksums()
+    # (name in SHA256SUMS, URL, path, checksum published upstream)
+    wanted = [(file_name, url, os.path.join(VENDOR_DIR, file_name), None) for file_name, url in VENDOR_ASSETS.values()]
+    binary = _tailwind_binary_name() if tailwind else None
+    if tailwind and binary is None:
+        logger.warning("No Tailwind CLI build for %s %s; set TAILWIND_BIN", platform.system(), platform.machine())
+    upstream = {}
+    if binary is not None:
+        # sha256sums.txt lists every binary of the release
+        for line in _download(f"{TAILWIND_RELEASE_URL}/sha256sums.txt").decode("utf-8").splitlines():
+            if line.strip():
+                digest, name = line.split(None, 1)
+                upstream[name.lstrip("*./")] = digest
+        if binary not in upstream:
+            raise ValueError(f"{binary} is not in the Tailwind v{TAILWIND_VERSION} checksums")
+        wanted.append((f"bin/{binary}", f"{TAILWIND_RELEASE_URL}/{binary}", os.path.join(VENDOR_DIR, "bin", binary),
+                       upstream[binary]))
+
+    fetched = []
+    try:
+        for name, url, path, published in wanted:
+            if os.path.exists(path) and not force:
+                continue
+            data = _download(url)
+            checksums[name] = _verified(name, data, checksums.get(name) or published)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with atomic_write(path, "wb") as f:
+                f.write(data)
+            if name.startswith("bin/"):
+                os.chmod(path, 0o755)
+            fetched.append(name)
+    finally:
+        # Files fetched before a failure are kept, so record them as well
+        if fetched:
+            with atomic_write(VENDOR_CHECKSUMS) as f:
+                f.writelines(f"{digest}  {name}\n" for name, digest in sorted(checksums.items()))
+    return fetched
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Manage vendored site assets")
+    parser.add_argument("command", choices=["fetch"])
+    parser.add_argument("--force", action="store_true", help="Download again even if present")
+    parser.add_argument("--no-tailwind", action="store_true", help="Only the JS/CSS libraries, not the Tailwind CLI")
+    args = parser.parse_args(argv)
+    fetched = fetch_vendor_assets(force=args.force, tailwind=not args.no_tailwind)
+    print(f"Vendored {len(fetched)} file(s) into {VENDOR_DIR}" if fetched else "Vendored assets are up to date")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""Generator benchmark on synthetic sites.
+
+Seeds a throw-away SQLite database with N published pages built from a mix
+of every block type under ``templates/blocks`` and times ``run_build`` on it:
+a full build, a no-op incremental build and a one-page edit. Each scale runs
+in its own process so peak RSS is not inherited from the previous scale.
+
+    python -m backend.benchmark --scales 100 1000 5000 --workers 1 4
+    python -m backend.benchmark --compare bench-results/baseline.json
+
+Results are written as JSON for comparing runs.
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from . import models
+from .blocks import set_blocks
+from .generator import run_build
+from .templating import TEMPLATE_DIR
+
+DEFAULT_SCALES = [100, 1000]
+RESULTS_DIR = "bench-results"
+# Relative slowdown of pages/sec reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.10
+
+WORDS = (
+    "fast static site builder launch pricing team growth secure cloud design "
+    "product customer story simple modern reliable support global platform"
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _image(rng: random.Random) -> str:
+    return f"/output/uploads/bench-{rng.randint(1, 50)}.jpg"
+
+
+def _block_data(block_type: str, rng: random.Random) -> dict:
+    if block_type == "hero":
+        return {"headline": _text(rng, 5), "subheadline": _text(rng, 14), "image_url": _image(rng),
+                "cta_text": "Get started", "cta_link": "/index.html"}
+    if block_type == "slider":
+        return {"full_screen": rng.random() < 0.3, "slides": [
+            {"headline": _text(rng, 4), "subheadline": _text(rng, 10), "image_url": _image(rng),
+             "cta_text": "Learn more", "cta_link": "/index.html"}
+            for _ in range(rng.randint(2, 5))
+        ]}
+    if block_type == "pricing":
+        return {"plans": [
+            {"name": _text(rng, 1), "price": f"${rng.randint(5, 99)}", "isPopular": i == 1,
+             "features": [_text(rng, 4) for _ in range(rng.randint(3, 7))], "buttonText": "Choose"}
+            for i in range(3)
+        ]}
+    if block_type in ("features", "features_image"):
+        return {"section_title": _text(rng, 3), "section_subtitle": _text(rng, 10), "columns": 3, "features": [
+            {"title": _text(rng, 3), "description": _text(rng, 20), "icon": "zap",
+             "use_image": block_type == "features_image", "image_url": _image(rng)}
+            for _ in range(rng.randint(3, 6))
+        ]}
+    if block_type == "testimonial":
+        return {"testimonials": [
+            {"content": _text(rng, 25), "author": _text(rng, 2), "role": _text(rng, 2)}
+            for _ in range(3)
+        ]}
+    if block_type == "cta":
+        return {"headline": _text(rng, 5), "subheadline": _text(rng, 12), "button_text": "Contact us",
+                "button_link": "/index.html"}
+    if block_type == "banner":
+        return {"text": _text(rng, 8), "badge": "New", "link": "/index.html"}
+    if block_type == "text":
+        return {"content": "".join(f"<p>{_text(rng, 60)}</p>" for _ in range(rng.randint(2, 6)))}
+    return {}
+
+
+def block_types() -> list:
+    blocks_dir = os.path.join(TEMPLATE_DIR, "blocks")
+    return sorted(name[:-5] for name in os.listdir(blocks_dir) if name.endswith(".html"))
+
+
+def seed_site(db, pages: int, seed: int = 0):
+    rng = random.Random(seed)
+    types = block_types()
+    db.add(models.Menu(title="Main", items=json.dumps([
+        {"label": _text(rng, 1), "url": f"/page-{i}.html", "children": []} for i in range(6)
+    ]), cta_text="Sign up", cta_link="/index.html"))
+    db.add(models.Settings(brand_primary="#3b82f6", brand_hover="#2563eb"))
+    for i in range(pages):
+        blocks = []
+        for position in range(rng.randint(3, 8)):
+            block_type = rng.choice(types)
+            blocks.append({"id": f"{i}-{position}", "type": block_type, "data": _block_data(block_type, rng)})
+        page = models.Content(
+            title=f"Page {i}", slug=f"page-{i}", meta_description=_text(rng, 12),
+            is_published=True, is_homepage=(i == 0),
+        )
+        set_blocks(page, blocks)
+        db.add(page)
+    db.commit()
+
+
+def _peak_rss_kb() -> int:
+    if resource is None:
+        return 0
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return usage // 1024 if sys.platform == "darwin" else usage
+
+
+def _summarize(name: str, report: dict, pages: int) -> dict:
+    total = report["timings"]["total"]
+    rebuilt = len(report["rebuilt"])
+    return {
+        "run": name,
+        "pages": pages,
+        "rebuilt": rebuilt,
+        "seconds": total,
+        "pages_per_sec": rebuilt / total if total and rebuilt else 0.0,
+        "bytes_written": report["bytes_written"],
+        "timings": report["timings"],
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def run_scale(pages: int, workers: int, seed: int = 0) -> dict:
+    workdir = tempfile.mkdtemp(prefix="staticcms-bench-")
+    try:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+                               connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        seed_site(db, pages, seed)
+        output_dir = os.path.join(workdir, "output")
+
+        runs = [_summarize("full", run_build(db, force=True, workers=workers, output_dir=output_dir), pages),
+                _summarize("noop", run_build(db, workers=workers, output_dir=output_dir), pages)]
+
+        page = db.query(models.Content).filter(models.Content.slug == f"page-{pages // 2}").first()
+        page.meta_description = "Edited by the benchmark"
+        db.commit()
+        runs.append(_summarize("edit", run_build(db, workers=workers, output_dir=output_dir), pages))
+
+        db.close()
+        engine.dispose()
+        return {"pages": pages, "workers": workers, "runs": runs}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(previous: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """Return a line per run whose pages/sec dropped by more than ``threshold``."""
+    baseline = {
+        (r["pages"], r["workers"], run["run"]): run["pages_per_sec"]
+        for r in previous.get("results", []) for run in r["runs"]
+    }
+    regressions = []
+    for r in current["results"]:
+        for run in r["runs"]:
+            before = baseline.get((r["pages"], r["workers"], run["run"]))
+            if before and run["pages_per_sec"] < before * (1 - threshold):
+                regressions.append(
+                    f"{run['run']} build, {r['pages']} pages, {r['workers']} workers: "
+                    f"{before:.1f} -> {run['pages_per_sec']:.1f} pages/sec"
+                )
+    return regressions
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmark", description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="page counts to build")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="worker counts to try")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file (default: bench-results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--in-process", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.in_process:
+        # Child mode: one scale, result on stdout
+        print(json.dumps(run_scale(args.scales[0], args.workers[0], args.seed)))
+        return
+
+    results = []
+    for pages in args.scales:
+        for workers in args.workers:
+            child = subprocess.run(
+                [sys.executable, "-m", "backend.benchmark", "--in-process", "--scales", str(pages),
+                 "--workers", str(workers), "--seed", str(args.seed)],
+                capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            )
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+            results.append(result)
+            for run in result["runs"]:
+                t = run["timings"]
+                print(f"{pages:>6} pages {workers:>2}w {run['run']:>4}: {run['seconds']:.3f}s "
+                      f"{run['pages_per_sec']:>8.1f} pages/s  query {t['query']:.3f}  render {t['render']:.3f}  "
+                      f"write {t['write']:.3f}  sitemap {t['sitemap']:.3f}  "
+                      f"{run['bytes_written'] / 1024:.0f} KiB  rss {run['peak_rss_kb'] / 1024:.0f} MiB")
+
+    output = {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    path = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), output)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
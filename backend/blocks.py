@@ -0,0 +1,191 @@
+import json
+import uuid
+import hashlib
+import logging
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Pages' blocks live one row per block in content_blocks. Each row carries a
+# hash of its type and data, so saves only touch the blocks that changed and
+# builds can tell which pages changed without decoding any block JSON.
+SQLITE_MAX_VARIABLES = 500
+
+
+def block_hash(block_type: str, data) -> str:
+    payload = json.dumps({"type": block_type, "data": data}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def new_block_key() -> str:
+    return str(uuid.uuid4())
+
+
+def _new_row(key: str, position: int, block_type: str, data) -> models.ContentBlock:
+    return models.ContentBlock(key=key, position=position, type=block_type,
+                               data=json.dumps(data), hash=block_hash(block_type, data))
+
+
+def set_blocks(page: models.Content, blocks: list) -> bool:
+    """Make ``page``'s block rows match ``blocks`` (dicts shaped like schemas.Block).
+
+    Rows are matched by block id, so reordering or editing one block leaves
+    the other rows untouched. Returns True if anything changed.
+    """
+    by_key = {}
+    for row in page.block_rows:
+        by_key.setdefault(row.key, []).append(row)
+
+    changed = False
+    for position, block in enumerate(blocks):
+        key = str(block.get("id") or new_block_key())
+        block_type = block.get("type")
+        data = block.get("data") or {}
+        digest = block_hash(block_type, data)
+        rows = by_key.get(key)
+        if not rows:
+            page.block_rows.append(_new_row(key, position, block_type, data))
+            changed = True
+            continue
+        row = rows.pop(0)
+        if row.hash != digest or row.type != block_type:
+            row.type, row.data, row.hash = block_type, json.dumps(data), digest
+            changed = True
+        if row.position != position:
+            row.position = position
+            changed = True
+
+    for rows in by_key.values():
+        for row in rows:
+            page.block_rows.remove(row)
+            changed = True
+    return changed
+
+
+def insert_block(db: Session, page: models.Content, block_type: str, data, key: Optional[str] = None,
+                 position: Optional[int] = None) -> models.ContentBlock:
+    count = len(page.block_rows)
+    position = count if position is None else max(0, min(position, count))
+    for row in page.block_rows:
+        if row.position >= position:
+            row.position += 1
+    row = _new_row(key or new_block_key(), position, block_type, data)
+    page.block_rows.append(row)
+    db.flush()
+    return row
+
+
+def update_block(row: models.ContentBlock, block_type: Optional[str] = None, data: Optional[dict] = None,
+                 position: Optional[int] = None) -> bool:
+    """Patch one block. ``data`` is merged into the block's data (keys set to
+    None are removed); the page's other blocks are only touched by a move."""
+    changed = False
+    if block_type is not None or data is not None:
+        new_type = block_type if block_type is not None else row.type
+        new_data = json.loads(row.data or "{}")
+        for name, value in (data or {}).items():
+            if value is None:
+                new_data.pop(name, None)
+            else:
+                new_data[name] = value
+        digest = block_hash(new_type, new_data)
+        if digest != row.hash:
+            row.type, row.data, row.hash = new_type, json.dumps(new_data), digest
+            changed = True
+
+    if position is not None:
+        siblings = row.page.block_rows
+        position = max(0, min(position, len(siblings) - 1))
+        if position != row.position:
+            for other in siblings:
+                if other is row:
+                    continue
+                if row.position < other.position <= position:
+                    other.position -= 1
+                elif position <= other.position < row.position:
+                    other.position += 1
+            row.position = position
+            changed = True
+    return changed
+
+
+def delete_block(row: models.ContentBlock):
+    page = row.page
+    for other in page.block_rows:
+        if other.position > row.position:
+            other.position -= 1
+    page.block_rows.remove(row)
+
+
+def find_block(page: models.Content, key: str) -> Optional[models.ContentBlock]:
+    return next((row for row in page.block_rows if row.key == key), None)
+
+
+def block_response(row: models.ContentBlock) -> dict:
+    block = row.to_dict()
+    block.update(position=row.position, hash=row.hash)
+    return block
+
+
+def block_index(db: Session, published_only: bool = False, site_id: Optional[int] = None) -> dict:
+    """Map page id to its ``(type, hash)`` pairs in page order, without loading block data."""
+    query = db.query(models.ContentBlock.page_id, models.ContentBlock.type, models.ContentBlock.hash)
+    if published_only or site_id is not None:
+        query = query.join(models.Content, models.Content.id == models.ContentBlock.page_id)
+    if published_only:
+        query = query.filter(models.Content.is_published == True)
+    if site_id is not None:
+        query = query.filter(models.Content.site_id == site_id)
+    index = {}
+    for page_id, block_type, digest in query.order_by(models.ContentBlock.page_id, models.ContentBlock.position):
+        index.setdefault(page_id, []).append((block_type, digest))
+    return index
+
+
+def load_blocks(db: Session, page_ids: Iterable[int]) -> dict:
+    """Map page id to its decoded block list, for the given pages only."""
+    blocks = {}
+    query = db.query(models.ContentBlock.page_id, models.ContentBlock.key, models.ContentBlock.type,
+                     models.ContentBlock.data, models.ContentBlock.hash)
+    for chunk in _chunks(sorted(set(page_ids))):
+        rows = (query.filter(models.ContentBlock.page_id.in_(chunk))
+                .order_by(models.ContentBlock.page_id, models.ContentBlock.position))
+        for page_id, key, block_type, data, digest in rows:
+            try:
+                data = json.loads(data or "{}")
+            except ValueError:
+                data = {}
+            blocks.setdefault(page_id, []).append({"id": key, "type": block_type, "data": data, "hash": digest})
+    return blocks
+
+
+def _chunks(ids: list):
+    # Keep IN (...) lists under SQLite's bound-parameter limit
+    for start in range(0, len(ids), SQLITE_MAX_VARIABLES):
+        yield ids[start:start + SQLITE_MAX_VARIABLES]
+
+
+def migrate_legacy_blocks(db: Session) -> int:
+    """Move blocks still stored in the old Content.blocks JSON column into rows."""
+    pages = (db.query(models.Content)
+             .filter(models.Content.legacy_blocks.isnot(None))
+             .filter(models.Content.legacy_blocks.notin_(["", "[]"]))
+             .all())
+    migrated = 0
+    for page in pages:
+        try:
+            legacy = json.loads(page.legacy_blocks)
+        except ValueError:
+            logger.warning("Page %s has unreadable legacy blocks, left in place", page.id)
+            continue
+        if not page.block_rows:
+            set_blocks(page, [b for b in legacy if isinstance(b, dict) and b.get("type")])
+        page.legacy_blocks = "[]"
+        migrated += 1
+    if migrated:
+        db.commit()
+    return migrated
@@ -0,0 +1,214 @@
+import os
+import logging
+import threading
+import time
+import itertools
+from collections import deque
+from datetime import datetime
+from typing import Callable, Optional
+
+from .generator import run_build
+from .releases import rollback_release
+from .sites import DEFAULT_SITE_ID, build_target
+
+# Saves arriving within this window of each other are coalesced into one build
+BUILD_DEBOUNCE_SECONDS = float(os.getenv("BUILD_DEBOUNCE_SECONDS", "1.0"))
+# ...but a steady stream of saves cannot postpone a build forever
+BUILD_MAX_DELAY_SECONDS = float(os.getenv("BUILD_MAX_DELAY_SECONDS", "10.0"))
+BUILD_HISTORY_SIZE = int(os.getenv("BUILD_HISTORY_SIZE", "50"))
+# Builds of different sites run side by side, up to this many at once
+BUILD_CONCURRENCY = int(os.getenv("BUILD_CONCURRENCY", "2"))
+
+logger = logging.getLogger(__name__)
+
+
+class BuildJob:
+    def __init__(self, job_id: int, reason: str, force: bool = False, site_id: int = DEFAULT_SITE_ID):
+        self.id = job_id
+        self.site_id = site_id
+        self.status = "queued"
+        self.reasons = [reason]
+        self.force = force
+        self.requested_at = datetime.now()
+        self.last_requested_at = time.monotonic()
+        self.first_requested_at = self.last_requested_at
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.report: Optional[dict] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "site_id": self.site_id,
+            "status": self.status,
+            "reasons": list(self.reasons),
+            "force": self.force,
+            "requested_at": self.requested_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "report": self.report,
+            "error": self.error,
+        }
+
+
+class BuildScheduler:
+    """Worker threads that run site builds off the request path.
+
+    Write endpoints call ``request()`` and return immediately. Every site has
+    at most one queued build: requests made while it is queued join it, and
+    it waits for a quiet period before starting, so a burst of saves from
+    several editors becomes one build. Up to ``concurrency`` builds run at
+    once, never two of the same site (the workers and ``build_now()`` share a
+    lock per site). When builds of several sites are due, the site built
+    least recently goes first, so one busy or large site cannot hold the
+    others back; they also share the render pool fairly (see
+    generator._render_pages). The last BUILD_HISTORY_SIZE jobs, with their
+    build reports, are kept in memory.
+    """
+
+    def __init__(self, session_factory: Callable, debounce: float = BUILD_DEBOUNCE_SECONDS,
+                 max_delay: float = BUILD_MAX_DELAY_SECONDS, history_size: int = BUILD_HISTORY_SIZE,
+                 concurrency: int = BUILD_CONCURRENCY):
+        self.session_factory = session_factory
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.concurrency = max(1, concurrency)
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._site_locks = {}  # site_id -> lock held while that site builds or rolls back
+        self._pending = {}  # site_id -> queued BuildJob
+        self._running = set()  # site ids the workers are building
+        self._last_started = {}  # site_id -> when a worker last started one of its builds
+        self._history = deque(maxlen=history_size)
+        self._jobs = {}
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        with self._cond:
+            if any(thread.is_alive() for thread in self._threads):
+                return
+            self._stopping = False
+            self._threads = [threading.Thread(target=self._worker, name=f"build-scheduler-{n}", daemon=True)
+                             for n in range(self.concurrency)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def request(self, reason: str, force: bool = False, site_id: int = DEFAULT_SITE_ID) -> BuildJob:
+        self.start()
+        with self._cond:
+            job = self._pending.get(site_id)
+            if job is None:
+                job = BuildJob(next(self._ids), reason, force, site_id)
+                self._pending[site_id] = job
+                self._remember(job)
+            else:
+                job.reasons.append(reason)
+                job.force = job.force or force
+                job.last_requested_at = time.monotonic()
+            self._cond.notify_all()
+            return job
+
+    def build_now(self, db, force: bool = False, workers: Optional[int] = None,
+                  reason: str = "manual", site_id: int = DEFAULT_SITE_ID) -> BuildJob:
+        # Synchronous build for callers that need the report (e.g. /api/generate);
+        # it still goes into the history so every build report is kept
+        with self._cond:
+            job = BuildJob(next(self._ids), reason, force, site_id)
+            self._remember(job)
+        self._execute(job, db, workers)
+        return job
+
+    def rollback(self, site_id: int = DEFAULT_SITE_ID) -> Optional[str]:
+        # Swap the site's previous release back in; waits for a running build of it to finish
+        db = self.session_factory()
+        try:
+            output_dir, _ = build_target(db, site_id)
+        finally:
+            db.close()
+        with self._site_lock(site_id):
+            return rollback_release(output_dir)
+
+    def get(self, job_id: int) -> Optional[BuildJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def history(self, site_id: Optional[int] = None) -> list:
+        with self._cond:
+            return [job for job in reversed(self._history) if site_id is None or job.site_id == site_id]
+
+    def _site_lock(self, site_id: int) -> threading.Lock:
+        with self._cond:
+            lock = self._site_locks.get(site_id)
+            if lock is None:
+                lock = self._site_locks[site_id] = threading.Lock()
+            return lock
+
+    def _remember(self, job: BuildJob):
+        if len(self._history) == self._history.maxlen:
+            evicted = self._history[0]
+            self._jobs.pop(evicted.id, None)
+        self._history.append(job)
+        self._jobs[job.id] = job
+
+    def _due(self, job: BuildJob) -> float:
+        return min(job.last_requested_at + self.debounce, job.first_requested_at + self.max_delay)
+
+    def _next_job(self) -> Optional[BuildJob]:
+        with self._cond:
+            while not self._stopping:
+                now = time.monotonic()
+                # A site being built keeps collecting requests into its next job meanwhile
+                waiting = [job for site_id, job in self._pending.items() if site_id not in self._running]
+                due = [job for job in waiting if now >= self._due(job)]
+                if due:
+                    job = min(due, key=lambda j: (self._last_started.get(j.site_id, float("-inf")),
+                                                  j.first_requested_at))
+                    del self._pending[job.site_id]
+                    self._running.add(job.site_id)
+                    self._last_started[job.site_id] = now
+                    return job
+                self._cond.wait(min(self._due(job) for job in waiting) - now if waiting else None)
+            return None
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._running.discard(job.site_id)
+                    self._cond.notify_all()
+
+    def _run(self, job: BuildJob):
+        db = self.session_factory()
+        try:
+            self._execute(job, db)
+        finally:
+            db.close()
+
+    def _execute(self, job: BuildJob, db, workers: Optional[int] = None):
+        with self._site_lock(job.site_id):
+            job.status = "running"
+            job.started_at = datetime.now()
+            try:
+                job.report = run_build(db, force=job.force, workers=workers, site_id=job.site_id)
+                job.status = "success"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+                logger.error("Build %d of site %d failed: %s", job.id, job.site_id, e)
+            finally:
+                job.finished_at = datetime.now()
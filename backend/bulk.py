@@ -0,0 +1,213 @@
+import os
+import json
+import zipfile
+import logging
+from typing import AsyncIterator, BinaryIO, Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker, defer
+
+from . import models, schemas
+from .models import DEFAULT_SITE_ID
+from .blocks import set_blocks, load_blocks
+from .slugs import slugify, unique_slug
+
+logger = logging.getLogger(__name__)
+
+# Bulk page import/export as NDJSON: one schemas.PageImport object per line.
+# Imports are validated line by line and inserted in batched transactions;
+# exports stream in id order, a batch of rows at a time.
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+MAX_REPORTED_ERRORS = 100
+MAX_LINE_BYTES = 16 * 1024 * 1024
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class BulkImporter:
+    """Validates page records and inserts them in batches of ``batch_size``.
+
+    Feed it with ``add()`` (or ``add_line()``), then call ``finish()``.
+    Invalid records are skipped and reported rather than aborting the import.
+    """
+
+    def __init__(self, session_factory: sessionmaker, batch_size: int = BULK_BATCH_SIZE,
+                 site_id: int = DEFAULT_SITE_ID):
+        self.session_factory = session_factory
+        self.site_id = site_id
+        self.batch_size = max(1, batch_size)
+        self.batch = []
+        self.report = {"created": 0, "failed": 0, "errors": [], "ids": []}
+        self._taken = None
+
+    def error(self, source: str, error: str):
+        self.report["failed"] += 1
+        if len(self.report["errors"]) < MAX_REPORTED_ERRORS:
+            self.report["errors"].append({"source": source, "error": error})
+
+    def add(self, record, source: str):
+        try:
+            page = schemas.PageImport.model_validate(record)
+        except ValidationError as e:
+            self.error(source, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            return
+        self.batch.append((source, page))
+
+    def add_line(self, line: bytes, source: str):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            self.error(source, f"invalid JSON: {e}")
+            return
+        self.add(record, source)
+
+    def needs_flush(self) -> bool:
+        return len(self.batch) >= self.batch_size
+
+    def flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        db = self.session_factory()
+        try:
+            try:
+                self._insert(db, batch)
+            except IntegrityError:
+                # A slug was taken by a concurrent save: reload slugs and retry once
+                db.rollback()
+                self._taken = None
+                self._insert(db, batch)
+        except Exception as e:
+            db.rollback()
+            logger.exception("Bulk import batch failed")
+            for source, _ in batch:
+                self.error(source, f"batch failed: {e}")
+        finally:
+            db.close()
+
+    def _insert(self, db: Session, batch: list):
+        if self._taken is None:
+            self._taken = {slug for (slug,) in db.query(models.Content.slug)
+                           .filter(models.Content.site_id == self.site_id)}
+        taken = set(self._taken)
+        rows = []
+        for _, page in batch:
+            row = models.Content(
+                site_id=self.site_id,
+                title=page.title,
+                slug=unique_slug(slugify(page.slug or page.title), taken),
+                body=page.body,
+                meta_description=page.meta_description,
+                is_published=page.is_published,
+                is_homepage=page.is_homepage,
+                publish_at=page.publish_at,
+                unpublish_at=page.unpublish_at,
+            )
+            set_blocks(row, [b.model_dump() for b in page.blocks])
+            rows.append(row)
+        db.add_all(rows)
+        db.commit()
+        self._taken = taken
+        self.report["created"] += len(rows)
+        self.report["ids"].extend(row.id for row in rows)
+
+    def finish(self) -> dict:
+        self.flush()
+        return self.report
+
+
+async def import_ndjson(stream: AsyncIterator[bytes], importer: BulkImporter, run_sync) -> dict:
+    """Import NDJSON from an async byte stream (a request body).
+
+    ``run_sync`` runs the blocking batch inserts off the event loop
+    (e.g. starlette's run_in_threadpool).
+    """
+    buffer = b""
+    line_number = 0
+    skipping = False  # inside a line that was too long to buffer
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if skipping:
+                skipping = False
+                continue
+            importer.add_line(line, f"line {line_number}")
+            if importer.needs_flush():
+                await run_sync(importer.flush)
+        if len(buffer) > MAX_LINE_BYTES:
+            if not skipping:
+                importer.error(f"line {line_number + 1}", f"line exceeds {MAX_LINE_BYTES} bytes")
+            skipping, buffer = True, b""
+    if buffer.strip() and not skipping:
+        importer.add_line(buffer, f"line {line_number + 1}")
+    return await run_sync(importer.finish)
+
+
+def import_zip(file: BinaryIO, importer: BulkImporter) -> dict:
+    """Import a zip of ``*.json`` (one page, or a list of pages) and ``*.ndjson`` files. Blocking."""
+    with zipfile.ZipFile(file) as archive:
+        for info in sorted(archive.infolist(), key=lambda i: i.filename):
+            name = info.filename
+            if info.is_dir() or os.path.basename(name).startswith("."):
+                continue
+            if name.endswith(".ndjson"):
+                with archive.open(info) as f:
+                    for number, line in enumerate(f, 1):
+                        importer.add_line(line, f"{name}:{number}")
+                        if importer.needs_flush():
+                            importer.flush()
+            elif name.endswith(".json"):
+                try:
+                    with archive.open(info) as f:
+                        record = json.load(f)
+                except ValueError as e:
+                    importer.error(name, f"invalid JSON: {e}")
+                    continue
+                records = record if isinstance(record, list) else [record]
+                for index, item in enumerate(records):
+                    importer.add(item, name if len(records) == 1 else f"{name}[{index}]")
+                    if importer.needs_flush():
+                        importer.flush()
+    return importer.finish()
+
+
+def export_ndjson(session_factory: sessionmaker, published: Optional[bool] = None,
+                  batch_size: int = BULK_BATCH_SIZE, site_id: int = DEFAULT_SITE_ID) -> Iterator[bytes]:
+    """Yield every page of a site as an NDJSON line, reading ``batch_size`` rows at a time."""
+    db = session_factory()
+    try:
+        last_id = 0
+        while True:
+            query = (db.query(models.Content).options(defer(models.Content.legacy_blocks))
+                     .filter(models.Content.site_id == site_id, models.Content.id > last_id))
+            if published is not None:
+                query = query.filter(models.Content.is_published == published)
+            pages = query.order_by(models.Content.id).limit(batch_size).all()
+            if not pages:
+                return
+            page_blocks = load_blocks(db, [page.id for page in pages])
+            lines = []
+            for page in pages:
+                record = schemas.PageImport(
+                    title=page.title,
+                    slug=page.slug,
+                    body=page.body or "",
+                    blocks=[{k: v for k, v in b.items() if k != "hash"} for b in page_blocks.get(page.id, [])],
+                    meta_description=page.meta_description or "",
+                    is_published=bool(page.is_published),
+                    is_homepage=bool(page.is_homepage),
+                    publish_at=page.publish_at,
+                    unpublish_at=page.unpublish_at,
+                )
+                lines.append(record.model_dump_json() + "\n")
+            yield "".join(lines).encode("utf-8")
+            last_id = pages[-1].id
+            # Don't hold on to the rows already written out
+            db.expunge_all()
+    finally:
+        db.close()
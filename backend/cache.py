@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable
+
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Read-through cache for the admin's polled JSON endpoints. Entries are
+# tagged ("pages", "page:3", "menus", ...) and dropped by the write handlers
+# that change those rows. The cache is per process, so the TTL bounds how
+# stale a response can be when the database is written from elsewhere
+# (another API worker, the CLI, a script).
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+JSON_MEDIA_TYPE = "application/json"
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (body, etag, tags, expires)
+        self._generations = {}  # tag -> bumped on every invalidation
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(request: Request) -> str:
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        return f"{request.url.path}?{query}"
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key: str, body: bytes, etag: str, tags: tuple, generations: tuple):
+        with self._lock:
+            # A write landed while this response was being built: don't keep it
+            if tuple(self._generations.get(tag, 0) for tag in tags) != generations:
+                return
+            self._entries[key] = (body, etag, tags, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tags: str):
+        tags = set(tags)
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in [key for key, entry in self._entries.items() if tags.intersection(entry[2])]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    async def respond(self, request: Request, tags: Iterable[str], produce: Callable[[], Awaitable]) -> Response:
+        """Serve ``request`` from the cache, or build it with ``produce()`` and keep it.
+
+        Answers a matching If-None-Match with 304 either way.
+        """
+        tags = tuple(tags)
+        key = self.key_for(request)
+        entry = self._lookup(key)
+        if entry is None:
+            with self._lock:
+                generations = tuple(self._generations.get(tag, 0) for tag in tags)
+            content = jsonable_encoder(await produce())
+            body = json.dumps(content, separators=(",", ":")).encode("utf-8")
+            etag = _etag(body)
+            self._store(key, body, etag, tags, generations)
+        else:
+            body, etag = entry[0], entry[1]
+
+        headers = {"etag": etag, "cache-control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,124 @@
+import os
+import gzip
+import json
+import hashlib
+from typing import Optional
+
+from .releases import atomic_write, UPLOADS_NAME
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz siblings are written
+    brotli = None
+
+# Post-build stage: every text asset gets .gz (and .br when brotli is installed)
+# siblings so the server can send precompressed bytes without spending CPU,
+# plus a manifest of content hashes used for ETags.
+ASSET_MANIFEST_FILE = ".asset-manifest.json"
+COMPRESSIBLE_EXTENSIONS = (".html", ".xml", ".css", ".js", ".json", ".svg", ".txt")
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+GZIP_LEVEL = 9
+# 11 is the smallest output and most of a full build's time; 9-10 is several
+# times faster for a few percent more bytes (development, watch mode)
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "11"))
+
+
+def _load(output_dir: str) -> dict:
+    try:
+        with open(os.path.join(output_dir, ASSET_MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_asset_manifest(output_dir: str) -> dict:
+    return _load(output_dir).get("files", {})
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_variant(path: str, data: bytes) -> int:
+    with atomic_write(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def _compress(path: str, entry: dict) -> int:
+    with open(path, "rb") as f:
+        data = f.read()
+    written = 0
+    variants = {"gzip": gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=BROTLI_QUALITY)
+    for encoding, suffix in ENCODINGS.items():
+        compressed = variants.get(encoding)
+        variant_path = path + suffix
+        if compressed is None or len(compressed) >= len(data):
+            # Not worth serving; drop a stale sibling from an earlier build
+            if os.path.exists(variant_path):
+                os.remove(variant_path)
+            entry[encoding] = None
+            continue
+        written += _write_variant(variant_path, compressed)
+        entry[encoding] = len(compressed)
+    return written
+
+
+def _walk(output_dir: str):
+    for root, dirs, files in os.walk(output_dir):
+        if root == output_dir:
+            dirs[:] = [d for d in dirs if d != UPLOADS_NAME]
+        for name in files:
+            yield os.path.relpath(os.path.join(root, name), output_dir).replace(os.sep, "/")
+
+
+def precompress(output_dir: str, previous: Optional[dict] = None) -> dict:
+    """Write compressed siblings and the asset manifest for ``output_dir``.
+
+    Files whose inode, size and mtime match ``previous`` (the last manifest,
+    read from the staging copy by default) are neither re-hashed nor
+    re-compressed, so incremental builds only pay for the files they changed.
+    """
+    previous = _load(output_dir).get("files", {}) if previous is None else previous
+    files = {}
+    result = {"compressed": [], "bytes_written": 0}
+    names = set(_walk(output_dir))
+    for name in sorted(names):
+        if name.startswith(".") or not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            continue
+        path = os.path.join(output_dir, name)
+        st = os.stat(path)
+        stamp = [st.st_ino, st.st_size, st.st_mtime_ns]
+        old = previous.get(name)
+        if (old and old.get("stamp") == stamp
+                and all(old.get(enc) is None or f"{name}{suffix}" in names for enc, suffix in ENCODINGS.items())):
+            files[name] = old
+            continue
+        digest = _file_hash(path)
+        entry = {"hash": digest, "etag": f'"{digest[:32]}"', "size": st.st_size, "stamp": stamp}
+        if old and old.get("hash") == digest and old.get("gzip") is not None and f"{name}.gz" in names \
+                and (brotli is None or old.get("br") is None or f"{name}.br" in names):
+            # Same bytes rewritten (e.g. a forced build): siblings are still valid
+            entry["gzip"], entry["br"] = old.get("gzip"), old.get("br")
+        else:
+            result["bytes_written"] += _compress(path, entry)
+            result["compressed"].append(name)
+        files[name] = entry
+
+    # Siblings we wrote for files that are gone (other .gz files, e.g. sitemap shards, are left alone)
+    for name in names:
+        for suffix in ENCODINGS.values():
+            source = name[:-len(suffix)]
+            if name.endswith(suffix) and source in previous and source not in files:
+                os.remove(os.path.join(output_dir, name))
+
+    with atomic_write(os.path.join(output_dir, ASSET_MANIFEST_FILE)) as f:
+        json.dump({"version": 1, "files": files}, f, indent=1, sort_keys=True)
+    result["files"] = len(files)
+    return result
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from .releases import atomic_write
+
+# Rendered block HTML, keyed by everything the output depends on: the block
+# template (and what it includes), the block's type+data hash and the
+# render context the template actually reads. Identical blocks copied
+# across pages render once. Per process: an LRU in memory, plus an optional
+# directory shared by build workers that persists between builds.
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "4096"))
+# Empty disables the disk tier
+FRAGMENT_CACHE_DIR = os.getenv("FRAGMENT_CACHE_DIR", "")
+FRAGMENT_CACHE_MAX_AGE_DAYS = float(os.getenv("FRAGMENT_CACHE_MAX_AGE_DAYS", "14"))
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+def fragment_key(template_fingerprint: str, data_hash: str, context: dict) -> str:
+    payload = json.dumps([template_fingerprint, data_hash, context], sort_keys=True, separators=(",", ":"),
+                         default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class FragmentCache:
+    def __init__(self, max_entries: int = FRAGMENT_CACHE_SIZE, directory: Optional[str] = FRAGMENT_CACHE_DIR):
+        self.max_entries = max_entries
+        self.directory = directory or None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.html")
+
+    def get(self, key: str) -> tuple:
+        """Return ``(html, tier)``; tier is "memory", "disk" or None on a miss."""
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                return html, "memory"
+        if self.directory:
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    html = f.read()
+            except OSError:
+                return None, None
+            try:
+                # Recently used entries survive pruning
+                os.utime(path)
+            except OSError:
+                pass
+            self._remember(key, html)
+            return html, "disk"
+        return None, None
+
+    def put(self, key: str, html: str):
+        self._remember(key, html)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with atomic_write(path) as f:
+                f.write(html)
+
+    def _remember(self, key: str, html: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def prune(self, max_age_days: float = FRAGMENT_CACHE_MAX_AGE_DAYS, force: bool = False) -> int:
+        """Delete disk entries unused for ``max_age_days``; at most once an hour unless forced."""
+        now = time.time()
+        if not self.directory or (not force and now - self._last_prune < PRUNE_INTERVAL_SECONDS):
+            return 0
+        self._last_prune = now
+        cutoff = now - max_age_days * 86400
+        removed = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+_cache: Optional[FragmentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_fragment_cache() -> FragmentCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FragmentCache()
+    return _cache
@@ -1,109 +1,730 @@
 import os
 import json
-from jinja2 import Environment, FileSystemLoader
-from sqlalchemy.orm import Session
+import hashlib
+import time
+import atexit
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from sqlalchemy.orm import Session, defer
 from . import models
-import xml.etree.ElementTree as ET
+from . import metrics
+from .metrics import span, observe_stage
+from .templating import TemplateRegistry, get_registry
+from .sitemap import write_sitemaps, SITE_URL
+from .search import write_client_index
+from .assets import build_assets, block_classes, cdn_assets
+from .optimize import HTML_OPTIMIZE, FOLD_MARKER, optimize_page
+from .media import srcset_map, dimensions_map, UPLOADS_URL
+from .blocks import block_index, load_blocks, block_hash
+from .fragments import fragment_key, get_fragment_cache
+from .compress import precompress
+from .links import extract_links, check_links, file_checker
+from .redirects import redirect_map, write_redirects
+from .sites import OUTPUT_DIR, DEFAULT_SITE_ID, build_target
+from .releases import (
+    atomic_write, link_or_copy, ensure_output_dir, stage_release, activate_release, discard_release,
+    uploads_dir,
+)
 from datetime import datetime
+from typing import Iterable, Optional
 
-OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output")
-TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+logger = logging.getLogger(__name__)
 
-def run_build(db: Session):
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
+# Build manifest: remembers what every generated file was rendered from,
+# so a save only re-renders the pages whose inputs actually changed.
+MANIFEST_FILE = ".build-manifest.json"
+MANIFEST_VERSION = 1
 
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-    base_template = env.get_template("base.html")
+# Worker processes used for rendering; 1 keeps the build serial
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", "1"))
+PARALLEL_CHUNK_SIZE = 64
 
-    pages = db.query(models.Content).filter(models.Content.is_published == True).all()
-    
-    # improved: Fetch the first menu for navigation (or default empty)
-    menu_record = db.query(models.Menu).first()
+
+def _hash(*parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_manifest(output_dir: str) -> dict:
+    """The manifest of the build in ``output_dir``; empty if missing or from an older version."""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def _save_manifest(output_dir: str, manifest: dict):
+    with atomic_write(os.path.join(output_dir, MANIFEST_FILE)) as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def _page_dependencies(block_types: list) -> list:
+    # Dependency graph edge list: a page depends on the base layout and on
+    # the template of every block type it uses.
+    deps = {"base.html"}
+    for block_type in block_types:
+        if block_type:
+            deps.add(f"blocks/{block_type}.html")
+    return sorted(deps)
+
+
+def media_urls(page_blocks: list) -> list:
+    """Uploaded files the blocks reference (their srcsets feed the page hash)."""
+    urls = set()
+    stack = [block.get("data") for block in page_blocks if isinstance(block, dict)]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, str) and value.startswith(UPLOADS_URL):
+            urls.add(value)
+    return sorted(urls)
+
+
+def _page_hash(page, block_hashes: list, deps: list, templates: dict, site_hash: str,
+               media: Optional[dict] = None) -> str:
+    row = {
+        "id": page.id,
+        "title": page.title,
+        "slug": page.slug,
+        "meta_description": page.meta_description,
+        "body": page.body,
+        "created_at": page.created_at,
+    }
+    template_state = {name: templates.get(name) for name in deps}
+    return _hash(row, block_hashes, template_state, site_hash, media or {})
+
+
+def load_site_context(db: Session, site_id: int = DEFAULT_SITE_ID) -> dict:
+    """What every page of a site renders with: navigation, logo, call to action, brand colors and CDN asset URLs."""
+    # improved: Fetch the site's first menu for navigation (or default empty)
+    menu_record = db.query(models.Menu).filter(models.Menu.site_id == site_id).first()
     menu_items = []
     logo_url = None
     if menu_record:
         if menu_record.items:
             try:
                 menu_items = json.loads(menu_record.items)
-            except:
+            except ValueError:
                 pass
         logo_url = menu_record.logo_url
 
     # Fetch global UI Settings
-    ui_settings = db.query(models.Settings).first()
+    ui_settings = db.query(models.Settings).filter(models.Settings.site_id == site_id).first()
     brand_primary = ui_settings.brand_primary if ui_settings else "#3b82f6"
     brand_hover = ui_settings.brand_hover if ui_settings else "#2563eb"
-    
+
     # Fallback for brand colors if settings not found but menu has them
     if not ui_settings and menu_record:
         brand_primary = menu_record.cta_color or brand_primary
         brand_hover = menu_record.cta_hover_color or brand_hover
 
+    return {
+        "menu_items": menu_items,
+        "logo_url": logo_url,
+        "cta_text": menu_record.cta_text if menu_record else None,
+        "cta_link": menu_record.cta_link if menu_record else None,
+        "cta_color": brand_primary,
+        "cta_hover_color": brand_hover,
+        # Builds replace these with the built stylesheet and vendored scripts
+        "assets": cdn_assets(),
+    }
+
+
+def _page_payload(page, page_blocks: list, media: Optional[dict] = None, dimensions: Optional[dict] = None,
+                  optimize: bool = False) -> dict:
+    # Plain-data view of a page, cheap to pickle for render workers
+    return {
+        "id": page.id,
+        "title": page.title,
+        "slug": page.slug,
+        "meta_description": page.meta_description,
+        "body": page.body,
+        "created_at": page.created_at,
+        "blocks": page_blocks,
+        "media": media or {},
+        "dimensions": dimensions or {},
+        "optimize": optimize,
+    }
+
+
+def _brand_key(site: dict) -> dict:
+    return {"primary": site.get("cta_color"), "hover": site.get("cta_hover_color")}
+
+
+def _render_block(templates: TemplateRegistry, block: dict, block_id: str, page_media: dict, brand: dict,
+                  stats: dict) -> tuple:
+    # Returns (html, came from the fragment cache)
+    block_template = templates.block(block['type'])
+    template_name = block_template.name
+    fingerprint = templates.fingerprint(template_name)
+    if fingerprint is None:
+        return block_template.render(data=block['data'], block_id=block_id, media=page_media), False
+
+    # Only what this template reads goes into the key: block_id differs per
+    # position, so blocks that use it (slider, banner) are cached per position
+    variables = templates.variables(template_name)
+    context = {"brand": brand}
+    if "block_id" in variables:
+        context["block_id"] = block_id
+    if "media" in variables and page_media:
+        context["media"] = {url: page_media[url] for url in media_urls([block]) if url in page_media}
+    data_hash = block.get("hash") or block_hash(block['type'], block['data'])
+    key = fragment_key(fingerprint, data_hash, context)
+
+    cache = get_fragment_cache()
+    html, tier = cache.get(key)
+    if html is not None:
+        stats["fragments"][tier] += 1
+        return html, True
+    html = block_template.render(data=block['data'], block_id=block_id, media=page_media)
+    cache.put(key, html)
+    stats["fragments"]["miss"] += 1
+    return html, False
+
+
+def _render_blocks(templates: TemplateRegistry, page: dict, stats: dict, brand: Optional[dict] = None) -> str:
+    # Render blocks into a list and join once instead of growing a string
+    parts = []
+    stats.setdefault("fragments", {"memory": 0, "disk": 0, "miss": 0})
+    for index, block in enumerate(page["blocks"]):
+        block_type = block.get("type") if isinstance(block, dict) else None
+        started = time.perf_counter()
+        ok = True
+        cached = False
+        try:
+            # Inject unique block_id
+            block_id = f"block-{index}"
+            html, cached = _render_block(templates, block, block_id, page.get("media", {}), brand or {}, stats)
+            parts.append(html)
+            if index == 0 and page.get("optimize"):
+                # The optimizer treats everything up to here as the first screen
+                parts.append(FOLD_MARKER)
+        except Exception as e:
+            ok = False
+            logger.warning("Error rendering block %s #%d on page %s: %s", block_type, index, page["slug"], e)
+            stats["errors"].append({"page": page["slug"], "block": index, "type": block_type, "error": str(e)})
+        if not cached:
+            # Render timings only; cache hits are counted in stats["fragments"]
+            stats["blocks"].append((str(block_type), time.perf_counter() - started, ok))
+    blocks_html = "".join(parts)
+
+    # Fallback to body if no blocks (migration support)
+    if not blocks_html and page["body"]:
+        # Wrap legacy body in a container
+        blocks_html = f'<div class="container mx-auto px-4 py-8 prose">{page["body"]}</div>'
+    return blocks_html
+
+
+def _generate_page(templates: TemplateRegistry, page: dict, site: dict, stats: dict):
+    # Yields the page in chunks as base.html renders them
+    return templates.get("base.html").generate(
+        title=page["title"],
+        meta_description=page["meta_description"],
+        body_html=_render_blocks(templates, page, stats, _brand_key(site)),
+        created_at=page["created_at"],
+        **site
+    )
+
+
+def render_page(templates: TemplateRegistry, page: dict, site: dict, stats: Optional[dict] = None) -> str:
+    """Render a page payload to an HTML string, without writing anything."""
+    if stats is None:
+        stats = {"blocks": [], "errors": [], "fragments": {"memory": 0, "disk": 0, "miss": 0}}
+    return "".join(_generate_page(templates, page, site, stats))
+
+
+def _write_page(templates: TemplateRegistry, output_dir: str, page: dict, site: dict) -> dict:
+    # Chunks are produced lazily, so render and write time are measured apart
+    path = os.path.join(output_dir, f"{page['slug']}.html")
+    stats = {"blocks": [], "errors": [], "fragments": {"memory": 0, "disk": 0, "miss": 0}}
+    write_seconds = optimize_seconds = 0.0
+    bytes_before = inlined_css = None
+    started = time.perf_counter()
+    if page.get("optimize"):
+        # The optimizer needs the whole document, so it isn't streamed
+        html = render_page(templates, page, site, stats)
+        optimize_started = time.perf_counter()
+        bytes_before = len(html.encode("utf-8"))
+        html, info = optimize_page(html, site.get("assets") or {}, output_dir, page.get("dimensions"))
+        inlined_css = info["critical_css"]
+        optimize_seconds = time.perf_counter() - optimize_started
+        write_started = time.perf_counter()
+        with atomic_write(path) as f:
+            f.write(html)
+        write_seconds = time.perf_counter() - write_started
+    else:
+        chunks = []
+        with atomic_write(path) as f:
+            for chunk in _generate_page(templates, page, site, stats):
+                write_started = time.perf_counter()
+                f.write(chunk)
+                write_seconds += time.perf_counter() - write_started
+                chunks.append(chunk)
+        # An attribute value can span chunks, so links are read from the whole page
+        html = "".join(chunks)
+    links_started = time.perf_counter()
+    links = extract_links(html)
+    links_seconds = time.perf_counter() - links_started
+    total = time.perf_counter() - started - links_seconds
+    return {
+        "slug": page["slug"],
+        "bytes": os.path.getsize(path),
+        "bytes_before": bytes_before,
+        "inlined_css": inlined_css,
+        "render": total - write_seconds - optimize_seconds,
+        "write": write_seconds,
+        "optimize": optimize_seconds,
+        "links": links,
+        "links_seconds": links_seconds,
+        "blocks": stats["blocks"],
+        "errors": stats["errors"],
+        "fragments": stats["fragments"],
+    }
+
+
+# Parallel builds: every worker process keeps its own warmed template registry
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _init_worker():
+    get_registry()
+
+
+def _render_chunk(output_dir: str, site: dict, pages: list) -> list:
+    templates = get_registry()
+    # Pick up template edits made since this worker last rendered
+    templates.refresh()
+    return [_write_page(templates, output_dir, page, site) for page in pages]
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # Builds of several sites can ask at once; they all get the same pool
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            _pools[workers] = pool
+        return pool
+
+
+@atexit.register
+def shutdown_pools():
+    while _pools:
+        _, pool = _pools.popitem()
+        pool.shutdown(wait=True)
+
+
+def _render_pages(output_dir: str, pages: list, site: dict, workers: int) -> list:
+    if workers <= 1 or len(pages) < 2:
+        templates = get_registry()
+        return [_write_page(templates, output_dir, page, site) for page in pages]
+
+    # Send pages in chunks so the shared context is pickled once per chunk, not per page
+    chunk_size = max(1, min(PARALLEL_CHUNK_SIZE, len(pages) // (workers * 4) or 1))
+    chunks = [pages[i:i + chunk_size] for i in range(0, len(pages), chunk_size)]
+    pool = _get_pool(workers)
+    # The pool is shared by the builds of every site; with only a couple of
+    # chunks per worker queued at a time, a concurrent build of another site
+    # gets its chunks in between instead of waiting behind all of these
+    pending = iter(chunks)
+    futures = [pool.submit(_render_chunk, output_dir, site, chunk) for chunk in islice(pending, workers * 2)]
+    rendered = []
+    for future in futures:
+        rendered.extend(future.result())
+        chunk = next(pending, None)
+        if chunk is not None:
+            futures.append(pool.submit(_render_chunk, output_dir, site, chunk))
+    return rendered
+
+
+def _file_links(output_dir: str, file_name: str) -> list:
+    # Pages built before links were recorded: read them from the file once
+    try:
+        with open(os.path.join(output_dir, file_name), "r", encoding="utf-8") as f:
+            return extract_links(f.read())
+    except OSError:
+        return []
+
+
+def _remove_file(output_dir: str, file_name: str) -> bool:
+    path = os.path.join(output_dir, file_name)
+    if os.path.exists(path):
+        os.remove(path)
+        return True
+    return False
+
+
+def run_build(db: Session, force: bool = False, workers: Optional[int] = None,
+              output_dir: Optional[str] = None, optimize: Optional[bool] = None,
+              only: Optional[Iterable[int]] = None, site_id: int = DEFAULT_SITE_ID) -> dict:
+    """Generate site ``site_id`` and swap it in as the live release of
+    ``output_dir`` (the site's output tree by default, see sites.py).
+
+    Only pages whose inputs changed since the last build are re-rendered;
+    pass ``force=True`` to ignore the manifest hashes and rebuild everything.
+    With ``workers`` > 1 pages are rendered across a process pool; the
+    output is identical to a serial build. Returns a report of what was
+    rebuilt, skipped and deleted, with per-stage timings in seconds and
+    any block render errors. ``optimize`` (HTML_OPTIMIZE by default) runs
+    the HTML optimization pass over rendered pages and reports its savings.
+
+    ``only`` narrows a build after a template edit (see backend.watch) to the
+    ids of the pages using the edited templates: the others keep their files
+    and manifest entries as long as the shared site context is unchanged.
+    """
+    workers = BUILD_WORKERS if workers is None else workers
+    optimize = HTML_OPTIMIZE if optimize is None else optimize
+    site_dir, site_url = build_target(db, site_id)
+    target = output_dir or site_dir
+    timings = {}
+    started = time.perf_counter()
+    try:
+        with span("stage", timings):
+            live_dir = ensure_output_dir(target)
+            previous = load_manifest(live_dir)
+            # Everything is written into a staging release and swapped in at the end
+            staging = stage_release(target)
+        try:
+            report = _build_release(db, staging, previous, force, workers, timings, optimize,
+                                    None if only is None else set(only), site_id, site_url)
+        except BaseException:
+            discard_release(staging)
+            raise
+
+        with span("swap", timings):
+            if (report["rebuilt"] or report["deleted"] or report["sitemap"] or report["index"]
+                    or report["redirects"] or force):
+                activate_release(target, staging)
+                report["release"] = os.path.basename(staging)
+            else:
+                # Nothing changed: keep serving the live release
+                discard_release(staging)
+                report["release"] = os.path.basename(live_dir)
+    except Exception:
+        metrics.BUILDS_TOTAL.inc(status="failed")
+        logger.exception("Build of %s failed", target)
+        raise
+
+    observe_stage("total", time.perf_counter() - started, timings)
+    metrics.record_build(report)
+    logger.info("Built site %d into %s: %d rebuilt, %d unchanged, %d deleted in %.3fs", site_id, target,
+                len(report["rebuilt"]), report["unchanged"], len(report["deleted"]), timings["total"])
+    return report
+
+
+def _build_release(db: Session, output_dir: str, previous: dict, force: bool, workers: int,
+                   timings: dict, optimize: bool = False, only: Optional[set] = None,
+                   site_id: int = DEFAULT_SITE_ID, site_url: Optional[str] = None) -> dict:
+    previous_pages = previous.get("pages", {})
+
+    with span("templates", timings):
+        registry = get_registry()
+        registry.refresh()
+        templates = registry.hashes()
+        # Pages hash their templates together with what those import (macros.html)
+        template_keys = {name: registry.fingerprint(name) or digest for name, digest in templates.items()}
+
+    with span("query", timings):
+        pages = (db.query(models.Content).options(defer(models.Content.legacy_blocks))
+                 .filter(models.Content.site_id == site_id, models.Content.is_published == True)
+                 .order_by(models.Content.id).all())
+        # Block types and hashes only; block data is loaded for pages that need it
+        index = block_index(db, published_only=True, site_id=site_id)
+        site = load_site_context(db, site_id)
+        srcsets = srcset_map(db)
+        dimensions = dimensions_map(db) if optimize else {}
+        redirects = redirect_map(db, pages, site_id)
+
+    report = {"site": site_id, "rebuilt": [], "unchanged": 0, "deleted": [], "sitemap": False, "index": False,
+              "redirects": False, "assets": None,
+              "full": force or not previous, "bytes_written": 0, "blocks": 0, "errors": [],
+              "fragments": {"memory": 0, "disk": 0, "miss": 0}, "timings": timings}
+    manifest_pages = {}
+    to_render = []
+    decode_seconds = 0.0
+
+    def decode(page_ids) -> dict:
+        nonlocal decode_seconds
+        started = time.perf_counter()
+        loaded = load_blocks(db, page_ids)
+        decode_seconds += time.perf_counter() - started
+        return loaded
+
+    # Work out which pages need rendering
+    with span("plan", timings):
+        plans = []
+        for page in pages:
+            page_index = index.get(page.id, [])
+            blocks_hash = _hash(page_index)
+            old = previous_pages.get(str(page.id))
+            # Same blocks as last build: the uploads and classes they use are unchanged too
+            found = None
+            if old and old.get("blocks") == blocks_hash and "media" in old:
+                found = (old["media"], old.get("classes", []))
+            plans.append((page, page_index, blocks_hash, old, found))
+
+        # Only pages whose blocks changed are decoded to find their uploads and classes
+        decoded = decode(page.id for page, _, _, _, found in plans if found is None)
+        page_classes = set()
+        for number, (page, page_index, blocks_hash, old, found) in enumerate(plans):
+            if found is None:
+                page_blocks = decoded.get(page.id, [])
+                found = (media_urls(page_blocks), block_classes(page_blocks))
+                plans[number] = (page, page_index, blocks_hash, old, found)
+            page_classes.update(found[1])
+
+        # Stylesheet and JS first: their URLs are part of every page (timed within "plan")
+        with span("assets", timings):
+            assets = build_assets(output_dir, registry, page_classes, previous.get("assets"))
+            site["assets"] = assets["urls"]
+            report["assets"] = {"css": assets["urls"]["css"], "written": assets["written"],
+                                "removed": assets["removed"], "warnings": assets["warnings"]}
+            report["bytes_written"] += assets["bytes_written"]
+        # Optimized and plain builds of the same page differ
+        site_hash = _hash(site, optimize) if optimize else _hash(site)
+        # Narrowed build: pages outside ``only`` can't have changed unless the site context did
+        keep_others = only is not None and not force and site_hash == previous.get("site")
+
+        for page, page_index, blocks_hash, old, (urls, classes) in plans:
+            if (keep_others and page.id not in only and old and old.get("file") == f"{page.slug}.html"
+                    and os.path.exists(os.path.join(output_dir, old["file"]))):
+                manifest_pages[str(page.id)] = old
+                report["unchanged"] += 1
+                continue
+            media = {url: srcsets[url] for url in urls if url in srcsets}
+            sizes = {url: dimensions[url] for url in urls if url in dimensions}
+            deps = _page_dependencies([block_type for block_type, _ in page_index])
+            page_hash = _page_hash(page, [digest for _, digest in page_index], deps, template_keys, site_hash,
+                                   {"srcset": media, "size": sizes} if optimize else media)
+            file_name = f"{page.slug}.html"
+            entry = {"file": file_name, "hash": page_hash, "deps": deps, "blocks": blocks_hash, "media": urls}
+            if classes:
+                entry["classes"] = classes
+            manifest_pages[str(page.id)] = entry
+
+            if (not force and old and old.get("file") == file_name and old.get("hash") == page_hash
+                    and os.path.exists(os.path.join(output_dir, file_name))):
+                entry["links"] = old["links"] if "links" in old else _file_links(output_dir, file_name)
+                report["unchanged"] += 1
+                continue
+            to_render.append((page, media, sizes))
+
+        decoded.update(decode(page.id for page, _, _ in to_render if page.id not in decoded))
+        to_render = [_page_payload(page, decoded.get(page.id, []), media, sizes, optimize)
+                     for page, media, sizes in to_render]
+    # Loading and JSON decoding of block rows, included in the plan stage
+    observe_stage("decode", decode_seconds, timings)
+
     # Generate pages
-    for page in pages:
-        # Render blocks
-        blocks_html = ""
-        page_blocks = []
-        if page.blocks:
-            try:
-                page_blocks = json.loads(page.blocks)
-            except:
-                pass
-        
-        for index, block in enumerate(page_blocks):
-            try:
-                block_template = env.get_template(f"blocks/{block['type']}.html")
-                # Inject unique block_id
-                block_id = f"block-{index}"
-                blocks_html += block_template.render(data=block['data'], block_id=block_id)
-            except Exception as e:
-                print(f"Error rendering block {block.get('type')}: {e}")
-
-        # Fallback to body if no blocks (migration support)
-        if not blocks_html and page.body:
-             # Wrap legacy body in a container
-             blocks_html = f'<div class="container mx-auto px-4 py-8 prose">{page.body}</div>'
-
-        html_content = base_template.render(
-            title=page.title,
-            meta_description=page.meta_description,
-            body_html=blocks_html,
-            menu_items=menu_items,
-            logo_url=logo_url,
-            cta_text=menu_record.cta_text if menu_record else None,
-            cta_link=menu_record.cta_link if menu_record else None,
-            cta_color=brand_primary,
-            cta_hover_color=brand_hover,
-            created_at=page.created_at
-        )
-        
-        file_name = f"{page.slug}.html"
-        with open(os.path.join(OUTPUT_DIR, file_name), "w", encoding="utf-8") as f:
-            f.write(html_content)
+    with span("pages", timings):
+        results = _render_pages(output_dir, to_render, site, workers)
+    # Summed over workers, so they can exceed the wall time of the "pages" stage
+    observe_stage("render", sum(r["render"] for r in results), timings)
+    observe_stage("write", sum(r["write"] for r in results), timings)
+    observe_stage("extract_links", sum(r["links_seconds"] for r in results), timings)
+    entries = {entry["file"]: entry for entry in manifest_pages.values()}
+    for result in results:
+        entries[f"{result['slug']}.html"]["links"] = result["links"]
+    if optimize:
+        observe_stage("optimize", sum(r["optimize"] for r in results), timings)
+        before = sum(r["bytes_before"] for r in results)
+        after = sum(r["bytes"] for r in results)
+        report["optimize"] = {
+            "pages": len(results),
+            "bytes_before": before,
+            "bytes_after": after,
+            # Critical CSS now inside the pages; it replaces a render-blocking request
+            "inlined_css": sum(r["inlined_css"] for r in results),
+            "saved": {r["slug"]: r["bytes_before"] - r["bytes"] for r in results},
+        }
+    for result in results:
+        metrics.record_block_timings(result["blocks"])
+        metrics.record_fragments(result["fragments"])
+        for tier, count in result["fragments"].items():
+            report["fragments"][tier] += count
+        report["blocks"] += len(result["blocks"])
+        report["errors"].extend(result["errors"])
+    report["rebuilt"] = [r["slug"] for r in results]
+    # Drop disk fragments no build has used for a while (hourly at most)
+    get_fragment_cache().prune()
+    report["bytes_written"] += sum(r["bytes"] for r in results)
+    report["workers"] = workers
+
+    # Renamed, unpublished or deleted pages leave their files behind otherwise;
+    # a renamed page's old file becomes a redirect to the new one
+    live_files = {entry["file"] for entry in manifest_pages.values()}
+    for old in previous_pages.values():
+        if old["file"] not in live_files and old["file"] not in redirects:
+            if _remove_file(output_dir, old["file"]):
+                report["deleted"].append(old["file"])
+    moved = write_redirects(output_dir, redirects, previous.get("redirects"),
+                            SITE_URL if site_url is None else site_url, frozenset(live_files))
+    report["redirects"] = bool(moved["written"] or moved["removed"])
+    report["bytes_written"] += moved["bytes_written"]
 
     # Generate index.html from designated homepage
-    homepage = db.query(models.Content).filter(
-        models.Content.is_published == True,
-        models.Content.is_homepage == True
-    ).first()
-    
+    homepage = next((p for p in pages if p.is_homepage), None)
+    index_file = os.path.join(output_dir, "index.html")
+    index_source = None
     if homepage:
-        # Copy the homepage file to index.html
-        homepage_file = os.path.join(OUTPUT_DIR, f"{homepage.slug}.html")
-        index_file = os.path.join(OUTPUT_DIR, "index.html")
-        if os.path.exists(homepage_file):
-            import shutil
-            shutil.copy(homepage_file, index_file)
-
-    # Generate Sitemap
-    root = ET.Element("urlset", xmlns="http://www.sitemaps.org/schemas/sitemap/0.9")
-    for page in pages:
-        url = ET.SubElement(root, "url")
-        loc = ET.SubElement(url, "loc")
-        loc.text = f"/{page.slug}.html"
-        lastmod = ET.SubElement(url, "lastmod")
-        lastmod.text = datetime.now().strftime("%Y-%m-%d")
-
-    tree = ET.ElementTree(root)
-    tree.write(os.path.join(OUTPUT_DIR, "sitemap.xml"), encoding="utf-8", xml_declaration=True)
+        index_source = manifest_pages[str(homepage.id)]["hash"]
+        homepage_file = os.path.join(output_dir, f"{homepage.slug}.html")
+        if (force or index_source != previous.get("index") or homepage.slug in report["rebuilt"]
+                or not os.path.exists(index_file)) and os.path.exists(homepage_file):
+            # Copy the homepage file to index.html
+            link_or_copy(homepage_file, index_file)
+            report["index"] = True
+
+    # Generate Sitemap, streamed and sharded; unchanged shards are left alone
+    with span("sitemap", timings):
+        sitemap = write_sitemaps(
+            output_dir,
+            ((f"/{p.slug}.html", p.updated_at or p.created_at) for p in pages),
+            previous=previous.get("sitemaps"),
+            site_url=SITE_URL if site_url is None else site_url,
+        )
+        report["sitemap"] = bool(sitemap["written"] or sitemap["removed"])
+        report["bytes_written"] += sitemap["bytes_written"]
+
+    # Client-side search index; its inputs only change when some page is rebuilt or
+    # removed, and never in a narrowed build (templates only)
+    search_hash = previous.get("search")
+    with span("search", timings):
+        if force or (only is None and (report["rebuilt"] or report["deleted"])) or not search_hash:
+            search = write_client_index(db, output_dir, search_hash, site_id)
+            search_hash = search["hash"]
+            report["bytes_written"] += search["bytes_written"]
+
+    # Dead links, links that only work through a redirect, and orphan pages,
+    # from every page's links (kept in the manifest, so only rebuilt pages were parsed)
+    with span("links", timings):
+        report["links"] = check_links(
+            {page.slug: manifest_pages[str(page.id)].get("links", []) for page in pages},
+            homepage.slug if homepage else None, redirects,
+            file_checker(output_dir, uploads_dir()))
+
+    # Precompressed .gz/.br siblings and ETag hashes for the static server
+    with span("compress", timings):
+        compressed = precompress(output_dir)
+        report["compressed"] = len(compressed["compressed"])
+        report["bytes_written"] += compressed["bytes_written"]
+
+    with span("manifest", timings):
+        _save_manifest(output_dir, {
+            "version": MANIFEST_VERSION,
+            "built_at": datetime.now().isoformat(),
+            "templates": templates,
+            "site": site_hash,
+            "pages": manifest_pages,
+            "index": index_source,
+            "sitemaps": sitemap["files"],
+            "search": search_hash,
+            "redirects": redirects,
+            "assets": {"css": assets["urls"]["css"], "css_inputs": assets["css_inputs"]},
+        })
+
+    report["pages"] = len(pages)
+    return report
+
+
+def _print_report(report: dict):
+    print(f"Site {report['site']}: rebuilt {len(report['rebuilt'])} of {report['pages']} pages "
+          f"({report['unchanged']} unchanged, {len(report['deleted'])} deleted, {report['workers']} workers)")
+    if "optimize" in report and report["optimize"]["bytes_before"]:
+        saved = report["optimize"]["bytes_before"] - report["optimize"]["bytes_after"]
+        print(f"Optimized {report['optimize']['pages']} pages: {report['optimize']['bytes_before']} -> "
+              f"{report['optimize']['bytes_after']} bytes ({saved / report['optimize']['bytes_before']:.1%} saved)")
+    for warning in (report.get("assets") or {}).get("warnings", []):
+        print(f"WARNING: {warning}")
+    links = report.get("links")
+    if links:
+        print(f"Links: {links['dead_count']} dead, {links['redirected_count']} through a redirect, "
+              f"{links['orphan_count']} orphan pages")
+        for link in links["dead"]:
+            print(f"  dead: {link['page']}.html -> {link['target']}")
+        for slug in links["orphans"]:
+            print(f"  orphan: {slug}.html")
+
+
+def main(argv=None):
+    # Imports only the database and the generator, never the API app, so it starts fast
+    import argparse
+    from .database import SessionLocal, engine, DATABASE_URL
+    from .blocks import migrate_legacy_blocks
+    from .sites import ensure_default_site, site_ids
+
+    parser = argparse.ArgumentParser(prog="python -m backend.generator", description="StaticCMS site generator")
+    common = argparse.ArgumentParser(add_help=False)
+    mode = common.add_mutually_exclusive_group()
+    mode.add_argument("--serial", action="store_true", help="render pages in this process")
+    mode.add_argument("--parallel", action="store_true", help="render pages across a process pool")
+    common.add_argument("--workers", type=int, default=None, help="worker processes for --parallel (default: CPU count)")
+    common.add_argument("--optimize", action="store_true", default=None,
+                        help="minify pages, inline critical CSS, lazy load images (default: HTML_OPTIMIZE)")
+    common.add_argument("--site", action="append", default=None, metavar="SLUG",
+                        help="only this site; repeat for several (default: every site)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", parents=[common], help="generate the static site")
+    build.add_argument("--force", action="store_true", help="ignore the build manifest and rebuild every page")
+    watch = commands.add_parser("watch", parents=[common],
+                                help="build, then rebuild whenever the templates or the database change")
+    watch.add_argument("--interval", type=float, default=None, help="seconds between polls (default: WATCH_INTERVAL_SECONDS)")
+    watch.add_argument("--debounce", type=float, default=None,
+                       help="quiet seconds before a rebuild (default: WATCH_DEBOUNCE_SECONDS)")
+    args = parser.parse_args(argv)
+
+    if args.serial:
+        workers = 1
+    elif args.parallel:
+        workers = args.workers or os.cpu_count() or 1
+    else:
+        workers = args.workers
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        migrate_legacy_blocks(db)
+        ensure_default_site(db)
+        if args.site:
+            known = dict(db.query(models.Site.slug, models.Site.id).filter(models.Site.slug.in_(args.site)))
+            unknown = sorted(set(args.site) - set(known))
+            if unknown:
+                parser.error(f"unknown site: {', '.join(unknown)}")
+            sites = [known[slug] for slug in args.site]
+        else:
+            sites = site_ids(db)
+        for site_id in sites:
+            _print_report(run_build(db, force=getattr(args, "force", False), workers=workers,
+                                    optimize=args.optimize, site_id=site_id))
+    finally:
+        db.close()
+    if args.command != "watch":
+        return
+
+    from .watch import SiteWatcher, database_files
+    options = {name: value for name, value in (("interval", args.interval), ("debounce", args.debounce))
+               if value is not None}
+    watcher = SiteWatcher(SessionLocal, database_files(DATABASE_URL), sites=sites if args.site else None,
+                          workers=workers, optimize=args.optimize, **options)
+    if not watcher.db_files:
+        print("Not a SQLite database: only template changes are watched")
+    print(f"Watching {watcher.registry.template_dir} and the database (Ctrl+C to stop)")
+    try:
+        watcher.run(on_build=_print_report)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
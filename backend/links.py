@@ -0,0 +1,122 @@
+import os
+import re
+import html
+from typing import Callable, Iterable, Optional
+from urllib.parse import unquote
+
+from .media import UPLOADS_URL
+
+# Link checking for builds. Every rendered page's href/src/srcset values are
+# reduced to the site files they point at (external URLs are not followed);
+# the build keeps them in the manifest, so unchanged pages are never parsed
+# again, and checks the whole site's link graph after each build: links to
+# pages or files that don't exist, links to renamed pages that only work
+# through a redirect, and published pages nothing links to.
+LINK_REPORT_LIMIT = 200  # entries per list in a build report; the counts are exact
+UPLOADS_PREFIX = "uploads/"
+
+# Case-sensitive with a literal prefix, which lets re skip straight to each
+# candidate: many times faster than one case-insensitive alternation. Templates
+# and the editor write lowercase attribute names. The lookbehind skips
+# attributes that only end in the name (data-href, data-src); it follows the
+# prefix because a leading lookbehind would cost the fast path.
+_HREF_RE = re.compile(r"""href(?<![\w-]href)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_SRC_RE = re.compile(r"""src(?<![\w-]src)(set)?\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_SCHEME_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+
+def link_target(url: str) -> Optional[str]:
+    """The site-relative file ``url`` points at, or None for external and in-page links."""
+    url = html.unescape(url).strip()
+    if url.startswith(UPLOADS_URL + "/"):
+        url = UPLOADS_PREFIX + url[len(UPLOADS_URL) + 1:]
+    elif not url or url.startswith(("#", "//")) or _SCHEME_RE.match(url):
+        return None
+    path = unquote(url.split("#", 1)[0].split("?", 1)[0])
+    # Every page sits at the site root, so "/about.html" and "./about.html" are "about.html"
+    while path.startswith(("./", "/")):
+        path = path[1:] if path.startswith("/") else path[2:]
+    return path or None
+
+
+def extract_links(page_html: str) -> list:
+    """Sorted site files a rendered page links to or loads."""
+    urls = {double or single for double, single in _HREF_RE.findall(page_html)}
+    for srcset, double, single in _SRC_RE.findall(page_html):
+        value = double or single
+        if srcset:
+            # "url 480w, url 960w"
+            urls.update(part.split()[0] for part in value.split(",") if part.strip())
+        else:
+            urls.add(value)
+    targets = {link_target(url) for url in urls}
+    targets.discard(None)
+    return sorted(targets)
+
+
+def _limited(items: list) -> list:
+    return items[:LINK_REPORT_LIMIT]
+
+
+def check_links(page_links: dict, homepage: Optional[str], redirects: dict, exists: Callable[[str], bool]) -> dict:
+    """Check a site's link graph.
+
+    ``page_links`` maps each published page's slug to the files it links to,
+    ``redirects`` maps the files of old slugs to the pages they now redirect
+    to and ``exists`` tells whether any other file is part of the site.
+    """
+    pages = {f"{slug}.html": slug for slug in page_links}
+    if homepage is not None:
+        pages["index.html"] = homepage
+    inbound = {slug: 0 for slug in page_links}
+    dead, redirected = [], []
+    edges = 0
+    known = {}
+    for slug in sorted(page_links):
+        for target in page_links[slug]:
+            to = pages.get(target)
+            if to is None and target in redirects:
+                to = pages.get(redirects[target])
+                redirected.append({"page": slug, "target": target, "to": redirects[target]})
+            if to is not None:
+                edges += 1
+                if to != slug:
+                    inbound[to] += 1
+                continue
+            if target == "index.html":
+                # No homepage yet: the build writes no index.html, which every logo links to
+                continue
+            if target not in known:
+                known[target] = not target.endswith(".html") and exists(target)
+            if not known[target]:
+                dead.append({"page": slug, "target": target})
+    # The homepage is reached through index.html, which every page links to from its logo
+    orphans = sorted(slug for slug, count in inbound.items() if not count and slug != homepage)
+    return {
+        "pages": len(page_links),
+        "links": edges,
+        "dead_count": len(dead),
+        "dead": _limited(dead),
+        "redirected_count": len(redirected),
+        "redirected": _limited(redirected),
+        "orphan_count": len(orphans),
+        "orphans": _limited(orphans),
+    }
+
+
+def file_checker(output_dir: str, uploads_dir: str, extra: Iterable[str] = ()) -> Callable[[str], bool]:
+    """``exists`` for check_links: files in the built release, uploads in the shared store."""
+    extra = set(extra)
+
+    def exists(target: str) -> bool:
+        if target in extra:
+            return True
+        if target.startswith(UPLOADS_PREFIX):
+            path = os.path.join(uploads_dir, target[len(UPLOADS_PREFIX):])
+        else:
+            path = os.path.join(output_dir, target)
+        real = os.path.realpath(path)
+        # Stay inside the site: "../" targets are dead, not looked up
+        root = os.path.realpath(uploads_dir if target.startswith(UPLOADS_PREFIX) else output_dir)
+        return real.startswith(root + os.sep) and os.path.isfile(real)
+    return exists
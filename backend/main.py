@@ -1,27 +1,88 @@
-from fastapi import FastAPI, Depends, HTTPException, File, UploadFile
+from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Request, Response, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
-import re
+from fastapi.responses import HTMLResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only, selectinload
+from sqlalchemy.sql import func, or_
+from typing import List, Optional, Literal
 import os
-import shutil
-from . import models, database, schemas
-from .database import engine, get_db
-from .generator import run_build
+import time
+import zipfile
+from contextlib import asynccontextmanager
+from . import models, database, schemas, metrics, media, pagination, blocks, bulk, search, revisions, publishing
+from .database import engine, get_db, SessionLocal, get_async_db, dispose_async_engine
+from .builds import BuildScheduler
+from .generator import OUTPUT_DIR
+from .releases import ensure_output_dir, uploads_dir
+from .static import PrecompressedStaticFiles, SitesStaticFiles
+from .cache import response_cache
+from .slugs import slugify
+from .preview import preview_context, render_preview
+from .sites import DEFAULT_SITE_ID, SITES_DIR, ensure_default_site
 
 models.Base.metadata.create_all(bind=engine)
+with SessionLocal() as _db:
+    # Pages saved before blocks moved to their own table
+    blocks.migrate_legacy_blocks(_db)
+    # Rows from before sites existed belong to the default site
+    ensure_default_site(_db)
+# Full-text index over pages, filled on first start and kept in sync on every flush
+search.ensure_search_index(engine)
 
-app = FastAPI(title="StaticCMS API", debug=True)
+# Saves only enqueue a build; the scheduler renders the site in the background
+build_scheduler = BuildScheduler(SessionLocal)
+
+def _scheduled_change(site_id: int, pages: list):
+    response_cache.invalidate("pages", *(f"page:{page_id}" for page_id, _, _ in pages))
+    # Every page of the batch goes out in one build
+    build_scheduler.request(f"scheduled publishing ({len(pages)} pages)", site_id=site_id)
+
+# Applies publish_at / unpublish_at on time; woken by saves that set them
+publish_scheduler = publishing.PublishScheduler(SessionLocal, _scheduled_change)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    publish_scheduler.start()
+    yield
+    publish_scheduler.stop()
+    build_scheduler.stop()
+    await dispose_async_engine()
+
+app = FastAPI(title="StaticCMS API", debug=True, lifespan=lifespan)
 
 from fastapi.staticfiles import StaticFiles
 
-UPLOAD_DIR = "./output/uploads"
+# The output dir is a symlink to the live release; uploads are shared by all releases
+ensure_output_dir(OUTPUT_DIR)
+UPLOAD_DIR = uploads_dir()
 if not os.path.exists(UPLOAD_DIR):
    os.makedirs(UPLOAD_DIR)
 
-app.mount("/output", StaticFiles(directory="./output"), name="output")
+app.mount("/output/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+app.mount("/output", PrecompressedStaticFiles(directory=OUTPUT_DIR), name="output")
+# The other sites, each in SITES_DIR/<slug>
+os.makedirs(SITES_DIR, exist_ok=True)
+app.mount("/sites", SitesStaticFiles(directory=SITES_DIR), name="sites")
+
 
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template ("/api/pages/{page_id}"), not raw path, to bound cardinality
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                             route=path, status=status)
 
 # Enable CORS
 app.add_middleware(
@@ -37,50 +98,185 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def slugify(text: str) -> str:
-    text = text.lower()
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[\s_-]+', '-', text).strip('-')
-    return text
-
 import json
 
 # ... (slugify functions remain)
 
+# Every endpoint works on one site, chosen with ?site_id= (the default site when omitted)
+def _require_site(db: Session, site_id: int) -> models.Site:
+    site = db.get(models.Site, site_id)
+    if not site:
+        raise HTTPException(status_code=404, detail="Site not found")
+    return site
+
+async def _require_site_async(db: AsyncSession, site_id: int) -> models.Site:
+    site = await db.get(models.Site, site_id)
+    if not site:
+        raise HTTPException(status_code=404, detail="Site not found")
+    return site
+
+# Site Endpoints
+@app.get("/api/sites", response_model=List[schemas.SiteResponse])
+async def list_sites(db: AsyncSession = Depends(get_async_db)):
+    return (await db.scalars(select(models.Site).order_by(models.Site.id))).all()
+
+@app.post("/api/sites", response_model=schemas.SiteResponse)
+def create_site(site: schemas.SiteCreate, db: Session = Depends(get_db)):
+    slug = slugify(site.slug or site.name)
+    if not slug:
+        raise HTTPException(status_code=400, detail="Site slug is empty")
+    if db.query(models.Site).filter(models.Site.slug == slug).first():
+        raise HTTPException(status_code=409, detail="A site with this slug already exists")
+    db_site = models.Site(name=site.name, slug=slug, base_url=site.base_url)
+    db.add(db_site)
+    db.commit()
+    db.refresh(db_site)
+    return db_site
+
+@app.put("/api/sites/{site_id}", response_model=schemas.SiteResponse)
+def update_site(site_id: int, site: schemas.SiteUpdate, db: Session = Depends(get_db)):
+    # The slug names the site's output tree, so it stays as created
+    db_site = _require_site(db, site_id)
+    db_site.name = site.name
+    db_site.base_url = site.base_url
+    db.commit()
+    db.refresh(db_site)
+    build_scheduler.request("site updated", site_id=site_id)
+    return db_site
+
 @app.post("/api/pages", response_model=schemas.PageResponse)
-def create_page(page: schemas.PageCreate, db: Session = Depends(get_db)):
+def create_page(page: schemas.PageCreate, site_id: int = DEFAULT_SITE_ID, db: Session = Depends(get_db)):
+    _require_site(db, site_id)
     slug = slugify(page.title)
-    blocks_json = json.dumps([b.model_dump() for b in page.blocks]) 
     db_page = models.Content(
+        site_id=site_id,
         title=page.title,
         slug=slug,
         body=page.body,
-        blocks=blocks_json,
         meta_description=page.meta_description,
-        is_published=page.is_published
+        is_published=page.is_published,
+        publish_at=page.publish_at,
+        unpublish_at=page.unpublish_at,
     )
+    blocks.set_blocks(db_page, [b.model_dump() for b in page.blocks])
     db.add(db_page)
     db.commit()
     db.refresh(db_page)
     
-    # Auto-build on save
-    try:
-        run_build(db)
-    except Exception as e:
-        print(f"Build failed during creation: {e}")
-        
+    response_cache.invalidate("pages")
+    # Auto-build on save, in the background
+    build_scheduler.request("page created", site_id=site_id)
+    if page.publish_at or page.unpublish_at:
+        publish_scheduler.notify()
+
     return db_page
 
+# Read endpoints are async: they use the async engine and never wait for a threadpool slot
 @app.get("/api/pages", response_model=List[schemas.PageResponse])
-def list_pages(db: Session = Depends(get_db)):
-    return db.query(models.Content).all()
+async def list_pages(site_id: int = DEFAULT_SITE_ID, db: AsyncSession = Depends(get_async_db)):
+    return (await db.scalars(select(models.Content).filter(models.Content.site_id == site_id)
+                             .options(selectinload(models.Content.block_rows)))).all()
+
+@app.post("/api/preview", response_class=HTMLResponse)
+def preview_page(page: schemas.PageCreate, site_id: int = DEFAULT_SITE_ID, db: Session = Depends(get_db)):
+    # Renders the unsaved page in memory; nothing is written to the output directory
+    html, errors = render_preview(db, page, site_id)
+    headers = {"Cache-Control": "no-store"}
+    if errors:
+        headers["X-Preview-Errors"] = str(len(errors))
+    return HTMLResponse(html, headers=headers)
+
+# Bulk import/export (NDJSON); declared before /api/pages/{page_id}
+@app.post("/api/pages/bulk")
+async def import_pages(request: Request, site_id: int = DEFAULT_SITE_ID, db: AsyncSession = Depends(get_async_db)):
+    await _require_site_async(db, site_id)
+    # The body is read as a stream and inserted in batches, never held in memory whole
+    importer = bulk.BulkImporter(SessionLocal, site_id=site_id)
+    report = await bulk.import_ndjson(request.stream(), importer, run_in_threadpool)
+    return _finish_import(report, site_id)
+
+@app.post("/api/pages/bulk/zip")
+async def import_pages_zip(file: UploadFile = File(...), site_id: int = DEFAULT_SITE_ID,
+                           db: AsyncSession = Depends(get_async_db)):
+    await _require_site_async(db, site_id)
+    importer = bulk.BulkImporter(SessionLocal, site_id=site_id)
+    try:
+        report = await run_in_threadpool(bulk.import_zip, file.file, importer)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Not a zip file")
+    return _finish_import(report, site_id)
+
+def _finish_import(report: dict, site_id: int) -> dict:
+    if report["created"]:
+        response_cache.invalidate("pages")
+        # One build for the whole import
+        build_scheduler.request("bulk import", site_id=site_id)
+        publish_scheduler.notify()
+    return report
+
+@app.get("/api/pages/bulk")
+def export_pages(published: Optional[bool] = None, site_id: int = DEFAULT_SITE_ID):
+    return StreamingResponse(
+        bulk.export_ndjson(SessionLocal, published, site_id=site_id),
+        media_type=bulk.NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="pages.ndjson"'},
+    )
+
+@app.get("/api/pages/scheduled", response_model=List[schemas.ScheduledChange])
+def list_scheduled_changes(site_id: int = DEFAULT_SITE_ID, limit: int = 50, db: Session = Depends(get_db)):
+    # Pending publish_at / unpublish_at times, soonest first
+    return publishing.upcoming(db, site_id, max(1, min(limit, 500)))
+
+PAGE_SORT_COLUMNS = {
+    "updated_at": models.Content.updated_at,
+    "created_at": models.Content.created_at,
+    "title": models.Content.title,
+    "id": models.Content.id,
+}
+
+@app.get("/api/pages/summary", response_model=schemas.PageSummaryList)
+async def list_page_summaries(
+    cursor: Optional[str] = None,
+    limit: int = pagination.DEFAULT_PAGE_SIZE,
+    published: Optional[bool] = None,
+    homepage: Optional[bool] = None,
+    q: Optional[str] = None,
+    sort: Literal["updated_at", "created_at", "title", "id"] = "updated_at",
+    order: Literal["asc", "desc"] = "desc",
+    site_id: int = DEFAULT_SITE_ID,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Only the listed columns are loaded; body and blocks stay in the database
+    query = select(models.Content).options(load_only(
+        models.Content.id, models.Content.title, models.Content.slug, models.Content.is_published,
+        models.Content.is_homepage, models.Content.publish_at, models.Content.unpublish_at,
+        models.Content.created_at, models.Content.updated_at)) \
+        .filter(models.Content.site_id == site_id)
+    if published is not None:
+        query = query.filter(models.Content.is_published == published)
+    if homepage is not None:
+        query = query.filter(models.Content.is_homepage == homepage)
+    if q:
+        pattern = f"%{q}%"
+        query = query.filter(or_(models.Content.title.ilike(pattern), models.Content.slug.ilike(pattern)))
+    sort_column = PAGE_SORT_COLUMNS[sort]
+    try:
+        query = pagination.apply_keyset(query, sort_column, models.Content.id, cursor, limit,
+                                        descending=order == "desc")
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.scalars(query)).all()
+    items, next_cursor = pagination.split_page(rows, sort_column, models.Content.id, limit)
+    return {"items": items, "next_cursor": next_cursor}
 
 @app.get("/api/pages/{page_id}", response_model=schemas.PageResponse)
-def get_page(page_id: int, db: Session = Depends(get_db)):
-    page = db.query(models.Content).filter(models.Content.id == page_id).first()
-    if not page:
-        raise HTTPException(status_code=404, detail="Page not found")
-    return page
+async def get_page(page_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        page = await db.get(models.Content, page_id, options=[selectinload(models.Content.block_rows)])
+        if not page:
+            raise HTTPException(status_code=404, detail="Page not found")
+        return schemas.PageResponse.model_validate(page)
+    return await response_cache.respond(request, (f"page:{page_id}",), load)
 
 @app.put("/api/pages/{page_id}", response_model=schemas.PageResponse)
 def update_page(page_id: int, page: schemas.PageUpdate, db: Session = Depends(get_db)):
@@ -91,31 +287,189 @@ def update_page(page_id: int, page: schemas.PageUpdate, db: Session = Depends(ge
     db_page.title = page.title
     db_page.slug = slugify(page.title)
     db_page.body = page.body
-    db_page.blocks = json.dumps([b.model_dump() for b in page.blocks])
+    blocks.set_blocks(db_page, [b.model_dump() for b in page.blocks])
     db_page.meta_description = page.meta_description
     db_page.is_published = page.is_published
+    # Only when sent, so editors that don't know about schedules keep them
+    scheduled = {"publish_at", "unpublish_at"} & page.model_fields_set
+    for field in scheduled:
+        setattr(db_page, field, getattr(page, field))
     db_page.updated_at = func.now()
     
     db.commit()
     db.refresh(db_page)
     
-    # Auto-build on save
+    response_cache.invalidate("pages", f"page:{page_id}")
+    # Auto-build on save, in the background
+    build_scheduler.request("page updated", site_id=db_page.site_id)
+    if scheduled:
+        publish_scheduler.notify()
+
+    return db_page
+
+# Revisions: every save of a page is kept (see revisions.py)
+@app.get("/api/pages/{page_id}/revisions", response_model=schemas.RevisionSummaryList)
+async def list_page_revisions(page_id: int, cursor: Optional[str] = None, limit: int = pagination.DEFAULT_PAGE_SIZE,
+                              db: AsyncSession = Depends(get_async_db)):
+    if not await db.get(models.Content, page_id):
+        raise HTTPException(status_code=404, detail="Page not found")
+    revision = models.PageRevision
+    query = select(revision.number, revision.title, revision.is_snapshot, revision.size,
+                   func.length(revision.data).label("stored_size"), revision.restored_from, revision.created_at) \
+        .filter(revision.page_id == page_id)
     try:
-        run_build(db)
-    except Exception as e:
-        print(f"Build failed during update: {e}")
-        
+        query = pagination.apply_keyset(query, revision.number, revision.number, cursor, limit)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.execute(query)).all()
+    items, next_cursor = pagination.split_page(rows, revision.number, revision.number, limit)
+    return {"items": [row._asdict() for row in items], "next_cursor": next_cursor}
+
+async def _load_revision_or_404(db: AsyncSession, page_id: int, number: int) -> dict:
+    document = await revisions.load_revision_async(db, page_id, number)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return document
+
+@app.get("/api/pages/{page_id}/revisions/{number}", response_model=schemas.PageRevisionResponse)
+async def get_page_revision(page_id: int, number: int, db: AsyncSession = Depends(get_async_db)):
+    document = await _load_revision_or_404(db, page_id, number)
+    row = (await db.execute(select(models.PageRevision.restored_from, models.PageRevision.created_at)
+                            .filter(models.PageRevision.page_id == page_id,
+                                    models.PageRevision.number == number))).one()
+    return {**document, "number": number, "restored_from": row.restored_from, "created_at": row.created_at}
+
+@app.post("/api/pages/{page_id}/revisions/{number}/restore", response_model=schemas.PageResponse)
+def restore_page_revision(page_id: int, number: int, db: Session = Depends(get_db)):
+    db_page = _get_page_or_404(db, page_id)
+    document = revisions.load_revision(db, page_id, number)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    for field in ("title", "slug", "body", "meta_description", "is_published"):
+        setattr(db_page, field, document[field])
+    blocks.set_blocks(db_page, document["blocks"])
+    db_page.updated_at = func.now()
+    # The revision this save records points back at the one restored
+    db.info["restored_from"] = {page_id: number}
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Another page now uses this revision's slug")
+    db.refresh(db_page)
+
+    response_cache.invalidate("pages", f"page:{page_id}")
+    build_scheduler.request("page restored", site_id=db_page.site_id)
     return db_page
 
+@app.post("/api/revisions/compact")
+def compact_revisions(page_id: Optional[int] = None, db: Session = Depends(get_db)):
+    # Runs on save for pages far over the limit; this applies the policy everywhere now
+    return revisions.compact_revisions(db, None if page_id is None else [page_id])
+
+# Block Endpoints: edit one block without resending the page
+def _get_page_or_404(db: Session, page_id: int) -> models.Content:
+    page = db.query(models.Content).filter(models.Content.id == page_id).first()
+    if not page:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return page
+
+def _get_block_or_404(page: models.Content, block_id: str) -> models.ContentBlock:
+    row = blocks.find_block(page, block_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Block not found")
+    return row
+
+@app.get("/api/pages/{page_id}/blocks", response_model=List[schemas.BlockResponse])
+async def list_page_blocks(page_id: int, db: AsyncSession = Depends(get_async_db)):
+    if not await db.get(models.Content, page_id):
+        raise HTTPException(status_code=404, detail="Page not found")
+    rows = (await db.scalars(select(models.ContentBlock).filter(models.ContentBlock.page_id == page_id)
+                             .order_by(models.ContentBlock.position))).all()
+    return [blocks.block_response(row) for row in rows]
+
+@app.post("/api/pages/{page_id}/blocks", response_model=schemas.BlockResponse)
+def create_page_block(page_id: int, block: schemas.BlockCreate, db: Session = Depends(get_db)):
+    db_page = _get_page_or_404(db, page_id)
+    if block.id and blocks.find_block(db_page, block.id):
+        raise HTTPException(status_code=409, detail="A block with this id already exists on the page")
+    row = blocks.insert_block(db, db_page, block.type, block.data, key=block.id, position=block.position)
+    db_page.updated_at = func.now()
+    db.commit()
+    response_cache.invalidate("pages", f"page:{page_id}")
+    build_scheduler.request("block added", site_id=db_page.site_id)
+    return blocks.block_response(row)
+
+@app.patch("/api/pages/{page_id}/blocks/{block_id}", response_model=schemas.BlockResponse)
+def update_page_block(page_id: int, block_id: str, block: schemas.BlockPatch, db: Session = Depends(get_db)):
+    db_page = _get_page_or_404(db, page_id)
+    row = _get_block_or_404(db_page, block_id)
+    if blocks.update_block(row, block.type, block.data, block.position):
+        db_page.updated_at = func.now()
+        db.commit()
+        response_cache.invalidate("pages", f"page:{page_id}")
+        build_scheduler.request("block updated", site_id=db_page.site_id)
+    return blocks.block_response(row)
+
+@app.delete("/api/pages/{page_id}/blocks/{block_id}")
+def delete_page_block(page_id: int, block_id: str, db: Session = Depends(get_db)):
+    db_page = _get_page_or_404(db, page_id)
+    blocks.delete_block(_get_block_or_404(db_page, block_id))
+    db_page.updated_at = func.now()
+    db.commit()
+    response_cache.invalidate("pages", f"page:{page_id}")
+    build_scheduler.request("block deleted", site_id=db_page.site_id)
+    return {"status": "success"}
+
+@app.get("/api/search", response_model=List[schemas.SearchResult])
+async def search_pages(q: str, published: Optional[bool] = None, limit: int = 20, site_id: int = DEFAULT_SITE_ID,
+                       db: AsyncSession = Depends(get_async_db)):
+    return await search.search_pages(db, q, max(1, min(limit, 100)), published, site_id)
+
+@app.get("/api/blocks", response_model=List[schemas.BlockUsage])
+async def find_blocks(type: str, published: Optional[bool] = None, limit: int = 500,
+                      site_id: int = DEFAULT_SITE_ID, db: AsyncSession = Depends(get_async_db)):
+    # "Which pages use a slider?" straight from the type index
+    query = (select(models.ContentBlock.key, models.ContentBlock.type, models.ContentBlock.position,
+                    models.Content.id, models.Content.title, models.Content.slug, models.Content.is_published)
+             .join(models.Content, models.Content.id == models.ContentBlock.page_id)
+             .filter(models.ContentBlock.type == type, models.Content.site_id == site_id))
+    if published is not None:
+        query = query.filter(models.Content.is_published == published)
+    query = query.order_by(models.Content.id, models.ContentBlock.position).limit(min(limit, 5000))
+    return [
+        {"id": key, "type": block_type, "position": position, "page_id": page_id,
+         "page_title": title, "page_slug": slug, "is_published": is_published}
+        for key, block_type, position, page_id, title, slug, is_published in (await db.execute(query)).all()
+    ]
+
 # Menu Endpoints
 @app.get("/api/menus", response_model=List[schemas.MenuResponse])
-def list_menus(db: Session = Depends(get_db)):
-    return db.query(models.Menu).all()
+async def list_menus(request: Request, site_id: int = DEFAULT_SITE_ID, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        menus = (await db.scalars(select(models.Menu).filter(models.Menu.site_id == site_id))).all()
+        return [schemas.MenuResponse.model_validate(menu) for menu in menus]
+    return await response_cache.respond(request, ("menus",), load)
+
+@app.get("/api/menus/summary", response_model=schemas.MenuSummaryList)
+async def list_menu_summaries(cursor: Optional[str] = None, limit: int = pagination.DEFAULT_PAGE_SIZE,
+                              site_id: int = DEFAULT_SITE_ID, db: AsyncSession = Depends(get_async_db)):
+    query = (select(models.Menu).options(load_only(models.Menu.id, models.Menu.title, models.Menu.updated_at))
+             .filter(models.Menu.site_id == site_id))
+    try:
+        query = pagination.apply_keyset(query, models.Menu.id, models.Menu.id, cursor, limit, descending=False)
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.scalars(query)).all()
+    items, next_cursor = pagination.split_page(rows, models.Menu.id, models.Menu.id, limit)
+    return {"items": items, "next_cursor": next_cursor}
 
 @app.post("/api/menus", response_model=schemas.MenuResponse)
-def create_menu(menu: schemas.MenuCreate, db: Session = Depends(get_db)):
+def create_menu(menu: schemas.MenuCreate, site_id: int = DEFAULT_SITE_ID, db: Session = Depends(get_db)):
+    _require_site(db, site_id)
     items_json = json.dumps([i.model_dump() for i in menu.items])
     db_menu = models.Menu(
+        site_id=site_id,
         title=menu.title, 
         logo_url=menu.logo_url, 
         items=items_json,
@@ -126,6 +480,8 @@ def create_menu(menu: schemas.MenuCreate, db: Session = Depends(get_db)):
     db.add(db_menu)
     db.commit()
     db.refresh(db_menu)
+    response_cache.invalidate("menus")
+    preview_context.invalidate()
     return db_menu
 @app.put("/api/menus/{menu_id}", response_model=schemas.MenuResponse)
 def update_menu(menu_id: int, menu: schemas.MenuUpdate, db: Session = Depends(get_db)):
@@ -144,30 +500,35 @@ def update_menu(menu_id: int, menu: schemas.MenuUpdate, db: Session = Depends(ge
     db.commit()
     db.refresh(db_menu)
     
-    # Auto-build on save
-    try:
-        run_build(db)
-    except Exception as e:
-        print(f"Build failed during menu update: {e}")
-        
+    response_cache.invalidate("menus")
+    preview_context.invalidate()
+    # Auto-build on save, in the background
+    build_scheduler.request("menu updated", site_id=db_menu.site_id)
+
     return db_menu
 
 # Settings Endpoints
 @app.get("/api/settings", response_model=schemas.SettingsResponse)
-def get_settings(db: Session = Depends(get_db)):
-    settings = db.query(models.Settings).first()
-    if not settings:
-        settings = models.Settings(brand_primary="#3b82f6", brand_hover="#2563eb")
-        db.add(settings)
-        db.commit()
-        db.refresh(settings)
-    return settings
+async def get_settings(request: Request, site_id: int = DEFAULT_SITE_ID, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        settings = (await db.scalars(select(models.Settings).filter(models.Settings.site_id == site_id)
+                                     .limit(1))).first()
+        if not settings:
+            await _require_site_async(db, site_id)
+            settings = models.Settings(site_id=site_id, brand_primary="#3b82f6", brand_hover="#2563eb")
+            db.add(settings)
+            await db.commit()
+            await db.refresh(settings)
+        return schemas.SettingsResponse.model_validate(settings)
+    return await response_cache.respond(request, ("settings",), load)
 
 @app.put("/api/settings", response_model=schemas.SettingsResponse)
-def update_settings(settings_data: schemas.SettingsUpdate, db: Session = Depends(get_db)):
-    db_settings = db.query(models.Settings).first()
+def update_settings(settings_data: schemas.SettingsUpdate, site_id: int = DEFAULT_SITE_ID,
+                    db: Session = Depends(get_db)):
+    db_settings = db.query(models.Settings).filter(models.Settings.site_id == site_id).first()
     if not db_settings:
-        db_settings = models.Settings()
+        _require_site(db, site_id)
+        db_settings = models.Settings(site_id=site_id)
         db.add(db_settings)
     
     db_settings.brand_primary = settings_data.brand_primary
@@ -175,52 +536,140 @@ def update_settings(settings_data: schemas.SettingsUpdate, db: Session = Depends
     db.commit()
     db.refresh(db_settings)
     
-    # Auto-build on save
-    try:
-        run_build(db)
-    except Exception as e:
-        print(f"Build failed during settings update: {e}")
-        
+    response_cache.invalidate("settings")
+    preview_context.invalidate()
+    # Auto-build on save, in the background
+    build_scheduler.request("settings updated", site_id=site_id)
+
     return db_settings
 
 @app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...), site_id: int = DEFAULT_SITE_ID,
+                      db: Session = Depends(get_db)):
+    await run_in_threadpool(_require_site, db, site_id)
     try:
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Return the URL to access the file
-        return {"url": f"http://localhost:8000/output/uploads/{file.filename}"}
+        # Hash and copy in chunks on a worker thread, not on the event loop; the
+        # files are shared by all sites, the media record belongs to this one
+        stored = await run_in_threadpool(media.store_stream, file.file, file.filename, UPLOAD_DIR)
+        record = await run_in_threadpool(media.register_upload, db, stored, file.filename, file.content_type,
+                                         site_id)
+    except media.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/generate")
-def build_site(db: Session = Depends(get_db)):
+    if record.status == "pending":
+        background_tasks.add_task(process_media_variants, record.id)
+
+    # Return the URL to access the file
+    return {"url": record.url, "id": record.id, "sha256": record.sha256, "deduplicated": not stored["created"]}
+
+def process_media_variants(media_id: int):
+    db = SessionLocal()
     try:
-        run_build(db)
-        return {"status": "success", "message": "Site generated successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        if media.generate_variants(db, media_id, UPLOAD_DIR):
+            preview_context.invalidate()
+            # Pages showing this image can now offer a srcset
+            build_scheduler.request("media variants ready", site_id=db.get(models.Media, media_id).site_id)
+    finally:
+        db.close()
+
+@app.get("/api/media", response_model=List[schemas.MediaResponse])
+async def list_media(limit: int = 100, offset: int = 0, site_id: int = DEFAULT_SITE_ID,
+                     db: AsyncSession = Depends(get_async_db)):
+    query = (select(models.Media).filter(models.Media.site_id == site_id)
+             .order_by(models.Media.created_at.desc(), models.Media.id.desc())
+             .offset(offset).limit(min(limit, 500)))
+    return (await db.scalars(query)).all()
+
+@app.get("/api/media/{media_id}", response_model=schemas.MediaResponse)
+async def get_media(media_id: int, db: AsyncSession = Depends(get_async_db)):
+    record = await db.get(models.Media, media_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Media not found")
+    return record
+
+@app.post("/api/generate")
+def build_site(force: bool = False, parallel: bool = False, workers: Optional[int] = None,
+               site_id: int = DEFAULT_SITE_ID, db: Session = Depends(get_db)):
+    _require_site(db, site_id)
+    # Serial unless asked otherwise; parallel defaults to one worker per CPU
+    if parallel:
+        workers = workers or os.cpu_count() or 1
+    elif workers is None:
+        workers = 1
+    job = build_scheduler.build_now(db, force=force, workers=workers, reason="generate", site_id=site_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    return {"status": "success", "message": "Site generated successfully", "build_id": job.id, "report": job.report}
+
+# Build Queue Endpoints
+@app.post("/api/builds", response_model=schemas.BuildResponse)
+def enqueue_build(build: schemas.BuildRequest = schemas.BuildRequest(), site_id: int = DEFAULT_SITE_ID,
+                  db: Session = Depends(get_db)):
+    _require_site(db, site_id)
+    job = build_scheduler.request(build.reason or "manual", force=build.force, site_id=site_id)
+    return job.to_dict()
+
+@app.get("/api/builds", response_model=List[schemas.BuildResponse])
+def list_builds(site_id: Optional[int] = None):
+    # Every site's builds unless one is asked for
+    return [job.to_dict() for job in build_scheduler.history(site_id)]
+
+@app.post("/api/builds/rollback")
+def rollback_build(site_id: int = DEFAULT_SITE_ID, db: Session = Depends(get_db)):
+    _require_site(db, site_id)
+    release = build_scheduler.rollback(site_id)
+    if not release:
+        raise HTTPException(status_code=409, detail="No previous build to roll back to")
+    return {"status": "success", "release": release}
+
+@app.get("/api/builds/{build_id}", response_model=schemas.BuildResponse)
+def get_build(build_id: int):
+    job = build_scheduler.get(build_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Build not found")
+    return job.to_dict()
+
+@app.get("/api/metrics")
+def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Dashboard Endpoints
 @app.get("/api/dashboard/stats")
-def get_dashboard_stats(db: Session = Depends(get_db)):
-    page_count = db.query(models.Content).count()
-    published_count = db.query(models.Content).filter(models.Content.is_published == True).count()
-    menu_count = db.query(models.Menu).count()
-    
-    return {
-        "pages": page_count,
-        "published_pages": published_count,
-        "menus": menu_count
-    }
+async def get_dashboard_stats(request: Request, site_id: int = DEFAULT_SITE_ID,
+                              db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        # All three counts in one round trip
+        page_count = select(func.count(models.Content.id)).filter(models.Content.site_id == site_id).scalar_subquery()
+        published_count = (select(func.count(models.Content.id))
+                           .filter(models.Content.site_id == site_id, models.Content.is_published == True)
+                           .scalar_subquery())
+        menu_count = select(func.count(models.Menu.id)).filter(models.Menu.site_id == site_id).scalar_subquery()
+        pages, published, menus = (await db.execute(select(page_count, published_count, menu_count))).one()
+        return {
+            "pages": pages,
+            "published_pages": published,
+            "menus": menus
+        }
+    return await response_cache.respond(request, ("pages", "menus"), load)
 
 @app.get("/api/dashboard/recent")
-def get_recent_activity(db: Session = Depends(get_db)):
+async def get_recent_activity(request: Request, site_id: int = DEFAULT_SITE_ID,
+                              db: AsyncSession = Depends(get_async_db)):
+    return await response_cache.respond(request, ("pages", "menus"), lambda: _recent_activity(db, site_id))
+
+async def _recent_activity(db: AsyncSession, site_id: int):
     # Fetch recent pages and menus
-    recent_pages = db.query(models.Content).order_by(models.Content.updated_at.desc()).limit(5).all()
-    recent_menus = db.query(models.Menu).order_by(models.Menu.updated_at.desc()).limit(3).all()
+    recent_pages = (await db.scalars(
+        select(models.Content).options(load_only(
+            models.Content.id, models.Content.title, models.Content.is_published,
+            models.Content.created_at, models.Content.updated_at))
+        .filter(models.Content.site_id == site_id)
+        .order_by(models.Content.updated_at.desc()).limit(5))).all()
+    recent_menus = (await db.scalars(
+        select(models.Menu).filter(models.Menu.site_id == site_id)
+        .order_by(models.Menu.updated_at.desc()).limit(3))).all()
     
     # Format for response
     activity = []
@@ -0,0 +1,212 @@
+import os
+import re
+import json
+import hashlib
+import logging
+from typing import BinaryIO, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow uploads are stored but no variants are made
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Uploads are stored by content hash, so re-uploading the same file costs
+# nothing and two files with the same name can no longer overwrite each other.
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000").rstrip("/")
+UPLOADS_URL = f"{PUBLIC_BASE_URL}/output/uploads"
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Widths of the resized WebP derivatives offered through srcset
+VARIANT_WIDTHS = (480, 960, 1600)
+VARIANT_QUALITY = 80
+RESIZABLE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+# Leading bytes -> extension, so photo.JPEG and photo.jpg are stored once
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _extension(filename: Optional[str]) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if re.fullmatch(r"\.[a-z0-9]{1,8}", ext) else ""
+
+
+def _detected_extension(head: bytes, filename: Optional[str]) -> str:
+    # Images get the extension of their format; anything else keeps its own
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return _extension(filename)
+
+
+def _relative_path(digest: str, suffix: str) -> str:
+    # Two-level fan-out keeps directories small
+    return f"{digest[:2]}/{digest}{suffix}"
+
+
+def _stored_relative(upload_dir: str, digest: str) -> Optional[str]:
+    """The file already stored for ``digest``, whatever its extension."""
+    try:
+        names = os.listdir(os.path.join(upload_dir, digest[:2]))
+    except FileNotFoundError:
+        return None
+    for name in sorted(names):
+        if name == digest or name.startswith(digest + "."):
+            return f"{digest[:2]}/{name}"
+    return None
+
+
+def store_stream(stream: BinaryIO, filename: Optional[str], upload_dir: str,
+                 max_bytes: Optional[int] = None) -> dict:
+    """Copy ``stream`` to a temp file in chunks while hashing it, then move it
+    to its content-addressed path. Blocking; run it off the event loop.
+
+    Storage is keyed on the hash: the same bytes are kept once, under the
+    extension of the first upload (the detected one for images).
+    """
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    tmp_path = os.path.join(upload_dir, f".upload-{os.getpid()}-{id(stream)}.tmp")
+    try:
+        with open(tmp_path, "wb") as out:
+            for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                if not head:
+                    head = chunk[:16]
+                digest.update(chunk)
+                out.write(chunk)
+        sha256 = digest.hexdigest()
+        relative = _stored_relative(upload_dir, sha256)
+        created = relative is None
+        if created:
+            relative = _relative_path(sha256, _detected_extension(head, filename))
+        final_path = os.path.join(upload_dir, relative)
+        if created:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        return {"sha256": sha256, "size": size, "path": final_path, "relative": relative, "created": created}
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def register_upload(db: Session, stored: dict, filename: Optional[str], content_type: Optional[str],
+                    site_id: int = models.DEFAULT_SITE_ID) -> models.Media:
+    existing = db.query(models.Media).filter(models.Media.site_id == site_id, models.Media.sha256 == stored["sha256"])
+    media = existing.first()
+    if media:
+        return media
+    resizable = Image is not None and content_type in RESIZABLE_TYPES
+    media = models.Media(
+        site_id=site_id,
+        sha256=stored["sha256"],
+        filename=filename,
+        content_type=content_type,
+        size=stored["size"],
+        url=f"{UPLOADS_URL}/{stored['relative']}",
+        variants="[]",
+        status="pending" if resizable else "skipped",
+    )
+    # Already processed for another site: the file and its variants are shared
+    other = (db.query(models.Media).filter(models.Media.sha256 == stored["sha256"], models.Media.status == "ready")
+             .first())
+    if other:
+        media.url, media.width, media.height = other.url, other.width, other.height
+        media.variants, media.status = other.variants, other.status
+    db.add(media)
+    try:
+        db.commit()
+    except IntegrityError:
+        # The same file was registered concurrently
+        db.rollback()
+        return existing.one()
+    db.refresh(media)
+    return media
+
+
+def generate_variants(db: Session, media_id: int, upload_dir: str) -> bool:
+    """Write resized WebP derivatives for an uploaded image.
+
+    Returns True when new variants were recorded (pages using the image
+    need a rebuild to pick up the srcset).
+    """
+    media = db.query(models.Media).filter(models.Media.id == media_id).first()
+    if not media or media.status != "pending" or Image is None:
+        return False
+    source = os.path.join(upload_dir, media.url[len(UPLOADS_URL) + 1:])
+    try:
+        with Image.open(source) as image:
+            image.load()
+            media.width, media.height = image.size
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            variants = []
+            for width in VARIANT_WIDTHS:
+                if width >= image.width:
+                    continue
+                height = round(image.height * width / image.width)
+                relative = _relative_path(media.sha256, f"-{width}.webp")
+                target = os.path.join(upload_dir, relative)
+                if not os.path.exists(target):
+                    tmp_path = f"{target}.{os.getpid()}.tmp"
+                    image.resize((width, height), Image.LANCZOS).save(tmp_path, "WEBP", quality=VARIANT_QUALITY)
+                    os.replace(tmp_path, target)
+                variants.append({"width": width, "height": height, "format": "webp",
+                                 "url": f"{UPLOADS_URL}/{relative}"})
+        media.variants = json.dumps(variants)
+        media.status = "ready"
+        db.commit()
+        return bool(variants)
+    except Exception as e:
+        logger.warning("Could not generate variants for media %s: %s", media_id, e)
+        db.rollback()
+        media.status = "failed"
+        db.commit()
+        return False
+
+
+def srcset_map(db: Session) -> dict:
+    """Map each image URL with derivatives to its srcset value, for the templates."""
+    srcsets = {}
+    rows = (db.query(models.Media.url, models.Media.width, models.Media.variants)
+            .filter(models.Media.status == "ready").all())
+    for url, width, variants in rows:
+        try:
+            variants = json.loads(variants or "[]")
+        except ValueError:
+            continue
+        if not variants:
+            continue
+        candidates = [f"{v['url']} {v['width']}w" for v in variants]
+        if width:
+            candidates.append(f"{url} {width}w")
+        srcsets[url] = ", ".join(candidates)
+    return srcsets
+
+
+def dimensions_map(db: Session) -> dict:
+    """Map each image URL with known dimensions to ``[width, height]``."""
+    rows = (db.query(models.Media.url, models.Media.width, models.Media.height)
+            .filter(models.Media.width.isnot(None), models.Media.height.isnot(None)).all())
+    return {url: [width, height] for url, width, height in rows}
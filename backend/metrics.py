@@ -0,0 +1,162 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Optional
+
+# Minimal Prometheus-style instruments, exposed as text by /api/metrics.
+# Kept dependency-free; label values are passed as keyword arguments.
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BLOCK_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+def _label_key(labelnames: tuple, labels: dict) -> tuple:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: Optional[tuple] = None) -> str:
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {cumulative}")
+                cumulative += series[len(self.buckets)]
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+BUILD_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "staticcms_build_stage_seconds", "Time spent in each stage of a site build.", ("stage",)))
+BUILDS_TOTAL = REGISTRY.register(Counter(
+    "staticcms_builds_total", "Site builds by outcome.", ("status",)))
+PAGES_RENDERED_TOTAL = REGISTRY.register(Counter(
+    "staticcms_pages_rendered_total", "Pages rendered by site builds."))
+PAGES_SKIPPED_TOTAL = REGISTRY.register(Counter(
+    "staticcms_pages_skipped_total", "Pages left untouched by incremental builds."))
+BLOCK_RENDER_SECONDS = REGISTRY.register(Histogram(
+    "staticcms_block_render_seconds", "Time to render a single block, by block type.", ("type",), BLOCK_BUCKETS))
+BLOCK_RENDER_ERRORS_TOTAL = REGISTRY.register(Counter(
+    "staticcms_block_render_errors_total", "Blocks that failed to render, by block type.", ("type",)))
+BUILD_BYTES_WRITTEN_TOTAL = REGISTRY.register(Counter(
+    "staticcms_build_bytes_written_total", "Bytes written to the output by site builds."))
+FRAGMENT_CACHE_LOOKUPS_TOTAL = REGISTRY.register(Counter(
+    "staticcms_fragment_cache_lookups_total", "Block fragment cache lookups by result (memory, disk, miss).",
+    ("result",)))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "staticcms_http_request_duration_seconds", "API request latency by route.", ("method", "route", "status")))
+
+
+def observe_stage(stage: str, seconds: float, timings: Optional[dict] = None):
+    BUILD_STAGE_SECONDS.observe(seconds, stage=stage)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str, timings: Optional[dict] = None):
+    """Time a build stage into the stage histogram and, if given, a report's timings dict."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started, timings)
+
+
+def record_block_timings(block_timings: list):
+    # (block type, seconds, succeeded) tuples gathered while rendering, possibly in a worker process
+    for block_type, seconds, ok in block_timings:
+        BLOCK_RENDER_SECONDS.observe(seconds, type=block_type)
+        if not ok:
+            BLOCK_RENDER_ERRORS_TOTAL.inc(type=block_type)
+
+
+def record_fragments(lookups: dict):
+    for result, count in lookups.items():
+        if count:
+            FRAGMENT_CACHE_LOOKUPS_TOTAL.inc(count, result=result)
+
+
+def record_build(report: dict):
+    BUILDS_TOTAL.inc(status="success")
+    PAGES_RENDERED_TOTAL.inc(len(report.get("rebuilt", [])))
+    PAGES_SKIPPED_TOTAL.inc(report.get("unchanged", 0))
+    BUILD_BYTES_WRITTEN_TOTAL.inc(report.get("bytes_written", 0))
+
+
+def render() -> str:
+    return REGISTRY.render()
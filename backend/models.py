@@ -1,26 +1,116 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime
+import json
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Index, ForeignKey, UniqueConstraint, LargeBinary
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
 
+# Rows written before sites existed belong to this one (see sites.py)
+DEFAULT_SITE_ID = 1
+
+class Site(Base):
+    __tablename__ = "sites"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    slug = Column(String(100), unique=True, index=True, nullable=False) # output tree name
+    base_url = Column(String(255), nullable=True) # origin for sitemap URLs, e.g. https://example.com
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Content(Base):
     __tablename__ = "content"
 
     id = Column(Integer, primary_key=True, index=True)
+    site_id = Column(Integer, ForeignKey("sites.id"), nullable=False, default=DEFAULT_SITE_ID,
+                     server_default=str(DEFAULT_SITE_ID), index=True)
     title = Column(String(60), nullable=False)
-    slug = Column(String(100), unique=True, index=True, nullable=False)
+    slug = Column(String(100), index=True, nullable=False)
     meta_description = Column(String(160))
     body = Column(Text)
-    blocks = Column(Text, default="[]")
+    # Pre-normalization JSON array of blocks, emptied once moved to content_blocks
+    legacy_blocks = Column("blocks", Text, default="[]")
     is_published = Column(Boolean, default=False)
     is_homepage = Column(Boolean, default=False)
+    # Scheduled (un)publishing, naive UTC; cleared once applied (see publishing.py)
+    publish_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    unpublish_at = Column(DateTime(timezone=True), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    block_rows = relationship("ContentBlock", back_populates="page", order_by="ContentBlock.position",
+                              cascade="all, delete-orphan")
+
+    # Slugs are unique per site; keyset pagination of the admin page list (see pagination.py)
+    __table_args__ = (
+        UniqueConstraint("site_id", "slug", name="uq_content_site_slug"),
+        Index("ix_content_site_updated_at_id", "site_id", "updated_at", "id"),
+        Index("ix_content_site_published_updated_at_id", "site_id", "is_published", "updated_at", "id"),
+    )
+
+    @property
+    def blocks(self):
+        # Block list in the shape of schemas.Block, in page order
+        return [row.to_dict() for row in sorted(self.block_rows, key=lambda row: row.position)]
+
+class ContentBlock(Base):
+    __tablename__ = "content_blocks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    page_id = Column(Integer, ForeignKey("content.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    key = Column(String(64), nullable=False) # the block's client-side id
+    type = Column(String(50), nullable=False, index=True)
+    data = Column(Text, default="{}")
+    hash = Column(String(64), nullable=False) # sha256 of type + data
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    page = relationship("Content", back_populates="block_rows")
+
+    __table_args__ = (
+        Index("ix_content_blocks_page_position", "page_id", "position"),
+        Index("ix_content_blocks_page_key", "page_id", "key"),
+    )
+
+    def to_dict(self):
+        return {"id": self.key, "type": self.type, "data": json.loads(self.data or "{}")}
+
+class PageRevision(Base):
+    __tablename__ = "page_revisions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    page_id = Column(Integer, ForeignKey("content.id", ondelete="CASCADE"), nullable=False)
+    number = Column(Integer, nullable=False) # 1, 2, ... per page
+    # A snapshot holds the whole page; other revisions hold a diff against the
+    # revision before them. base is the snapshot their chain starts from.
+    is_snapshot = Column(Boolean, nullable=False, default=False)
+    base = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False) # zlib-compressed, see revisions.py
+    hash = Column(String(64), nullable=False) # sha256 of the page document
+    size = Column(Integer, nullable=False) # uncompressed document bytes
+    title = Column(String(60)) # for listing without decoding anything
+    restored_from = Column(Integer, nullable=True) # revision number this one restored
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (UniqueConstraint("page_id", "number", name="uq_page_revisions_page_number"),)
+
+class SlugRedirect(Base):
+    __tablename__ = "slug_redirects"
+
+    id = Column(Integer, primary_key=True, index=True)
+    site_id = Column(Integer, ForeignKey("sites.id"), nullable=False, default=DEFAULT_SITE_ID,
+                     server_default=str(DEFAULT_SITE_ID))
+    slug = Column(String(100), nullable=False) # a slug the page had before
+    page_id = Column(Integer, ForeignKey("content.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (UniqueConstraint("site_id", "slug", name="uq_slug_redirects_site_slug"),)
+
 class Menu(Base):
     __tablename__ = "menus"
 
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String(100), unique=True, index=True, nullable=False)
+    site_id = Column(Integer, ForeignKey("sites.id"), nullable=False, default=DEFAULT_SITE_ID,
+                     server_default=str(DEFAULT_SITE_ID), index=True)
+    title = Column(String(100), index=True, nullable=False)
     logo_url = Column(String(255), nullable=True)
     items = Column(Text, default="[]")
     cta_text = Column(String(50), nullable=True)
@@ -29,8 +119,32 @@ class Menu(Base):
     cta_hover_color = Column(String(20), default="#2563eb")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (UniqueConstraint("site_id", "title", name="uq_menus_site_title"),)
+
 class Settings(Base):
     __tablename__ = "settings"
     id = Column(Integer, primary_key=True, index=True)
+    site_id = Column(Integer, ForeignKey("sites.id"), nullable=False, default=DEFAULT_SITE_ID,
+                     server_default=str(DEFAULT_SITE_ID), unique=True)
     brand_primary = Column(String(20), default="#3b82f6")
     brand_hover = Column(String(20), default="#2563eb")
+
+class Media(Base):
+    __tablename__ = "media"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Files are stored once by hash and shared; each site has its own record of them
+    site_id = Column(Integer, ForeignKey("sites.id"), nullable=False, default=DEFAULT_SITE_ID,
+                     server_default=str(DEFAULT_SITE_ID), index=True)
+    sha256 = Column(String(64), index=True, nullable=False)
+    filename = Column(String(255))
+    content_type = Column(String(100))
+    size = Column(Integer, nullable=False)
+    url = Column(String(255), nullable=False, index=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    variants = Column(Text, default="[]")
+    status = Column(String(20), default="pending") # 'pending', 'ready', 'skipped', 'failed'
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (UniqueConstraint("site_id", "sha256", name="uq_media_site_sha256"),)
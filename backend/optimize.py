@@ -0,0 +1,223 @@
+import os
+import re
+import threading
+from typing import Optional
+
+# Optional post-render pass over each generated page (HTML_OPTIMIZE=1 or
+# `build --optimize`): collapses template whitespace, inlines the CSS the
+# first screen needs and loads the full stylesheet without blocking, lazy
+# loads images below the fold, defers scripts and drops Swiper from pages
+# without a slider. Output stays equivalent to the unoptimized page.
+HTML_OPTIMIZE = os.getenv("HTML_OPTIMIZE", "0").lower() in ("1", "true", "yes")
+# Put between the first block and the rest while rendering; everything
+# before it (head, header, first block) counts as above the fold
+FOLD_MARKER = "<!--staticcms:fold-->"
+
+_RAW_RE = re.compile(r"(<(script|style|pre|textarea)\b[^>]*>.*?</\2\s*>)", re.IGNORECASE | re.DOTALL)
+_COMMENT_RE = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+_SPACE_RE = re.compile(r"\s+")
+_CLASS_ATTR_RE = re.compile(r"""\bclass\s*=\s*["']([^"']*)["']""", re.IGNORECASE)
+_IMG_RE = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+_SCRIPT_SRC_RE = re.compile(r"""<script\b([^>]*)\bsrc\s*=\s*["']([^"']+)["']([^>]*)>\s*</script>""", re.IGNORECASE)
+_INLINE_SCRIPT_RE = re.compile(r"<script>(.*?)</script>", re.IGNORECASE | re.DOTALL)
+_STYLE_RE = re.compile(r"(<style\b[^>]*>)(.*?)(</style>)", re.IGNORECASE | re.DOTALL)
+_LINK_RE = re.compile(r"""<link\b[^>]*\bhref\s*=\s*["']([^"']+)["'][^>]*>""", re.IGNORECASE)
+_SRC_ATTR_RE = re.compile(r"""\bsrc\s*=\s*["']([^"']+)["']""", re.IGNORECASE)
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_PUNCTUATION_RE = re.compile(r"\s*([{}:;,>])\s*")
+_SELECTOR_CLASS_RE = re.compile(r"\.((?:\\.|[\w-])+)")
+
+
+def _has_attr(tag: str, name: str) -> bool:
+    return re.search(rf"\s{name}\s*=|\s{name}(?=[\s>/])", tag, re.IGNORECASE) is not None
+
+
+def _add_attrs(tag: str, attrs: str) -> str:
+    end = -2 if tag.endswith("/>") else -1
+    return f"{tag[:end].rstrip()} {attrs}{tag[end:]}"
+
+
+def minify_css(css: str) -> str:
+    css = _CSS_COMMENT_RE.sub("", css)
+    css = _SPACE_RE.sub(" ", css)
+    return _CSS_PUNCTUATION_RE.sub(r"\1", css).replace(";}", "}").strip()
+
+
+def minify_html(html: str) -> str:
+    """Drop comments and collapse whitespace outside pre/textarea/script/style.
+
+    A whitespace run that spans lines becomes one newline, any other run one
+    space, so inline layout (which only sees "some whitespace") is unchanged.
+    """
+    parts = []
+    for number, part in enumerate(_RAW_RE.split(html)):
+        # split() yields text, raw element, the element's tag name, text, ...
+        kind = number % 3
+        if kind == 2:
+            continue
+        if kind == 1:
+            if part[:6].lower() == "<style":
+                part = _STYLE_RE.sub(lambda m: m.group(1) + minify_css(m.group(2)) + m.group(3), part)
+            parts.append(part)
+            continue
+        part = _COMMENT_RE.sub("", part)
+        part = _SPACE_RE.sub(lambda m: "\n" if "\n" in m.group(0) else " ", part)
+        parts.append(part)
+    return "".join(parts).strip()
+
+
+# Critical CSS: the rules of the built stylesheet that the first screen uses
+
+def _split_rules(css: str) -> list:
+    """Top-level ``(prelude, body)`` pairs of a minified stylesheet."""
+    rules, depth, start, prelude = [], 0, 0, None
+    for position, char in enumerate(css):
+        if char == "{":
+            if depth == 0:
+                prelude, start = css[start:position].strip(), position + 1
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                rules.append((prelude, css[start:position]))
+                start = position + 1
+    return rules
+
+
+def _selector_classes(selector: str) -> set:
+    return {name.replace("\\", "") for name in _SELECTOR_CLASS_RE.findall(selector)}
+
+
+def _critical_rules(rules: list, classes: set) -> str:
+    out = []
+    for prelude, body in rules:
+        if prelude.startswith("@media") or prelude.startswith("@supports"):
+            inner = _critical_rules(_split_rules(body), classes)
+            if inner:
+                out.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith("@"):
+            # @keyframes, @font-face, ...: small, keep them whole
+            out.append(f"{prelude}{{{body}}}")
+        else:
+            # Keep a rule if any selector in its list applies: element/base
+            # rules always, class rules when the first screen uses the class
+            selectors = prelude.split(",")
+            if any(not _selector_classes(s) or _selector_classes(s) <= classes for s in selectors):
+                out.append(f"{prelude}{{{body}}}")
+    return "".join(out)
+
+
+_stylesheets = {}
+_stylesheets_lock = threading.Lock()
+
+
+def _stylesheet_rules(path: str) -> Optional[list]:
+    # Fingerprinted files never change, so parse each once per process
+    with _stylesheets_lock:
+        rules = _stylesheets.get(path)
+    if rules is None:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                rules = _split_rules(f.read())
+        except OSError:
+            return None
+        with _stylesheets_lock:
+            _stylesheets[path] = rules
+    return rules
+
+
+def _inline_critical_css(html: str, css_url: str, css_path: str, classes: set) -> tuple:
+    rules = _stylesheet_rules(css_path)
+    if rules is None:
+        return html, 0
+    critical = _critical_rules(rules, classes)
+    link = next((m for m in _LINK_RE.finditer(html) if m.group(1) == css_url), None)
+    if link is None:
+        return html, 0
+    # Full stylesheet loads without blocking first paint
+    replacement = (f"<style>{critical}</style>"
+                   f'<link rel="preload" href="{css_url}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">'
+                   f'<noscript><link rel="stylesheet" href="{css_url}"></noscript>')
+    return html[:link.start()] + replacement + html[link.end():], len(critical)
+
+
+def optimize_page(html: str, assets: dict, output_dir: str, dimensions: Optional[dict] = None) -> tuple:
+    """Return ``(html, info)`` for one rendered page.
+
+    ``assets`` are the page's asset URLs (site["assets"]) and ``dimensions``
+    maps image URLs to ``[width, height]``. ``info`` says what was done.
+    """
+    dimensions = dimensions or {}
+    info = {"lazy_images": 0, "deferred_scripts": 0, "critical_css": 0, "dropped": []}
+    fold = html.find(FOLD_MARKER)
+    fold = len(html) if fold < 0 else fold
+    uses_swiper = any("swiper" in value.split() for value in _CLASS_ATTR_RE.findall(html))
+    main_start = html.find("<main")
+
+    # Images: async decoding everywhere, lazy loading below the fold, sizes from the media table
+    first_image = True
+
+    def image(match):
+        nonlocal first_image
+        tag = match.group(0)
+        attrs = []
+        if not _has_attr(tag, "decoding"):
+            attrs.append('decoding="async"')
+        if match.start() >= fold:
+            if not _has_attr(tag, "loading"):
+                attrs.append('loading="lazy"')
+                info["lazy_images"] += 1
+        elif first_image and match.start() > main_start and not _has_attr(tag, "fetchpriority"):
+            # First content image: most likely the largest thing on the first screen
+            attrs.append('fetchpriority="high"')
+        if main_start < match.start() < fold:
+            first_image = False
+        src = _SRC_ATTR_RE.search(tag)
+        size = dimensions.get(src.group(1)) if src else None
+        if size and not _has_attr(tag, "width") and not _has_attr(tag, "height"):
+            attrs.append(f'width="{size[0]}" height="{size[1]}"')
+        return _add_attrs(tag, " ".join(attrs)) if attrs else tag
+
+    html = _IMG_RE.sub(image, html)
+
+    # Scripts: drop Swiper where no slider uses it, defer the rest. The
+    # Tailwind CDN fallback has to run before paint, so it is left alone.
+    swiper = {assets.get("swiper_js"), assets.get("swiper_css")} - {None}
+
+    def script(match):
+        tag, src = match.group(0), match.group(2)
+        if src in swiper and not uses_swiper:
+            info["dropped"].append(src)
+            return ""
+        if src == assets.get("tailwind_cdn") or _has_attr(tag, "defer") or _has_attr(tag, "async") \
+                or "module" in tag.lower():
+            return tag
+        info["deferred_scripts"] += 1
+        return f"<script{match.group(1)}src=\"{src}\"{match.group(3)} defer></script>"
+
+    html = _SCRIPT_SRC_RE.sub(script, html)
+    if not uses_swiper:
+        def link(match):
+            if match.group(1) in swiper:
+                info["dropped"].append(match.group(1))
+                return ""
+            return match.group(0)
+        html = _LINK_RE.sub(link, html)
+
+    # Inline scripts may use the deferred libraries, so they wait for them too
+    def inline(match):
+        code = match.group(1)
+        if "DOMContentLoaded" in code or not code.strip():
+            return match.group(0)
+        return f"<script>document.addEventListener('DOMContentLoaded', function () {{{code}}});</script>"
+
+    html = _INLINE_SCRIPT_RE.sub(inline, html)
+
+    css_url = assets.get("css")
+    if css_url:
+        fold = html.find(FOLD_MARKER)
+        above = html if fold < 0 else html[:fold]
+        classes = set(" ".join(_CLASS_ATTR_RE.findall(above)).split())
+        html, info["critical_css"] = _inline_critical_css(html, css_url, os.path.join(output_dir, css_url), classes)
+
+    return minify_html(html.replace(FOLD_MARKER, "")), info
@@ -0,0 +1,122 @@
+import json
+import base64
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import and_, or_, literal, DateTime, String
+from sqlalchemy.orm import Query
+from sqlalchemy.types import TypeDecorator
+
+# Keyset ("seek") pagination: the cursor carries the sort key and id of the
+# last row served, so every page is an index range scan instead of an OFFSET
+# that re-reads all the rows before it.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+# Marks a cursor whose sort value is an ISO datetime rather than text
+_DATETIME_TAG = "dt"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class _KeysetDateTime(TypeDecorator):
+    """Binds a datetime cursor value. Other databases get a real timestamp;
+    SQLite stores func.now() timestamps as "YYYY-MM-DD HH:MM:SS" text, so it
+    gets the same text and rows with equal timestamps tie exactly."""
+    impl = DateTime
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(String())
+        return super().load_dialect_impl(dialect)
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and dialect.name == "sqlite":
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value.isoformat(sep=" ")
+        return value
+
+
+def encode_cursor(sort_value, row_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        payload = [sort_value.isoformat(), row_id, _DATETIME_TAG]
+    else:
+        payload = [sort_value, row_id]
+    raw = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Return ``(sort_value, row_id)``; datetimes come back as datetime."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, list) or len(payload) not in (2, 3):
+            raise ValueError(payload)
+        sort_value, row_id = payload[0], int(payload[1])
+        # Only scalars can be compared with a column
+        if not isinstance(sort_value, (str, int, float)):
+            raise TypeError(sort_value)
+        if len(payload) == 3:
+            if payload[2] != _DATETIME_TAG or not isinstance(sort_value, str):
+                raise ValueError(payload[2])
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, row_id
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def apply_keyset(query, sort_column, id_column, cursor: Optional[str] = None,
+                 limit: int = DEFAULT_PAGE_SIZE, descending: bool = True):
+    """Filter, order and limit ``query`` (an ORM Query or a select()) to the
+    page after ``cursor``. One extra row is fetched to detect a next page.
+    ``sort_column`` must not contain NULLs.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if sort_column is not id_column:
+            # A cursor from another sort order (or a forged one) must not reach the database
+            if isinstance(sort_column.type, DateTime) != isinstance(sort_value, datetime):
+                raise InvalidCursor("Invalid cursor")
+            sort_value = literal(sort_value, _KeysetDateTime(timezone=sort_column.type.timezone) if isinstance(sort_value, datetime)
+                                 else sort_column.type)
+        if sort_column is id_column:
+            query = query.filter(id_column < row_id if descending else id_column > row_id)
+        elif descending:
+            query = query.filter(or_(sort_column < sort_value, and_(sort_column == sort_value, id_column < row_id)))
+        else:
+            query = query.filter(or_(sort_column > sort_value, and_(sort_column == sort_value, id_column > row_id)))
+
+    if sort_column is id_column:
+        order = [id_column.desc() if descending else id_column.asc()]
+    else:
+        order = ([sort_column.desc(), id_column.desc()] if descending
+                 else [sort_column.asc(), id_column.asc()])
+    return query.order_by(*order).limit(page_size(limit) + 1)
+
+
+def page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def split_page(rows: list, sort_column, id_column, limit: int = DEFAULT_PAGE_SIZE) -> tuple:
+    """Return ``(rows, next_cursor)`` from the rows fetched by apply_keyset;
+    ``next_cursor`` is None on the last page."""
+    limit = page_size(limit)
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = list(rows[:limit])
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+
+def keyset_page(query: Query, sort_column, id_column, cursor: Optional[str] = None,
+                limit: int = DEFAULT_PAGE_SIZE, descending: bool = True) -> tuple:
+    """Return ``(rows, next_cursor)`` for one page of an ORM ``query``."""
+    rows = apply_keyset(query, sort_column, id_column, cursor, limit, descending).all()
+    return split_page(rows, sort_column, id_column, limit)
@@ -0,0 +1,72 @@
+import os
+import time
+import threading
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from . import schemas
+from .models import DEFAULT_SITE_ID
+from .generator import load_site_context, media_urls, render_page
+from .media import srcset_map
+from .slugs import slugify
+from .templating import get_registry
+
+# Unsaved pages rendered in memory for the editor's preview pane. The site
+# context (menu, brand settings, image srcsets) is the same for every
+# preview of a site, so it is loaded once per site and kept until a menu,
+# settings or media write drops it. The TTL bounds staleness for writes made outside the API.
+PREVIEW_CONTEXT_TTL = float(os.getenv("PREVIEW_CONTEXT_TTL", "300"))
+
+
+class PreviewContext:
+    def __init__(self, ttl: float = PREVIEW_CONTEXT_TTL):
+        self.ttl = ttl
+        self._values = {}  # site_id -> (site, srcsets, expires)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, site_id: int = DEFAULT_SITE_ID) -> tuple:
+        """Return ``(site, srcsets)`` of a site, loading them if not cached."""
+        with self._lock:
+            value, generation = self._values.get(site_id), self._generation
+        if value is not None and value[2] >= time.monotonic():
+            return value[0], value[1]
+        site, srcsets = load_site_context(db, site_id), srcset_map(db)
+        with self._lock:
+            # Don't keep a context that was invalidated while it was loading
+            if generation == self._generation:
+                self._values[site_id] = (site, srcsets, time.monotonic() + self.ttl)
+        return site, srcsets
+
+    def invalidate(self):
+        with self._lock:
+            self._values.clear()
+            self._generation += 1
+
+
+preview_context = PreviewContext()
+
+
+def render_preview(db: Session, page: schemas.PageCreate, site_id: int = DEFAULT_SITE_ID) -> tuple:
+    """Render ``page`` with base.html and the context of site ``site_id``.
+
+    Returns ``(html, errors)``; block render errors are listed instead of raised.
+    """
+    site, srcsets = preview_context.get(db, site_id)
+    page_blocks = [block.model_dump() for block in page.blocks]
+    payload = {
+        "id": None,
+        "title": page.title,
+        "slug": slugify(page.title) or "preview",
+        "meta_description": page.meta_description,
+        "body": page.body,
+        "created_at": datetime.now(),
+        "blocks": page_blocks,
+        "media": {url: srcsets[url] for url in media_urls(page_blocks) if url in srcsets},
+    }
+    templates = get_registry()
+    # Template edits show up in the next preview, as they would in the next build
+    templates.refresh()
+    stats = {"blocks": [], "errors": [], "fragments": {"memory": 0, "disk": 0, "miss": 0}}
+    return render_page(templates, payload, site, stats), stats["errors"]
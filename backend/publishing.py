@@ -0,0 +1,149 @@
+import os
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Scheduled publishing. Pages carry optional publish_at / unpublish_at times
+# (naive UTC, like func.now() on SQLite). One background thread sleeps until
+# the earliest of them, found with an indexed MIN(), applies every change due
+# by then and hands them to ``on_change`` grouped by site, so pages going live
+# together cost one incremental build per site. A time is cleared once it has
+# been applied, so only pending ones are ever looked at.
+# Pages due this soon after the earliest one go out in the same batch
+PUBLISH_WINDOW_SECONDS = float(os.getenv("PUBLISH_WINDOW_SECONDS", "1.0"))
+# Longest sleep: times written to the database behind the API's back are
+# picked up within this delay; the API wakes the thread itself (notify())
+PUBLISH_MAX_SLEEP_SECONDS = float(os.getenv("PUBLISH_MAX_SLEEP_SECONDS", "300"))
+
+
+def utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def next_due(db: Session) -> Optional[datetime]:
+    """Earliest pending publish or unpublish time, or None."""
+    times = [db.query(func.min(models.Content.publish_at)).scalar(),
+             db.query(func.min(models.Content.unpublish_at)).scalar()]
+    times = [utc_naive(value) for value in times if value is not None]
+    return min(times) if times else None
+
+
+def apply_due(db: Session, now: Optional[datetime] = None, window: float = PUBLISH_WINDOW_SECONDS) -> dict:
+    """Publish and unpublish every page due by ``now`` + ``window`` and commit.
+
+    Returns ``{site_id: [(page_id, slug, "publish" | "unpublish"), ...]}``.
+    A page due for both ends up in the state of the later of the two.
+    """
+    until = (now or utc_now()) + timedelta(seconds=window)
+    events = []
+    for column, action in ((models.Content.publish_at, "publish"), (models.Content.unpublish_at, "unpublish")):
+        for page in db.query(models.Content).filter(column <= until).order_by(column):
+            events.append((utc_naive(getattr(page, column.key)), action, page))
+    changes = {}
+    for _, action, page in sorted(events, key=lambda event: (event[0], event[1] == "unpublish")):
+        if action == "publish":
+            page.is_published, page.publish_at = True, None
+        else:
+            page.is_published, page.unpublish_at = False, None
+        changes.setdefault(page.site_id, []).append((page.id, page.slug, action))
+    if changes:
+        db.commit()
+    return changes
+
+
+def upcoming(db: Session, site_id: int, limit: int = 50) -> list:
+    """Pending changes of a site, soonest first."""
+    events = []
+    for column, action in ((models.Content.publish_at, "publish"), (models.Content.unpublish_at, "unpublish")):
+        rows = (db.query(models.Content.id, models.Content.title, models.Content.slug, column)
+                .filter(models.Content.site_id == site_id, column.isnot(None)).order_by(column).limit(limit))
+        events.extend({"page_id": page_id, "title": title, "slug": slug, "action": action, "at": utc_naive(at)}
+                      for page_id, title, slug, at in rows)
+    return sorted(events, key=lambda event: event["at"])[:limit]
+
+
+class PublishScheduler:
+    """Background thread that applies scheduled (un)publishing on time.
+
+    It sleeps until the next due time (at most PUBLISH_MAX_SLEEP_SECONDS);
+    call ``notify()`` after saving a schedule so it re-reads the next one.
+    ``on_change(site_id, changes)`` runs after each batch is committed,
+    typically to request a build of the site.
+    """
+
+    def __init__(self, session_factory: Callable, on_change: Callable[[int, list], None],
+                 window: float = PUBLISH_WINDOW_SECONDS, max_sleep: float = PUBLISH_MAX_SLEEP_SECONDS):
+        self.session_factory = session_factory
+        self.on_change = on_change
+        self.window = window
+        self.max_sleep = max_sleep
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._notified = False
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._loop, name="publish-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify(self):
+        with self._cond:
+            self._notified = True
+            self._cond.notify_all()
+
+    def run_due(self) -> Optional[datetime]:
+        """Apply what is due now; returns the next due time."""
+        db = self.session_factory()
+        try:
+            changes = apply_due(db, window=self.window)
+            due = next_due(db)
+        finally:
+            db.close()
+        for site_id, pages in changes.items():
+            logger.info("Scheduled publishing on site %d: %s", site_id,
+                        ", ".join(f"{action} {slug}" for _, slug, action in pages))
+            self.on_change(site_id, pages)
+        return due
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                self._notified = False
+            try:
+                due = self.run_due()
+            except Exception as e:
+                # Database busy or gone: try again after a while
+                logger.error("Scheduled publishing failed: %s", e)
+                due = None
+            delay = self.max_sleep if due is None else (due - utc_now()).total_seconds()
+            with self._cond:
+                if not self._stopping and not self._notified and delay > 0:
+                    self._cond.wait(min(delay, self.max_sleep))
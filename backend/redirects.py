@@ -0,0 +1,89 @@
+import os
+import json
+import html
+from typing import Optional
+
+from sqlalchemy import delete, event, inspect
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .releases import atomic_write
+
+# A page's slug follows its title, so renaming a page moves its URL. Every
+# slug a page gives up is kept in slug_redirects, and builds turn the ones no
+# current page uses into small redirect pages at the old URL (plus a
+# redirects.json map for hosts that can do real redirects), so links and
+# bookmarks to the old URL keep working.
+REDIRECTS_FILE = "redirects.json"
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _record_renames(session: Session, flush_context, instances):
+    renames = []
+    for obj in session.dirty:
+        if not isinstance(obj, models.Content) or obj.id is None:
+            continue
+        old = inspect(obj).attrs.slug.history.deleted
+        if old and old[0] and old[0] != obj.slug:
+            renames.append({"site_id": obj.site_id, "slug": old[0], "page_id": obj.id})
+    if not renames:
+        return
+    conn = session.connection()
+    table = models.SlugRedirect.__table__
+    for rename in renames:
+        # The newest page to leave a slug gets its redirect
+        conn.execute(delete(table).where(table.c.site_id == rename["site_id"], table.c.slug == rename["slug"]))
+    conn.execute(table.insert(), renames)
+
+
+def redirect_map(db: Session, pages: list, site_id: int) -> dict:
+    """Map old page files to the current file of the page, for ``pages`` (the
+    published pages of the site). Slugs a page uses now are never redirected."""
+    current = {page.id: page.slug for page in pages}
+    taken = set(current.values())
+    rows = (db.query(models.SlugRedirect.slug, models.SlugRedirect.page_id)
+            .filter(models.SlugRedirect.site_id == site_id).order_by(models.SlugRedirect.slug))
+    return {f"{slug}.html": f"{current[page_id]}.html" for slug, page_id in rows
+            if page_id in current and slug not in taken}
+
+
+def redirect_html(target: str, site_url: str = "") -> str:
+    url = html.escape(target)
+    canonical = html.escape(f"{site_url}/{target}" if site_url else target)
+    return ('<!DOCTYPE html>\n<html lang="en"><head><meta charset="UTF-8"><title>Moved</title>'
+            f'<link rel="canonical" href="{canonical}"><meta name="robots" content="noindex">'
+            f'<meta http-equiv="refresh" content="0; url={url}"></head>'
+            f'<body><p>This page has moved to <a href="{url}">{url}</a>.</p></body></html>\n')
+
+
+def write_redirects(output_dir: str, redirects: dict, previous: Optional[dict] = None, site_url: str = "",
+                    pages: frozenset = frozenset()) -> dict:
+    """Write a redirect page per entry of ``redirects`` and the redirects.json
+    map, and remove the redirect pages of ``previous`` (the last build's map)
+    that are gone, unless a page (one of the files in ``pages``) took their
+    place. Returns ``{"written", "removed", "bytes_written"}``."""
+    previous = previous or {}
+    result = {"written": [], "removed": [], "bytes_written": 0}
+    for old_file, target in redirects.items():
+        path = os.path.join(output_dir, old_file)
+        if previous.get(old_file) == target and os.path.exists(path):
+            continue
+        data = redirect_html(target, site_url).encode("utf-8")
+        with atomic_write(path, "wb") as f:
+            f.write(data)
+        result["written"].append(old_file)
+        result["bytes_written"] += len(data)
+    for old_file in previous.keys() - redirects.keys() - pages:
+        path = os.path.join(output_dir, old_file)
+        if os.path.exists(path):
+            os.remove(path)
+            result["removed"].append(old_file)
+
+    path = os.path.join(output_dir, REDIRECTS_FILE)
+    payload = json.dumps({f"/{old}": f"/{new}" for old, new in sorted(redirects.items())}, indent=1).encode("utf-8")
+    if redirects != previous or not os.path.exists(path):
+        with atomic_write(path, "wb") as f:
+            f.write(payload)
+        result["bytes_written"] += len(payload)
+    return result
@@ -0,0 +1,200 @@
+import os
+import re
+import shutil
+import itertools
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+# OUTPUT_DIR is a symlink to the live release. Every build is written into a
+# fresh staging directory under RELEASES_DIR and then swapped in with a single
+# rename of the symlink, so readers never see a half-written site. The
+# previous release is kept so it can be swapped back instantly.
+KEEP_RELEASES = int(os.getenv("BUILD_KEEP_RELEASES", "2"))
+UPLOADS_NAME = "uploads"
+# Names made by _new_release_dir; anything else in a releases dir is not a release
+_RELEASE_NAME_RE = re.compile(r"^\d{8}-\d{6}-\d{6}-\d+-\d+$")
+
+_sequence = itertools.count()
+
+
+def _default_output_dir() -> str:
+    # Imported here: sites imports sitemap, which imports this module
+    from .sites import OUTPUT_DIR
+    return OUTPUT_DIR
+
+
+def releases_dir_for(output_dir: str) -> str:
+    # RELEASES_DIR only moves the default site's releases; the other sites keep
+    # theirs beside their own tree, so pruning or rolling back one site never
+    # touches the releases of another
+    configured = os.getenv("RELEASES_DIR")
+    if configured and os.path.abspath(output_dir) == os.path.abspath(_default_output_dir()):
+        return configured
+    return os.path.normpath(output_dir) + ".releases"
+
+
+def uploads_dir() -> str:
+    # One store for every site, next to the default site's releases and linked
+    # into every release of every site
+    return os.getenv("UPLOAD_DIR") or os.path.join(releases_dir_for(_default_output_dir()), UPLOADS_NAME)
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w", encoding: Optional[str] = "utf-8"):
+    """Write ``path`` through a temp file and rename it into place.
+
+    Files in a staging release are hard links shared with the live release,
+    so they must be replaced, never truncated and rewritten.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    kwargs = {"encoding": encoding} if "b" not in mode else {}
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def link_or_copy(src: str, dst: str):
+    tmp_path = f"{dst}.{os.getpid()}.tmp"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+def _swap_symlink(target: str, link_path: str):
+    tmp_link = f"{link_path}.{os.getpid()}.swap"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.relpath(target, os.path.dirname(os.path.abspath(link_path))), tmp_link,
+               target_is_directory=True)
+    os.replace(tmp_link, link_path)
+
+
+def _link_uploads(output_dir: str, release: str):
+    uploads = uploads_dir()
+    os.makedirs(uploads, exist_ok=True)
+    link_path = os.path.join(release, UPLOADS_NAME)
+    if not os.path.lexists(link_path):
+        os.symlink(os.path.relpath(uploads, release), link_path, target_is_directory=True)
+    elif os.path.islink(link_path) and os.path.realpath(link_path) != os.path.realpath(uploads):
+        # The store moved (UPLOAD_DIR or RELEASES_DIR changed): follow it
+        _swap_symlink(uploads, link_path)
+
+
+def _new_release_dir(output_dir: str) -> str:
+    releases = releases_dir_for(output_dir)
+    os.makedirs(releases, exist_ok=True)
+    name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}-{next(_sequence)}"
+    path = os.path.join(releases, name)
+    os.makedirs(path)
+    return path
+
+
+def current_release(output_dir: str) -> Optional[str]:
+    if os.path.islink(output_dir):
+        return os.path.realpath(output_dir)
+    return None
+
+
+def ensure_output_dir(output_dir: str) -> str:
+    """Make sure ``output_dir`` is a symlink to a release and return that release.
+
+    A plain directory left by older versions becomes the first release, and
+    its uploads move to the shared uploads directory.
+    """
+    release = current_release(output_dir)
+    if release and os.path.isdir(release):
+        _link_uploads(output_dir, release)
+        return release
+
+    release = _new_release_dir(output_dir)
+    if os.path.isdir(output_dir) and not os.path.islink(output_dir):
+        legacy_uploads = os.path.join(output_dir, UPLOADS_NAME)
+        uploads = uploads_dir()
+        if os.path.isdir(legacy_uploads) and not os.path.islink(legacy_uploads):
+            if os.path.exists(uploads):
+                for name in os.listdir(legacy_uploads):
+                    dst = os.path.join(uploads, name)
+                    if not os.path.exists(dst):
+                        shutil.move(os.path.join(legacy_uploads, name), dst)
+                shutil.rmtree(legacy_uploads)
+            else:
+                shutil.move(legacy_uploads, uploads)
+        os.rmdir(release)
+        shutil.move(output_dir, release)
+    elif os.path.lexists(output_dir):
+        # Dangling symlink to a release that was removed
+        os.remove(output_dir)
+    _link_uploads(output_dir, release)
+    _swap_symlink(release, output_dir)
+    return release
+
+
+def stage_release(output_dir: str) -> str:
+    """Create a staging release pre-populated with hard links to the live files."""
+    current = ensure_output_dir(output_dir)
+    staging = _new_release_dir(output_dir)
+    for root, dirs, files in os.walk(current):
+        rel_root = os.path.relpath(root, current)
+        # The uploads link is recreated, never walked
+        dirs[:] = [d for d in dirs if not (rel_root == "." and d == UPLOADS_NAME)]
+        target_root = staging if rel_root == "." else os.path.join(staging, rel_root)
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            link_or_copy(os.path.join(root, name), os.path.join(target_root, name))
+    _link_uploads(output_dir, staging)
+    return staging
+
+
+def discard_release(release: str):
+    shutil.rmtree(release, ignore_errors=True)
+
+
+def activate_release(output_dir: str, release: str):
+    _swap_symlink(release, output_dir)
+    prune_releases(output_dir)
+
+
+def list_releases(output_dir: str) -> list:
+    releases = releases_dir_for(output_dir)
+    if not os.path.isdir(releases):
+        return []
+    uploads = os.path.realpath(uploads_dir())
+    names = [
+        name for name in os.listdir(releases)
+        if _RELEASE_NAME_RE.match(name) and os.path.isdir(os.path.join(releases, name))
+        and os.path.realpath(os.path.join(releases, name)) != uploads
+    ]
+    return sorted(names)
+
+
+def prune_releases(output_dir: str, keep: int = KEEP_RELEASES):
+    current = current_release(output_dir)
+    names = list_releases(output_dir)
+    releases = releases_dir_for(output_dir)
+    for name in names[:-keep] if keep > 0 else names:
+        path = os.path.join(releases, name)
+        if current and os.path.realpath(path) == current:
+            continue
+        discard_release(path)
+
+
+def rollback_release(output_dir: str) -> Optional[str]:
+    """Point ``output_dir`` back at the release before the live one."""
+    current = current_release(output_dir)
+    releases = releases_dir_for(output_dir)
+    names = list_releases(output_dir)
+    current_name = os.path.basename(current) if current else None
+    older = [name for name in names if current_name is None or name < current_name]
+    if not older:
+        return None
+    target = os.path.join(releases, older[-1])
+    _swap_symlink(target, output_dir)
+    return older[-1]
@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import zlib
+import difflib
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, delete, event, func, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import models
+from .blocks import SQLITE_MAX_VARIABLES, load_blocks
+from .database import SessionLocal
+
+# Page revision history. Every flush that changes a page (its fields or its
+# blocks) appends a revision holding the page as it now is. A revision is
+# either a snapshot of the whole page or a line diff against the revision
+# before it, zlib-compressed either way; every REVISION_SNAPSHOT_INTERVAL-th
+# revision is a snapshot, so rebuilding any revision decodes one snapshot and
+# at most that many diffs. Old revisions are dropped by compact_revisions(),
+# which also runs on save once a page has REVISION_COMPACT_SLACK revisions
+# more than it keeps.
+REVISION_SNAPSHOT_INTERVAL = int(os.getenv("REVISION_SNAPSHOT_INTERVAL", "20"))
+# Newest revisions kept per page (0 keeps all) and the age after which older
+# ones go as well (0 = no age limit); the newest revision is always kept
+REVISION_KEEP = int(os.getenv("REVISION_KEEP", "100"))
+REVISION_MAX_AGE_DAYS = float(os.getenv("REVISION_MAX_AGE_DAYS", "0"))
+REVISION_COMPACT_SLACK = 10
+REVISION_COMPRESSION_LEVEL = 6
+
+# What a revision captures of a page, besides its blocks
+DOCUMENT_FIELDS = ("title", "slug", "meta_description", "body", "is_published", "is_homepage")
+
+PageRevision = models.PageRevision
+
+
+def _chunks(ids: list):
+    for start in range(0, len(ids), SQLITE_MAX_VARIABLES):
+        yield ids[start:start + SQLITE_MAX_VARIABLES]
+
+
+def page_documents(db: Session, page_ids: Iterable[int]) -> dict:
+    """Map page id to its document: the DOCUMENT_FIELDS plus its blocks."""
+    page_ids = sorted(set(page_ids))
+    columns = [models.Content.id] + [getattr(models.Content, name) for name in DOCUMENT_FIELDS]
+    documents = {}
+    for chunk in _chunks(page_ids):
+        for row in db.query(*columns).filter(models.Content.id.in_(chunk)):
+            documents[row.id] = {name: getattr(row, name) for name in DOCUMENT_FIELDS}
+    page_blocks = load_blocks(db, documents)
+    for page_id, document in documents.items():
+        document["blocks"] = [{"id": block["id"], "type": block["type"], "data": block["data"]}
+                              for block in page_blocks.get(page_id, [])]
+    return documents
+
+
+# Documents are diffed as pretty-printed JSON, so a change inside one block's
+# data only touches the lines of the values that changed
+
+def _lines(document: dict) -> list:
+    return json.dumps(document, indent=1, sort_keys=True, ensure_ascii=False, default=str).split("\n")
+
+
+def make_delta(old: list, new: list) -> list:
+    """Turn ``old`` lines into ``new``: n >= 0 copies n lines, -n skips n, a list inserts it."""
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new).get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append(new[j1:j2])
+    return ops
+
+
+def apply_delta(old: list, ops: list) -> list:
+    lines, position = [], 0
+    for op in ops:
+        if isinstance(op, list):
+            lines.extend(op)
+        elif op >= 0:
+            lines.extend(old[position:position + op])
+            position += op
+        else:
+            position -= op
+    return lines
+
+
+def _compress(value) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8"),
+                         REVISION_COMPRESSION_LEVEL)
+
+
+def _decompress(data: bytes):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def _chain_lines(rows) -> Optional[list]:
+    # rows: (is_snapshot, data) from the chain's snapshot up to the revision, in order
+    lines = None
+    for is_snapshot, data in rows:
+        lines = _decompress(data) if is_snapshot else apply_delta(lines, _decompress(data))
+    return lines
+
+
+def _chain_select(page_id: int, base: int, number: int):
+    return (select(PageRevision.is_snapshot, PageRevision.data)
+            .where(PageRevision.page_id == page_id, PageRevision.number.between(base, number))
+            .order_by(PageRevision.number))
+
+
+def _base_select(page_id: int, number: int):
+    return select(PageRevision.base).where(PageRevision.page_id == page_id, PageRevision.number == number)
+
+
+def _revision_lines(db: Session, page_id: int, number: int) -> Optional[list]:
+    base = db.execute(_base_select(page_id, number)).scalar()
+    if base is None:
+        return None
+    return _chain_lines(db.execute(_chain_select(page_id, base, number)).all())
+
+
+def load_revision(db: Session, page_id: int, number: int) -> Optional[dict]:
+    """The page document saved as revision ``number``; None if there is no such revision."""
+    lines = _revision_lines(db, page_id, number)
+    return None if lines is None else json.loads("\n".join(lines))
+
+
+async def load_revision_async(db, page_id: int, number: int) -> Optional[dict]:
+    base = (await db.execute(_base_select(page_id, number))).scalar()
+    if base is None:
+        return None
+    lines = _chain_lines((await db.execute(_chain_select(page_id, base, number))).all())
+    return json.loads("\n".join(lines))
+
+
+def _latest(db: Session, page_ids: list) -> dict:
+    # page id -> (newest number, its base, its hash, oldest number)
+    latest = {}
+    for chunk in _chunks(page_ids):
+        newest = (select(PageRevision.page_id, func.max(PageRevision.number).label("number"),
+                         func.min(PageRevision.number).label("oldest"))
+                  .where(PageRevision.page_id.in_(chunk)).group_by(PageRevision.page_id).subquery())
+        rows = db.execute(select(PageRevision.page_id, PageRevision.number, PageRevision.base, PageRevision.hash,
+                                 newest.c.oldest)
+                          .join(newest, and_(PageRevision.page_id == newest.c.page_id,
+                                             PageRevision.number == newest.c.number)))
+        for page_id, number, base, digest, oldest in rows:
+            latest[page_id] = (number, base, digest, oldest)
+    return latest
+
+
+def _new_revision(db: Session, page_id: int, document: dict, previous: Optional[tuple]) -> Optional[dict]:
+    lines = _lines(document)
+    text = "\n".join(lines)
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if previous and previous[2] == digest:
+        return None
+    number = previous[0] + 1 if previous else 1
+    row = {"page_id": page_id, "number": number, "is_snapshot": True, "base": number, "data": _compress(lines),
+           "hash": digest, "size": len(text.encode("utf-8")), "title": (document.get("title") or "")[:60]}
+    if previous and number - previous[1] < REVISION_SNAPSHOT_INTERVAL:
+        delta = _compress(make_delta(_revision_lines(db, page_id, previous[0]), lines))
+        # A rewrite of most of the page diffs worse than it compresses
+        if len(delta) < len(row["data"]):
+            row.update(is_snapshot=False, base=previous[1], data=delta)
+    return row
+
+
+def record_revisions(conn: Connection, page_ids: Iterable[int], restored_from: Optional[dict] = None,
+                     missing_only: bool = False) -> int:
+    """Append a revision for each page whose document changed since its last
+    one (or, with ``missing_only``, that has none yet). Returns how many."""
+    page_ids = sorted(set(page_ids))
+    if not page_ids:
+        return 0
+    restored_from = restored_from or {}
+    db = Session(bind=conn)
+    try:
+        latest = _latest(db, page_ids)
+        if missing_only:
+            page_ids = [page_id for page_id in page_ids if page_id not in latest]
+        rows = []
+        for page_id, document in page_documents(db, page_ids).items():
+            row = _new_revision(db, page_id, document, latest.get(page_id))
+            if row is not None:
+                row["restored_from"] = restored_from.get(page_id)
+                rows.append(row)
+        if rows:
+            conn.execute(PageRevision.__table__.insert(), rows)
+        for row in rows:
+            oldest = latest[row["page_id"]][3] if row["page_id"] in latest else 1
+            if REVISION_KEEP and row["number"] - oldest + 1 > REVISION_KEEP + REVISION_COMPACT_SLACK:
+                compact_page(db, row["page_id"], REVISION_KEEP, REVISION_MAX_AGE_DAYS)
+        return len(rows)
+    finally:
+        db.close()
+
+
+def remove_revisions(conn: Connection, page_ids: Iterable[int]):
+    for chunk in _chunks(sorted(set(page_ids))):
+        conn.execute(delete(PageRevision).where(PageRevision.page_id.in_(chunk)))
+
+
+def _touched_pages(session: Session) -> tuple:
+    # (changed, removed) page ids among the session's pending changes
+    changed, removed = set(), set()
+    for obj in session.new | session.dirty:
+        if isinstance(obj, models.Content):
+            changed.add(obj)
+        elif isinstance(obj, models.ContentBlock) and (obj.page_id is not None or obj.page is not None):
+            changed.add(obj.page if obj.page is not None else obj.page_id)
+    for obj in session.deleted:
+        if isinstance(obj, models.Content):
+            removed.add(obj)
+        elif isinstance(obj, models.ContentBlock) and obj.page_id is not None:
+            changed.add(obj.page_id)
+    return changed, removed
+
+
+def _page_id(page) -> Optional[int]:
+    return page.id if isinstance(page, models.Content) else page
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _baseline_before_flush(session: Session, flush_context, instances):
+    # Pages saved before revisions existed get their current state recorded
+    # first, so their first tracked edit can be undone too
+    changed, removed = _touched_pages(session)
+    page_ids = {_page_id(page) for page in changed | removed if not (isinstance(page, models.Content)
+                                                                    and page in session.new)}
+    page_ids.discard(None)
+    if page_ids:
+        record_revisions(session.connection(), page_ids, missing_only=True)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _record_after_flush(session: Session, flush_context):
+    changed, removed = _touched_pages(session)
+    changed = {_page_id(page) for page in changed} - {_page_id(page) for page in removed}
+    removed = {_page_id(page) for page in removed}
+    conn = session.connection()
+    if removed:
+        remove_revisions(conn, removed)
+    if changed:
+        record_revisions(conn, changed, restored_from=session.info.pop("restored_from", None))
+
+
+# Retention
+
+def _utc(value: datetime) -> datetime:
+    # SQLite hands back func.now() timestamps as naive UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def compact_page(db: Session, page_id: int, keep: int = REVISION_KEEP,
+                 max_age_days: float = REVISION_MAX_AGE_DAYS) -> int:
+    """Drop a page's revisions beyond the newest ``keep`` or older than
+    ``max_age_days``. The oldest one kept becomes a snapshot, so every kept
+    revision can still be rebuilt. Returns how many were dropped."""
+    rows = db.execute(select(PageRevision.number, PageRevision.created_at)
+                      .where(PageRevision.page_id == page_id).order_by(PageRevision.number.desc())).all()
+    oldest = len(rows) - 1
+    if keep:
+        oldest = min(oldest, keep - 1)
+    if max_age_days:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+        young = [position for position, (_, created_at) in enumerate(rows)
+                 if created_at is None or _utc(created_at) >= cutoff]
+        oldest = min(oldest, young[-1] if young else 0)
+    if oldest >= len(rows) - 1:
+        return 0
+    first = rows[oldest][0]
+    base = db.execute(_base_select(page_id, first)).scalar()
+    if base != first:
+        lines = _revision_lines(db, page_id, first)
+        db.execute(update(PageRevision).where(PageRevision.page_id == page_id, PageRevision.number == first)
+                   .values(is_snapshot=True, base=first, data=_compress(lines)))
+        db.execute(update(PageRevision).where(PageRevision.page_id == page_id, PageRevision.number > first,
+                                              PageRevision.base < first).values(base=first))
+    db.execute(delete(PageRevision).where(PageRevision.page_id == page_id, PageRevision.number < first))
+    return len(rows) - 1 - oldest
+
+
+def compact_revisions(db: Session, page_ids: Optional[Iterable[int]] = None, keep: int = REVISION_KEEP,
+                      max_age_days: float = REVISION_MAX_AGE_DAYS) -> dict:
+    """Apply the retention policy to ``page_ids`` (default: every page) and commit."""
+    query = (select(PageRevision.page_id, func.count(), func.min(PageRevision.created_at))
+             .group_by(PageRevision.page_id))
+    if page_ids is not None:
+        query = query.where(PageRevision.page_id.in_(sorted(set(page_ids))))
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days) if max_age_days else None
+    report = {"pages": 0, "removed": 0}
+    for page_id, count, first_created in db.execute(query).all():
+        if count > 1 and ((keep and count > keep) or (cutoff and first_created and _utc(first_created) < cutoff)):
+            removed = compact_page(db, page_id, keep, max_age_days)
+            if removed:
+                report["pages"] += 1
+                report["removed"] += removed
+    db.commit()
+    return report
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m backend.revisions", description="Manage page revisions")
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("--keep", type=int, default=REVISION_KEEP, help="Newest revisions kept per page (0: all)")
+    parser.add_argument("--max-age-days", type=float, default=REVISION_MAX_AGE_DAYS,
+                        help="Also drop revisions older than this (0: no limit)")
+    args = parser.parse_args(argv)
+    with SessionLocal() as db:
+        report = compact_revisions(db, keep=args.keep, max_age_days=args.max_age_days)
+    print(f"Removed {report['removed']} revision(s) of {report['pages']} page(s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
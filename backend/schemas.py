@@ -1,12 +1,36 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, field_validator, model_validator
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
 
 class Block(BaseModel):
     id: str
     type: str # 'hero', 'text', 'features', 'cta'
     data: Dict[str, Any]
 
+class BlockCreate(BaseModel):
+    id: Optional[str] = None # generated when omitted
+    type: str
+    data: Dict[str, Any] = {}
+    position: Optional[int] = None # appended when omitted
+
+class BlockPatch(BaseModel):
+    type: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None # merged into the block's data; null values remove keys
+    position: Optional[int] = None # moves the block
+
+class BlockResponse(Block):
+    position: int
+    hash: str
+
+class BlockUsage(BaseModel):
+    id: str
+    type: str
+    position: int
+    page_id: int
+    page_title: str
+    page_slug: str
+    is_published: bool = False
+
 class MenuItem(BaseModel):
     label: str
     url: str
@@ -49,6 +73,23 @@ class PageBase(BaseModel):
     meta_description: Optional[str] = ""
     is_published: bool = False
     is_homepage: bool = False
+    # Publish / unpublish the page at these times; UTC unless an offset is given
+    publish_at: Optional[datetime] = None
+    unpublish_at: Optional[datetime] = None
+
+    @field_validator('publish_at', 'unpublish_at')
+    @classmethod
+    def to_utc(cls, v):
+        # Stored as naive UTC, like func.now() on SQLite
+        if v is not None and v.tzinfo is not None:
+            return v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+    @model_validator(mode='after')
+    def check_schedule(self):
+        if self.publish_at and self.unpublish_at and self.unpublish_at <= self.publish_at:
+            raise ValueError("unpublish_at must be after publish_at")
+        return self
 
 class PageCreate(PageBase):
     pass
@@ -56,6 +97,20 @@ class PageCreate(PageBase):
 class PageUpdate(PageBase):
     pass
 
+class PageImport(PageBase):
+    # One line of a bulk NDJSON import/export; a taken slug gets a numeric suffix
+    slug: Optional[str] = None
+
+class SearchResult(BaseModel):
+    id: int
+    title: str
+    slug: str
+    is_published: bool = False
+    # HTML-escaped text with matches wrapped in <mark>
+    snippet: str = ""
+    # bm25 score, lower is better; None when the database has no full-text index
+    rank: Optional[float] = None
+
 class PageResponse(PageBase):
     id: int
     slug: str
@@ -73,6 +128,64 @@ class PageResponse(PageBase):
             return json.loads(v)
         return v
 
+class RevisionSummary(BaseModel):
+    number: int
+    title: Optional[str] = None
+    is_snapshot: bool = False
+    size: int # bytes of the page document
+    stored_size: int # bytes actually stored
+    restored_from: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+class RevisionSummaryList(BaseModel):
+    items: List[RevisionSummary]
+    next_cursor: Optional[str] = None
+
+class PageRevisionResponse(PageBase):
+    # The page as it was saved in revision ``number``
+    number: int
+    slug: str
+    restored_from: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+class PageSummary(BaseModel):
+    # List view of a page: never touches the body/blocks columns
+    id: int
+    title: str
+    slug: str
+    is_published: bool = False
+    is_homepage: bool = False
+    publish_at: Optional[datetime] = None
+    unpublish_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class PageSummaryList(BaseModel):
+    items: List[PageSummary]
+    next_cursor: Optional[str] = None
+
+class MenuSummary(BaseModel):
+    id: int
+    title: str
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class MenuSummaryList(BaseModel):
+    items: List[MenuSummary]
+    next_cursor: Optional[str] = None
+
+class ScheduledChange(BaseModel):
+    page_id: int
+    title: str
+    slug: str
+    action: str # 'publish', 'unpublish'
+    at: datetime
+
 class SettingsBase(BaseModel):
     brand_primary: str = "#3b82f6"
     brand_hover: str = "#2563eb"
@@ -84,3 +197,67 @@ class SettingsResponse(SettingsBase):
     id: int
     class Config:
         from_attributes = True
+
+class BuildRequest(BaseModel):
+    force: bool = False
+    reason: Optional[str] = "manual"
+
+class BuildResponse(BaseModel):
+    id: int
+    site_id: int = 1
+    status: str # 'queued', 'running', 'success', 'failed'
+    reasons: List[str] = []
+    force: bool = False
+    requested_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    report: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+class SiteBase(BaseModel):
+    name: str
+    base_url: Optional[str] = None # origin for sitemap URLs, e.g. https://example.com
+
+class SiteCreate(SiteBase):
+    slug: Optional[str] = None # output tree name; derived from the name when omitted
+
+class SiteUpdate(SiteBase):
+    pass
+
+class SiteResponse(SiteBase):
+    id: int
+    slug: str
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class MediaVariant(BaseModel):
+    width: int
+    height: Optional[int] = None
+    format: str
+    url: str
+
+class MediaResponse(BaseModel):
+    id: int
+    sha256: str
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+    size: int
+    url: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    variants: List[MediaVariant] = []
+    status: str
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+    @field_validator('variants', mode='before')
+    @classmethod
+    def parse_variants(cls, v):
+        if isinstance(v, str):
+            import json
+            return json.loads(v)
+        return v or []
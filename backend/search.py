@@ -0,0 +1,266 @@
+import os
+import re
+import json
+import html
+import hashlib
+import unicodedata
+from typing import Iterable, Optional
+
+from sqlalchemy import event, inspect, or_, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .models import DEFAULT_SITE_ID
+from .blocks import load_blocks
+from .database import SessionLocal
+from .releases import atomic_write
+
+# Full-text search over pages. On SQLite, an FTS5 table holds each page's
+# title, description, body and the text found in its blocks (rowid = page
+# id); it is updated in the same transaction as every flush that touches a
+# page or its blocks. Other databases fall back to LIKE matching.
+SEARCH_TABLE = "page_search"
+# bm25 column weights: title, meta_description, body, blocks
+SEARCH_WEIGHTS = (10.0, 4.0, 1.0, 1.0)
+SEARCH_INDEX_FILE = "search-index.json"
+SEARCH_INDEX_VERSION = 1
+# Words of a page that go into the static site's index
+CLIENT_INDEX_MAX_WORDS = int(os.getenv("SEARCH_INDEX_MAX_WORDS", "2000"))
+CLIENT_DESCRIPTION_CHARS = 160
+
+# Block data keys that hold links, colours, icons or layout rather than text
+_SKIP_KEYS = {"id", "icon", "columns", "full_screen", "isPopular"}
+_SKIP_SUFFIXES = ("url", "link", "color", "Color")
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\w+")
+# Snippet highlight markers, swapped for <mark> once the text is escaped
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+
+
+def html_to_text(value: str) -> str:
+    return _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", value or ""))).strip()
+
+
+def _collect(value, key: str, out: list):
+    if isinstance(value, dict):
+        for name, item in value.items():
+            _collect(item, name, out)
+    elif isinstance(value, list):
+        for item in value:
+            _collect(item, key, out)
+    elif isinstance(value, str):
+        if key in _SKIP_KEYS or key.endswith(_SKIP_SUFFIXES) or value.startswith(("#", "/", "http")):
+            return
+        value = html_to_text(value)
+        if value:
+            out.append(value)
+
+
+def blocks_text(page_blocks: list) -> str:
+    """The human-readable text inside a page's blocks, tags stripped."""
+    out = []
+    for block in page_blocks:
+        _collect(block.get("data") or {}, "", out)
+    return "\n".join(out)
+
+
+def is_available(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+# Databases (by URL) known to have the FTS table; it is never dropped once created
+_indexed_databases = set()
+
+
+def has_search_index(conn: Connection) -> bool:
+    key = str(conn.engine.url)
+    if key not in _indexed_databases:
+        if not is_available(conn) or not inspect(conn).has_table(SEARCH_TABLE):
+            return False
+        _indexed_databases.add(key)
+    return True
+
+
+def ensure_search_index(engine: Engine) -> int:
+    """Create the FTS table if needed and fill it when it is out of step
+    with the pages table. Returns the number of pages (re)indexed."""
+    if not is_available(engine):
+        return 0
+    with engine.begin() as conn:
+        if not inspect(conn).has_table(SEARCH_TABLE):
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+                "title, meta_description, body, blocks, tokenize='unicode61 remove_diacritics 2')"
+            ))
+        indexed = conn.execute(text(f"SELECT count(*) FROM {SEARCH_TABLE}")).scalar()
+        pages = conn.execute(text("SELECT count(*) FROM content")).scalar()
+        if indexed == pages:
+            return 0
+        conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+        page_ids = [row[0] for row in conn.execute(text("SELECT id FROM content"))]
+        _index_pages(conn, page_ids)
+        return len(page_ids)
+
+
+def _index_pages(conn: Connection, page_ids: Iterable[int]):
+    page_ids = sorted(set(page_ids))
+    if not page_ids:
+        return
+    db = Session(bind=conn)
+    try:
+        pages = (db.query(models.Content.id, models.Content.title, models.Content.meta_description,
+                          models.Content.body)
+                 .filter(models.Content.id.in_(page_ids)).all())
+        page_blocks = load_blocks(db, page_ids)
+    finally:
+        db.close()
+    _remove_pages(conn, page_ids)
+    rows = [{"id": page_id, "title": title or "", "meta": meta or "", "body": html_to_text(body),
+             "blocks": blocks_text(page_blocks.get(page_id, []))}
+            for page_id, title, meta, body in pages]
+    if rows:
+        conn.execute(text(f"INSERT INTO {SEARCH_TABLE} (rowid, title, meta_description, body, blocks) "
+                          "VALUES (:id, :title, :meta, :body, :blocks)"), rows)
+
+
+def _remove_pages(conn: Connection, page_ids: list):
+    conn.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :id"), [{"id": i} for i in page_ids])
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _reindex_after_flush(session: Session, flush_context):
+    conn = session.connection()
+    changed, removed = set(), set()
+    for obj in session.new | session.dirty:
+        if isinstance(obj, models.Content):
+            changed.add(obj.id)
+        elif isinstance(obj, models.ContentBlock) and obj.page_id is not None:
+            changed.add(obj.page_id)
+    for obj in session.deleted:
+        if isinstance(obj, models.Content):
+            removed.add(obj.id)
+        elif isinstance(obj, models.ContentBlock) and obj.page_id is not None:
+            changed.add(obj.page_id)
+    changed -= removed
+    if not (changed or removed) or not has_search_index(conn):
+        return
+    if removed:
+        _remove_pages(conn, sorted(removed))
+    _index_pages(conn, changed)
+
+
+def match_expression(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix."""
+    words = _WORD_RE.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _snippet_html(snippet: str) -> str:
+    return html.escape(snippet or "").replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+
+async def search_pages(db: AsyncSession, query: str, limit: int = 20, published: Optional[bool] = None,
+                       site_id: int = DEFAULT_SITE_ID) -> list:
+    """Pages of a site matching ``query``, best first, with a highlighted snippet."""
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    bind = db.get_bind()
+    if not is_available(bind):
+        return await _search_like(db, query, limit, published, site_id)
+
+    weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+    sql = (f"SELECT c.id, c.title, c.slug, c.is_published, "
+           f"snippet({SEARCH_TABLE}, -1, :open, :close, '…', 16) AS snippet, "
+           f"bm25({SEARCH_TABLE}, {weights}) AS rank "
+           f"FROM {SEARCH_TABLE} JOIN content c ON c.id = {SEARCH_TABLE}.rowid "
+           f"WHERE {SEARCH_TABLE} MATCH :query AND c.site_id = :site_id")
+    params = {"query": expression, "open": _MARK_OPEN, "close": _MARK_CLOSE, "limit": limit, "site_id": site_id}
+    if published is not None:
+        sql += " AND c.is_published = :published"
+        params["published"] = published
+    sql += " ORDER BY rank LIMIT :limit"
+    rows = (await db.execute(text(sql), params)).all()
+    return [{"id": row.id, "title": row.title, "slug": row.slug, "is_published": bool(row.is_published),
+             "snippet": _snippet_html(row.snippet), "rank": row.rank} for row in rows]
+
+
+async def _search_like(db: AsyncSession, query: str, limit: int, published: Optional[bool], site_id: int) -> list:
+    stmt = select(models.Content.id, models.Content.title, models.Content.slug, models.Content.is_published,
+                  models.Content.meta_description).filter(models.Content.site_id == site_id)
+    for word in _WORD_RE.findall(query):
+        pattern = f"%{word}%"
+        stmt = stmt.filter(or_(models.Content.title.ilike(pattern),
+                               models.Content.meta_description.ilike(pattern),
+                               models.Content.body.ilike(pattern)))
+    if published is not None:
+        stmt = stmt.filter(models.Content.is_published == published)
+    rows = (await db.execute(stmt.order_by(models.Content.updated_at.desc()).limit(limit))).all()
+    return [{"id": row.id, "title": row.title, "slug": row.slug, "is_published": bool(row.is_published),
+             "snippet": html.escape(row.meta_description or ""), "rank": None} for row in rows]
+
+
+# Static site index: the generated site searches this file in the browser
+
+def normalize_words(value: str) -> list:
+    """Lowercased, accent-stripped words; base.html's search script does the same."""
+    value = unicodedata.normalize("NFKD", value.lower())
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return [word for word in _WORD_RE.findall(value) if len(word) > 1]
+
+
+def _published_texts(db: Session, site_id: int = DEFAULT_SITE_ID) -> list:
+    # (slug, title, description, text) per published page of the site, in id order
+    pages = (db.query(models.Content.id, models.Content.slug, models.Content.title,
+                      models.Content.meta_description, models.Content.body)
+             .filter(models.Content.site_id == site_id, models.Content.is_published == True)
+             .order_by(models.Content.id).all())
+    if has_search_index(db.connection()):
+        # Already extracted when the pages were saved
+        texts = dict(db.execute(text(
+            f"SELECT s.rowid, trim(s.body || ' ' || s.blocks) FROM {SEARCH_TABLE} s "
+            "JOIN content c ON c.id = s.rowid WHERE c.site_id = :site_id"), {"site_id": site_id}).all())
+    else:
+        page_blocks = load_blocks(db, [page.id for page in pages])
+        texts = {page.id: (html_to_text(page.body) + " " + blocks_text(page_blocks.get(page.id, []))).strip()
+                 for page in pages}
+    return [(page.slug, page.title or "", page.meta_description or "", texts.get(page.id, ""))
+            for page in pages]
+
+
+def build_client_index(pages: list) -> dict:
+    """Prebuilt inverted index: ``terms`` maps a word to flat [page, score, ...] pairs."""
+    entries, terms = [], {}
+    for number, (slug, title, description, body) in enumerate(pages):
+        description = description or body[:CLIENT_DESCRIPTION_CHARS]
+        # Relative, like the menu links: every page sits at the site root
+        entries.append([f"{slug}.html", title, description])
+        scores = {}
+        for words, weight in ((normalize_words(title), 10), (normalize_words(description), 4),
+                              (normalize_words(body)[:CLIENT_INDEX_MAX_WORDS], 1)):
+            for word in words:
+                scores[word] = scores.get(word, 0) + weight
+        for word, score in scores.items():
+            terms.setdefault(word, []).extend((number, min(score, 255)))
+    return {"version": SEARCH_INDEX_VERSION, "pages": entries, "terms": dict(sorted(terms.items()))}
+
+
+def write_client_index(db: Session, output_dir: str, previous_hash: Optional[str] = None,
+                       site_id: int = DEFAULT_SITE_ID) -> dict:
+    """Write the site's search-index.json unless its content is unchanged."""
+    payload = json.dumps(build_client_index(_published_texts(db, site_id)), ensure_ascii=False,
+                         separators=(",", ":")).encode("utf-8")
+    digest = hashlib.sha256(payload).hexdigest()
+    path = os.path.join(output_dir, SEARCH_INDEX_FILE)
+    if digest == previous_hash and os.path.exists(path):
+        return {"hash": digest, "written": False, "bytes_written": 0}
+    with atomic_write(path, "wb") as f:
+        f.write(payload)
+    return {"hash": digest, "written": True, "bytes_written": len(payload)}
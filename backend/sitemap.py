@@ -0,0 +1,158 @@
+import os
+import gzip
+import hashlib
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from .releases import atomic_write
+
+# Protocol limits for a single sitemap file (https://www.sitemaps.org/protocol.html)
+SITEMAP_MAX_URLS = 50000
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024
+SITEMAP_GZIP = os.getenv("SITEMAP_GZIP", "0").lower() in ("1", "true", "yes")
+# Absolute origin for <loc> values, e.g. "https://example.com"; empty keeps root-relative URLs
+SITE_URL = os.getenv("SITE_URL", "").rstrip("/")
+
+SITEMAP_FILE = "sitemap.xml"
+XMLNS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+URLSET_OPEN = f'<urlset xmlns="{XMLNS}">\n'
+URLSET_CLOSE = "</urlset>\n"
+
+
+def _lastmod(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    return str(value)
+
+
+def _url_entry(loc: str, lastmod: Optional[str]) -> bytes:
+    entry = f"<url><loc>{escape(loc)}</loc>"
+    if lastmod:
+        entry += f"<lastmod>{lastmod}</lastmod>"
+    return (entry + "</url>\n").encode("utf-8")
+
+
+class _ShardWriter:
+    """Streams one sitemap file to a temp path while hashing the uncompressed XML."""
+
+    def __init__(self, path: str, compress: bool):
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.hash = hashlib.sha256()
+        self.urls = 0
+        self.size = 0
+        self.lastmod = None
+        self._raw = open(self.tmp_path, "wb")
+        # mtime=0 keeps gzip output byte-identical for identical content
+        self._out = gzip.GzipFile(fileobj=self._raw, mode="wb", mtime=0) if compress else self._raw
+        self._write(HEADER.encode("utf-8") + URLSET_OPEN.encode("utf-8"))
+
+    def _write(self, data: bytes):
+        self._out.write(data)
+        self.hash.update(data)
+        self.size += len(data)
+
+    def fits(self, entry: bytes) -> bool:
+        closing = len(URLSET_CLOSE)
+        return self.urls < SITEMAP_MAX_URLS and self.size + len(entry) + closing <= SITEMAP_MAX_BYTES
+
+    def add(self, entry: bytes, lastmod: Optional[str]):
+        self._write(entry)
+        self.urls += 1
+        if lastmod and (self.lastmod is None or lastmod > self.lastmod):
+            self.lastmod = lastmod
+
+    def close(self) -> str:
+        self._write(URLSET_CLOSE.encode("utf-8"))
+        if self._out is not self._raw:
+            self._out.close()
+        self._raw.close()
+        return self.hash.hexdigest()
+
+    def discard(self):
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def _finish(writer: _ShardWriter, previous: dict, result: dict):
+    digest = writer.close()
+    name = os.path.basename(writer.path)
+    result["files"][name] = digest
+    if previous.get(name) == digest and os.path.exists(writer.path):
+        # Unchanged shard: keep the existing file (and its hard link to the live release)
+        writer.discard()
+        return
+    os.replace(writer.tmp_path, writer.path)
+    result["written"].append(name)
+    result["bytes_written"] += os.path.getsize(writer.path)
+
+
+def write_sitemaps(output_dir: str, entries: Iterable[Tuple[str, object]], previous: Optional[dict] = None,
+                   compress: bool = SITEMAP_GZIP, site_url: str = SITE_URL) -> dict:
+    """Write the sitemap for ``entries`` of (path, lastmod) incrementally.
+
+    Up to the protocol limits a single ``sitemap.xml`` urlset is written; past
+    them (or when ``compress`` is set) the URLs are split into numbered shards
+    referenced from a ``sitemap.xml`` index. ``previous`` maps file names to
+    content hashes from the last build; shards whose content is unchanged are
+    not rewritten. Returns the new hashes plus what was written and removed.
+    """
+    previous = previous or {}
+    result = {"files": {}, "written": [], "removed": [], "bytes_written": 0}
+    suffix = ".xml.gz" if compress else ".xml"
+    shards = []  # (file name, lastmod)
+
+    def open_shard(number: int) -> _ShardWriter:
+        return _ShardWriter(os.path.join(output_dir, f"sitemap-{number}{suffix}"), compress)
+
+    writer = open_shard(1)
+    try:
+        for path, lastmod in entries:
+            lastmod = _lastmod(lastmod)
+            entry = _url_entry(f"{site_url}{path}", lastmod)
+            if not writer.fits(entry):
+                shards.append((os.path.basename(writer.path), writer.lastmod))
+                _finish(writer, previous, result)
+                writer = open_shard(len(shards) + 1)
+            writer.add(entry, lastmod)
+        shards.append((os.path.basename(writer.path), writer.lastmod))
+
+        if len(shards) == 1 and not compress:
+            # Small, uncompressed site: the single urlset is the sitemap itself
+            writer.path = os.path.join(output_dir, SITEMAP_FILE)
+            shards = []
+        _finish(writer, previous, result)
+    except BaseException:
+        writer.discard()
+        raise
+
+    if shards:
+        index_path = os.path.join(output_dir, SITEMAP_FILE)
+        lines = [HEADER, f'<sitemapindex xmlns="{XMLNS}">\n']
+        for name, lastmod in shards:
+            entry = f"<sitemap><loc>{escape(f'{site_url}/{name}')}</loc>"
+            if lastmod:
+                entry += f"<lastmod>{lastmod}</lastmod>"
+            lines.append(entry + "</sitemap>\n")
+        lines.append("</sitemapindex>\n")
+        content = "".join(lines).encode("utf-8")
+        digest = hashlib.sha256(content).hexdigest()
+        result["files"][SITEMAP_FILE] = digest
+        if previous.get(SITEMAP_FILE) != digest or not os.path.exists(index_path):
+            with atomic_write(index_path, "wb") as f:
+                f.write(content)
+            result["written"].append(SITEMAP_FILE)
+            result["bytes_written"] += len(content)
+
+    # Shards from a bigger (or differently compressed) previous sitemap
+    for name in previous:
+        if name not in result["files"]:
+            path = os.path.join(output_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+                result["removed"].append(name)
+    return result
@@ -0,0 +1,53 @@
+import os
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .models import DEFAULT_SITE_ID
+from .sitemap import SITE_URL
+
+# One instance serves several sites. Pages, menus, settings and media carry a
+# site_id, and every site is built into its own output tree, with its own
+# build manifest and releases. The default site keeps OUTPUT_DIR (and
+# SITE_URL), so a single-site install looks the way it always did; the others
+# are built into SITES_DIR/<slug> and served under /sites/<slug>/.
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output")
+SITES_DIR = os.getenv("SITES_DIR", "sites")
+DEFAULT_SITE_NAME = "Default"
+DEFAULT_SITE_SLUG = "default"
+
+
+def ensure_default_site(db: Session) -> models.Site:
+    site = db.get(models.Site, DEFAULT_SITE_ID)
+    if site is None:
+        site = models.Site(id=DEFAULT_SITE_ID, name=DEFAULT_SITE_NAME, slug=DEFAULT_SITE_SLUG)
+        db.add(site)
+        db.commit()
+    return site
+
+
+def site_ids(db: Session) -> list:
+    ids = [site_id for (site_id,) in db.query(models.Site.id).order_by(models.Site.id)]
+    # A database that predates sites has no row for the default site yet
+    return ids or [DEFAULT_SITE_ID]
+
+
+def output_dir_for(site: Optional[models.Site], site_id: int = DEFAULT_SITE_ID) -> str:
+    if site is None or site.id == DEFAULT_SITE_ID:
+        if site_id != DEFAULT_SITE_ID:
+            raise LookupError(f"Unknown site {site_id}")
+        return OUTPUT_DIR
+    return os.path.join(SITES_DIR, site.slug)
+
+
+def site_url_for(site: Optional[models.Site]) -> str:
+    if site is not None and site.base_url:
+        return site.base_url.rstrip("/")
+    return SITE_URL if site is None or site.id == DEFAULT_SITE_ID else ""
+
+
+def build_target(db: Session, site_id: int = DEFAULT_SITE_ID) -> tuple:
+    """``(output_dir, site_url)`` of a site; LookupError if there is no such site."""
+    site = db.get(models.Site, site_id)
+    return output_dir_for(site, site_id), site_url_for(site)
@@ -0,0 +1,19 @@
+import re
+
+
+def slugify(text: str) -> str:
+    text = text.lower()
+    text = re.sub(r'[^\w\s-]', '', text)
+    text = re.sub(r'[\s_-]+', '-', text).strip('-')
+    return text
+
+
+def unique_slug(base: str, taken: set) -> str:
+    # "about", "about-2", "about-3", ... whichever is free first; claims it in ``taken``
+    base = base or "page"
+    slug, suffix = base, 2
+    while slug in taken:
+        slug = f"{base}-{suffix}"
+        suffix += 1
+    taken.add(slug)
+    return slug
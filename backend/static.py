@@ -0,0 +1,120 @@
+import os
+import re
+import mimetypes
+import threading
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+from .compress import ASSET_MANIFEST_FILE, ENCODINGS, load_asset_manifest
+
+# "site.3f9a1c2b.css": content hash in the name, so the URL never changes meaning
+FINGERPRINTED = re.compile(r"\.[0-9a-f]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Everything else may change on the next build: cache, but revalidate (cheap 304s)
+REVALIDATE_CACHE = "no-cache"
+ETAG_SUFFIXES = {"br": "-br", "gzip": "-gz"}
+MANIFEST_CACHE_SIZE = 64
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if token:
+            accepted.add(token)
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles for the generated site.
+
+    Serves the ``.br``/``.gz`` sibling written at build time when the client
+    accepts it, uses the build's content hashes as ETags (answering
+    If-None-Match with 304), and marks fingerprinted files as immutable.
+    Files missing from the asset manifest are served as plain StaticFiles;
+    the build's dot-files are not served at all.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._manifests = {}
+        self._lock = threading.Lock()
+
+    def _manifest(self, root: str) -> dict:
+        # Re-read only when the live release (and so its manifest) changes
+        path = os.path.join(root, ASSET_MANIFEST_FILE)
+        try:
+            key = os.stat(path).st_mtime_ns
+        except OSError:
+            return {}
+        with self._lock:
+            cached = self._manifests.get(root)
+            if cached and cached[0] == key:
+                return cached[1]
+        files = load_asset_manifest(root)
+        with self._lock:
+            if len(self._manifests) >= MANIFEST_CACHE_SIZE:
+                self._manifests.clear()
+            self._manifests[root] = (key, files)
+        return files
+
+    def _root(self, scope) -> str:
+        # The live release the request is served from
+        return os.path.realpath(self.directory)
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        root = self._root(scope)
+        name = os.path.relpath(full_path, root).replace(os.sep, "/")
+        if name.startswith("."):
+            # Build bookkeeping (manifests) or files outside the live release, not part of the site
+            raise HTTPException(status_code=404)
+        entry = self._manifest(root).get(name)
+        if entry is None or status_code != 200:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        request_headers = Headers(scope=scope)
+        cache_control = IMMUTABLE_CACHE if FINGERPRINTED.search(name) else REVALIDATE_CACHE
+        headers = {"cache-control": cache_control, "vary": "Accept-Encoding"}
+
+        accepted = _accepted_encodings(request_headers.get("accept-encoding", ""))
+        path, encoding = full_path, None
+        for candidate, suffix in ENCODINGS.items():
+            if candidate in accepted and entry.get(candidate) is not None and os.path.exists(full_path + suffix):
+                path, encoding = full_path + suffix, candidate
+                break
+
+        # Each representation gets its own strong ETag
+        etag = entry["etag"]
+        if encoding:
+            etag = etag[:-1] + ETAG_SUFFIXES[encoding] + '"'
+            headers["content-encoding"] = encoding
+        headers["etag"] = etag
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or etag in tags:
+                return NotModifiedResponse(Headers(headers))
+
+        media_type, _ = mimetypes.guess_type(name)
+        return FileResponse(path, headers=headers, media_type=media_type or "application/octet-stream")
+
+
+class SitesStaticFiles(PrecompressedStaticFiles):
+    """PrecompressedStaticFiles over SITES_DIR, where every ``<slug>`` is the
+    output tree (a symlink to the live release) of one site."""
+
+    def _root(self, scope) -> str:
+        slug = self.get_path(scope).split(os.sep, 1)[0]
+        return os.path.realpath(os.path.join(self.directory, slug))
@@ -0,0 +1,136 @@
+import os
+import hashlib
+import tempfile
+import threading
+from typing import Optional
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template, meta
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+# Compiled template bytecode survives restarts, so cold starts skip compilation too
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "staticcms-jinja-cache"))
+
+
+class TemplateRegistry:
+    """Long-lived holder of the compiled site templates.
+
+    Every template under ``templates/`` is compiled once and kept; ``refresh()``
+    stats the files (once per build, not once per block render) and recompiles
+    only the ones whose mtime changed. Compiled bytecode is also written to
+    TEMPLATE_CACHE_DIR so a fresh process loads it instead of re-parsing.
+    """
+
+    def __init__(self, template_dir: str = TEMPLATE_DIR, cache_dir: Optional[str] = TEMPLATE_CACHE_DIR):
+        bytecode_cache = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        self.template_dir = template_dir
+        # auto_reload is off: freshness is handled by refresh(), not by a stat per get_template()
+        self.env = Environment(loader=FileSystemLoader(template_dir), bytecode_cache=bytecode_cache, auto_reload=False)
+        self._lock = threading.Lock()
+        self._templates = {}  # name -> Template
+        self._mtimes = {}  # name -> mtime the cached Template was compiled from
+        self._hashes = {}  # name -> sha256 of the source
+        self._variables = {}  # name -> context variables the template reads
+        self._references = {}  # name -> templates it extends/includes/imports (None if dynamic)
+        self.refresh()
+
+    def _scan(self) -> dict:
+        mtimes = {}
+        for root, _, files in os.walk(self.template_dir):
+            for name in files:
+                if not name.endswith(".html"):
+                    continue
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, self.template_dir).replace(os.sep, "/")
+                mtimes[rel] = os.stat(path).st_mtime_ns
+        return mtimes
+
+    def _load(self, name: str) -> Template:
+        with open(os.path.join(self.template_dir, name), "rb") as f:
+            source = f.read()
+        self._hashes[name] = hashlib.sha256(source).hexdigest()
+        ast = self.env.parse(source.decode("utf-8"))
+        self._variables[name] = frozenset(meta.find_undeclared_variables(ast))
+        self._references[name] = tuple(meta.find_referenced_templates(ast))
+        return self.env.loader.load(self.env, name, self.env.make_globals(None))
+
+    def refresh(self) -> set:
+        """Recompile templates changed on disk; returns the names that changed."""
+        with self._lock:
+            mtimes = self._scan()
+            changed = set()
+            for name in list(self._templates):
+                if name not in mtimes:
+                    del self._templates[name]
+                    self._mtimes.pop(name, None)
+                    self._hashes.pop(name, None)
+                    self._variables.pop(name, None)
+                    self._references.pop(name, None)
+                    changed.add(name)
+            for name, mtime in mtimes.items():
+                if self._mtimes.get(name) != mtime:
+                    self._templates[name] = self._load(name)
+                    self._mtimes[name] = mtime
+                    changed.add(name)
+            if changed:
+                # Templates pulled in through extends/include live in the env cache
+                self.env.cache.clear()
+            return changed
+
+    def get(self, name: str) -> Template:
+        template = self._templates.get(name)
+        if template is None:
+            # Unknown names raise TemplateNotFound like Environment.get_template
+            template = self.env.get_template(name)
+        return template
+
+    def block(self, block_type: str) -> Template:
+        return self.get(f"blocks/{block_type}.html")
+
+    def fingerprint(self, name: str) -> Optional[str]:
+        """Hash of a template's source and of the templates it pulls in, or
+        None when those can't be known statically (a dynamic include)."""
+        own = self._hashes.get(name)
+        references = self._references.get(name, ())
+        if own is None or None in references:
+            return None
+        if not references:
+            return own
+        parts = [own] + [self._hashes.get(ref) or "" for ref in references]
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def dependents(self, names) -> Optional[set]:
+        """``names`` plus every template that pulls one of them in, directly
+        or not; None when some template's references can't be known statically."""
+        with self._lock:
+            references = dict(self._references)
+        if any(None in refs for refs in references.values()):
+            return None
+        found = set(names)
+        while True:
+            more = {name for name, refs in references.items() if name not in found and found.intersection(refs)}
+            if not more:
+                return found
+            found |= more
+
+    def variables(self, name: str) -> frozenset:
+        return self._variables.get(name, frozenset())
+
+    def hashes(self) -> dict:
+        # Content hash of every template, keyed by loader name ("base.html", "blocks/hero.html")
+        with self._lock:
+            return dict(self._hashes)
+
+
+_registry: Optional[TemplateRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> TemplateRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = TemplateRegistry()
+    return _registry
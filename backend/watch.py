@@ -0,0 +1,145 @@
+import os
+import time
+import logging
+from typing import Callable, Optional
+
+from sqlalchemy.engine import make_url
+
+from .generator import run_build, load_manifest
+from .sites import build_target, site_ids
+from .templating import TemplateRegistry, get_registry
+
+logger = logging.getLogger(__name__)
+
+# Development loop behind `python -m backend.generator watch`: polls the
+# templates directory and the SQLite database file (and its WAL) and rebuilds
+# every site once changes have been quiet for WATCH_DEBOUNCE_SECONDS. A
+# template edit only re-renders the pages whose manifest deps include that
+# template (or a template that imports it); a database change runs a normal
+# incremental build.
+WATCH_INTERVAL_SECONDS = float(os.getenv("WATCH_INTERVAL_SECONDS", "0.25"))
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "0.5"))
+
+
+def database_files(url: str) -> list:
+    """Files a SQLite database changes on a write; empty for other databases."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        return []
+    path = os.path.abspath(parsed.database)
+    # In WAL mode commits land in the -wal file until a checkpoint
+    return [path, path + "-wal"]
+
+
+def _stat(paths: list) -> tuple:
+    state = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            state.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            state.append(None)
+    return tuple(state)
+
+
+class SiteWatcher:
+    """Rebuilds the site whenever its templates or database change.
+
+    ``poll()`` checks once and remembers what changed; ``run()`` polls every
+    ``interval`` seconds and calls ``rebuild()`` after ``debounce`` quiet
+    seconds. ``sites`` limits the rebuilds to those site ids (default: all).
+    """
+
+    def __init__(self, session_factory: Callable, db_files: list, sites: Optional[list] = None,
+                 workers: Optional[int] = None, optimize: Optional[bool] = None,
+                 registry: Optional[TemplateRegistry] = None, interval: float = WATCH_INTERVAL_SECONDS,
+                 debounce: float = WATCH_DEBOUNCE_SECONDS):
+        self.session_factory = session_factory
+        self.db_files = db_files
+        self.sites = sites
+        self.workers = workers
+        self.optimize = optimize
+        self.registry = registry or get_registry()
+        self.interval = interval
+        self.debounce = debounce
+        self._db_state = _stat(db_files)
+        self._hashes = self.registry.hashes()
+        self._templates = set()  # changed since the last rebuild
+        self._database = False
+        self._last_change = None
+        self._last_error = None
+
+    def poll(self) -> bool:
+        """Look for changes once; True if anything changed."""
+        changed = False
+        templates = set()
+        try:
+            self.registry.refresh()
+            self._last_error = None
+            # Compared by content against the last good refresh: a failed one may
+            # have loaded some changed templates already, and touching a file is no edit
+            hashes = self.registry.hashes()
+            templates = {name for name in hashes.keys() | self._hashes.keys()
+                         if hashes.get(name) != self._hashes.get(name)}
+            self._hashes = hashes
+        except Exception as e:
+            # A template that doesn't parse yet: report it once, retry on the next poll
+            if str(e) != self._last_error:
+                logger.error("Template error: %s", e)
+                self._last_error = str(e)
+        if templates:
+            self._templates |= templates
+            changed = True
+        state = _stat(self.db_files)
+        if state != self._db_state:
+            self._db_state = state
+            self._database = True
+            changed = True
+        if changed:
+            self._last_change = time.monotonic()
+        return changed
+
+    def pending(self) -> bool:
+        return self._database or bool(self._templates)
+
+    def affected_pages(self, templates: set, output_dir: str) -> Optional[set]:
+        """Ids of the pages in ``output_dir`` built from ``templates``; None when that could be every page."""
+        names = self.registry.dependents(templates)
+        pages = load_manifest(output_dir).get("pages")
+        if names is None or not pages or "base.html" in names:
+            return None
+        return {int(page_id) for page_id, entry in pages.items() if names.intersection(entry.get("deps", ()))}
+
+    def rebuild(self) -> list:
+        """Build every watched site the pending changes affect; returns their reports."""
+        templates, database = self._templates, self._database
+        self._templates, self._database = set(), False
+        reports = []
+        db = self.session_factory()
+        try:
+            for site_id in self.sites or site_ids(db):
+                try:
+                    output_dir, _ = build_target(db, site_id)
+                    only = None if database else self.affected_pages(templates, output_dir)
+                    if only is not None and not only:
+                        continue
+                    reports.append(run_build(db, workers=self.workers, optimize=self.optimize, only=only,
+                                             site_id=site_id))
+                except Exception as e:
+                    # Keep watching: the next edit probably fixes it
+                    logger.error("Build of site %d failed: %s", site_id, e)
+                    db.rollback()
+        finally:
+            db.close()
+        if not reports and not database:
+            logger.info("No page uses %s", ", ".join(sorted(templates)))
+        return reports
+
+    def run(self, on_build: Optional[Callable[[dict], None]] = None):
+        while True:
+            self.poll()
+            if self.pending() and time.monotonic() - self._last_change >= self.debounce:
+                for report in self.rebuild():
+                    if on_build:
+                        on_build(report)
+            time.sleep(self.interval)
@@ -53,8 +53,65 @@ if os.path.exists(db_path):
         print("Adding is_homepage column to content table...")
         cursor.execute("ALTER TABLE content ADD COLUMN is_homepage BOOLEAN DEFAULT 0")
         conn.commit()
+
+    # Scheduled publishing
+    for column in ("publish_at", "unpublish_at"):
+        if column not in columns:
+            print(f"Adding {column} column to content table...")
+            cursor.execute(f"ALTER TABLE content ADD COLUMN {column} DATETIME")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS ix_content_{column} ON content ({column})")
+            conn.commit()
+
+    # Sites: existing rows belong to the default site, and slugs, menu titles
+    # and media hashes become unique per site instead of globally
+    for table in ("content", "menus", "settings", "media"):
+        cursor.execute(f"PRAGMA table_info({table})")
+        if "site_id" not in [row[1] for row in cursor.fetchall()]:
+            print(f"Adding site_id column to {table} table...")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN site_id INTEGER NOT NULL DEFAULT 1")
+            conn.commit()
+    for index, table, column in (("ix_content_slug", "content", "slug"), ("ix_menus_title", "menus", "title"),
+                                 ("ix_media_sha256", "media", "sha256")):
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (index,))
+        row = cursor.fetchone()
+        if row and row[0] and row[0].upper().startswith("CREATE UNIQUE"):
+            print(f"Making {table}.{column} unique per site...")
+            cursor.execute(f"DROP INDEX {index}")
+            cursor.execute(f"CREATE INDEX {index} ON {table} ({column})")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_content_site_slug ON content (site_id, slug)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_menus_site_title ON menus (site_id, title)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_media_site_sha256 ON media (site_id, sha256)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_settings_site_id ON settings (site_id)")
+    for table in ("content", "menus", "media"):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_site_id ON {table} (site_id)")
+    conn.commit()
+
+    # Keyset pagination sorts on updated_at, which must not be NULL; lists are per site
+    cursor.execute("UPDATE content SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL")
+    cursor.execute("DROP INDEX IF EXISTS ix_content_updated_at_id")
+    cursor.execute("DROP INDEX IF EXISTS ix_content_published_updated_at_id")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_content_site_updated_at_id ON content (site_id, updated_at, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_content_site_published_updated_at_id "
+                   "ON content (site_id, is_published, updated_at, id)")
+    conn.commit()
     
-    print("Migration check complete.")
     conn.close()
+
+    # Blocks moved from the content.blocks JSON column to the content_blocks table
+    from backend.database import SessionLocal
+    from backend.blocks import migrate_legacy_blocks
+    from backend.sites import ensure_default_site
+    with SessionLocal() as db:
+        ensure_default_site(db)
+        migrated = migrate_legacy_blocks(db)
+    if migrated:
+        print(f"Moved blocks of {migrated} pages to the content_blocks table.")
+
+    from backend.search import ensure_search_index
+    indexed = ensure_search_index(engine)
+    if indexed:
+        print(f"Indexed {indexed} pages for search.")
+
+    print("Migration check complete.")
 else:
     print("Database not found.")
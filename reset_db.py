@@ -26,10 +26,12 @@ def reset_database():
         print(f"Error resetting database: {e}")
         print("Trying alternative: direct SQLite delete and recreate...")
         try:
-            if os.path.exists(db_path):
-                # This might fail if uvicorn is holding the file
-                os.remove(db_path)
-                print(f"Removed {db_path}")
+            # WAL mode keeps -wal/-shm files next to the database
+            for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+                if os.path.exists(path):
+                    # This might fail if uvicorn is holding the file
+                    os.remove(path)
+                    print(f"Removed {path}")
             
             Base.metadata.create_all(bind=engine)
             print("Database recreated successfully.")
@@ -0,0 +1,62 @@
+import os
+import sys
+import uuid
+import tempfile
+
+import pytest
+
+# Settings are read when the backend modules are imported, so point the whole
+# run at a scratch directory before anything imports them.
+_WORK_DIR = tempfile.mkdtemp(prefix="staticcms-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_WORK_DIR}/cms.db"
+os.environ["OUTPUT_DIR"] = os.path.join(_WORK_DIR, "output")
+os.environ["SITES_DIR"] = os.path.join(_WORK_DIR, "sites")
+os.environ["ASSETS_VENDOR_FETCH"] = "0"
+os.environ.pop("RELEASES_DIR", None)
+os.environ.pop("UPLOAD_DIR", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from backend.main import app, build_scheduler
+    # Builds run only when a test asks for one
+    build_scheduler.request = lambda *args, **kwargs: None
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    from backend.database import SessionLocal
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def site_id(client):
+    """A fresh site, so tests don't see each other's pages and releases."""
+    name = f"Test {uuid.uuid4().hex[:8]}"
+    response = client.post("/api/sites", json={"name": name, "base_url": "https://example.test"})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+@pytest.fixture
+def site(client, db, site_id):
+    """A published two-page site and its output tree."""
+    from backend import models
+    from backend.sites import output_dir_for
+    for title in ("Home", "About"):
+        response = client.post(f"/api/pages?site_id={site_id}", json={
+            "title": title, "is_published": True,
+            "blocks": [{"id": "h", "type": "hero", "data": {"headline": f"{title} headline"}}]})
+        assert response.status_code == 200, response.text
+    # The API never sets the homepage flag (bulk import does)
+    db.query(models.Content).filter(models.Content.site_id == site_id, models.Content.slug == "home") \
+        .update({"is_homepage": True})
+    db.commit()
+    return site_id, output_dir_for(db.get(models.Site, site_id))
@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import urllib.request
+
+import pytest
+
+from backend import assets
+from backend.generator import run_build
+
+
+@pytest.fixture
+def vendor_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "VENDOR_DIR", str(tmp_path))
+    monkeypatch.setattr(assets, "VENDOR_CHECKSUMS", str(tmp_path / "SHA256SUMS"))
+    return tmp_path
+
+
+@pytest.fixture
+def downloads(monkeypatch):
+    """Serve fetches from a dict instead of the network."""
+    served = {}
+
+    def download(url):
+        return served[url]
+    monkeypatch.setattr(assets, "_download", download)
+    return served
+
+
+def test_build_never_touches_the_network(db, site, monkeypatch):
+    def offline(*args, **kwargs):
+        raise AssertionError("a build tried to download something")
+    monkeypatch.setattr(urllib.request, "urlopen", offline)
+    site_id, _ = site
+    report = run_build(db, site_id=site_id, workers=1)
+    assert sorted(report["rebuilt"]) == ["about", "home"]
+
+
+def test_fallback_is_reported_once(tmp_path, vendor_dir, monkeypatch, caplog):
+    monkeypatch.setattr(assets, "TAILWIND_BIN", "")
+    monkeypatch.setattr(assets, "_warned", set())
+    monkeypatch.setenv("PATH", "")
+    templates = assets.TemplateRegistry(str(tmp_path / "templates"))
+
+    with caplog.at_level(logging.ERROR, logger=assets.__name__):
+        first = assets.build_assets(str(tmp_path / "one"), templates, [])
+        second = assets.build_assets(str(tmp_path / "two"), templates, [])
+    assert first["urls"]["css"] is None
+    assert first["urls"]["lucide_js"].startswith("https://")
+    assert len(first["warnings"]) == len(assets.VENDOR_ASSETS) + 1
+    assert second["warnings"] == []
+    assert len(caplog.records) == len(first["warnings"])
+
+
+def test_vendored_files_are_copied_under_hashed_names(tmp_path, vendor_dir, monkeypatch):
+    monkeypatch.setattr(assets, "_warned", set())
+    for file_name, _ in assets.VENDOR_ASSETS.values():
+        (vendor_dir / file_name).write_text(f"/* {file_name} */", encoding="utf-8")
+    templates = assets.TemplateRegistry(str(tmp_path / "templates"))
+    result = assets.build_assets(str(tmp_path / "out"), templates, [])
+    for name in assets.VENDOR_ASSETS:
+        assert result["urls"][name].startswith("assets/")
+        assert (tmp_path / "out" / result["urls"][name]).exists()
+
+
+def test_fetch_records_and_enforces_checksums(vendor_dir, downloads):
+    for file_name, url in assets.VENDOR_ASSETS.values():
+        downloads[url] = file_name.encode("utf-8")
+    fetched = assets.fetch_vendor_assets(tailwind=False)
+    assert sorted(fetched) == sorted(file_name for file_name, _ in assets.VENDOR_ASSETS.values())
+    recorded = assets._read_checksums()
+    for file_name, _ in assets.VENDOR_ASSETS.values():
+        assert recorded[file_name] == hashlib.sha256(file_name.encode("utf-8")).hexdigest()
+
+    # Present files are not fetched again
+    assert assets.fetch_vendor_assets(tailwind=False) == []
+    # Changed upstream bytes are refused
+    file_name, url = next(iter(assets.VENDOR_ASSETS.values()))
+    downloads[url] = b"tampered"
+    with pytest.raises(ValueError):
+        assets.fetch_vendor_assets(force=True, tailwind=False)
+
+
+def test_fetch_checks_the_tailwind_cli(vendor_dir, downloads, monkeypatch):
+    monkeypatch.setattr(assets, "_tailwind_binary_name", lambda: "tailwindcss-linux-x64")
+    for file_name, url in assets.VENDOR_ASSETS.values():
+        downloads[url] = b"lib"
+    binary = b"\x7fELF tailwind"
+    sums = f"{hashlib.sha256(binary).hexdigest()}  ./tailwindcss-linux-x64\n"
+    downloads[f"{assets.TAILWIND_RELEASE_URL}/sha256sums.txt"] = sums.encode("utf-8")
+    downloads[f"{assets.TAILWIND_RELEASE_URL}/tailwindcss-linux-x64"] = b"corrupted"
+    with pytest.raises(ValueError):
+        assets.fetch_vendor_assets()
+    assert not (vendor_dir / "bin" / "tailwindcss-linux-x64").exists()
+
+    downloads[f"{assets.TAILWIND_RELEASE_URL}/tailwindcss-linux-x64"] = binary
+    assert "bin/tailwindcss-linux-x64" in assets.fetch_vendor_assets()
+    monkeypatch.setattr(assets, "TAILWIND_BIN", "")
+    assert assets.tailwind_bin() == str(vendor_dir / "bin" / "tailwindcss-linux-x64")
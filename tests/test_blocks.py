@@ -0,0 +1,80 @@
+import json
+
+from backend import blocks, models
+from backend.generator import run_build
+
+
+def _page_id(client, site_id, slug):
+    return next(page["id"] for page in client.get(f"/api/pages?site_id={site_id}").json() if page["slug"] == slug)
+
+
+def _blocks(client, page_id):
+    response = client.get(f"/api/pages/{page_id}/blocks")
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_block_endpoints_add_patch_move_and_delete(client, site):
+    site_id, _ = site
+    page_id = _page_id(client, site_id, "home")
+    added = client.post(f"/api/pages/{page_id}/blocks",
+                        json={"id": "t", "type": "text", "data": {"content": "One", "align": "left"}, "position": 0})
+    assert added.status_code == 200, added.text
+    assert [(b["id"], b["position"]) for b in _blocks(client, page_id)] == [("t", 0), ("h", 1)]
+    assert client.post(f"/api/pages/{page_id}/blocks", json={"id": "t", "type": "text"}).status_code == 409
+
+    patched = client.patch(f"/api/pages/{page_id}/blocks/t", json={"data": {"content": "Two", "align": None}})
+    assert patched.json()["data"] == {"content": "Two"}
+    assert patched.json()["hash"] == blocks.block_hash("text", {"content": "Two"}) != added.json()["hash"]
+
+    client.patch(f"/api/pages/{page_id}/blocks/t", json={"position": 5})
+    assert [(b["id"], b["position"]) for b in _blocks(client, page_id)] == [("h", 0), ("t", 1)]
+
+    assert client.delete(f"/api/pages/{page_id}/blocks/h").status_code == 200
+    assert [(b["id"], b["position"]) for b in _blocks(client, page_id)] == [("t", 0)]
+    assert client.patch(f"/api/pages/{page_id}/blocks/h", json={"data": {}}).status_code == 404
+
+
+def test_saving_a_page_keeps_unchanged_block_rows(db, client, site):
+    site_id, _ = site
+    page_id = _page_id(client, site_id, "about")
+    client.post(f"/api/pages/{page_id}/blocks", json={"id": "c", "type": "cta", "data": {"text": "Go"}})
+    before = {row.key: row.id for row in db.get(models.Content, page_id).block_rows}
+
+    client.put(f"/api/pages/{page_id}", json={"title": "About", "is_published": True, "blocks": [
+        {"id": "c", "type": "cta", "data": {"text": "Go"}},
+        {"id": "h", "type": "hero", "data": {"headline": "Edited"}}]})
+    db.expire_all()
+    rows = sorted(db.get(models.Content, page_id).block_rows, key=lambda row: row.position)
+    assert [(row.key, row.position) for row in rows] == [("c", 0), ("h", 1)]
+    assert {row.key: row.id for row in rows} == before
+    assert json.loads(rows[1].data) == {"headline": "Edited"}
+
+
+def test_pages_are_found_by_block_type(client, site):
+    site_id, _ = site
+    page_id = _page_id(client, site_id, "about")
+    client.post(f"/api/pages/{page_id}/blocks", json={"id": "s", "type": "slider", "data": {"slides": []}})
+    found = client.get(f"/api/blocks?type=slider&site_id={site_id}").json()
+    assert [(b["page_slug"], b["id"]) for b in found] == [("about", "s")]
+    assert len(client.get(f"/api/blocks?type=hero&site_id={site_id}").json()) == 2
+
+
+def test_legacy_json_blocks_are_migrated(db, site_id):
+    page = models.Content(site_id=site_id, title="Legacy", slug="legacy", legacy_blocks=json.dumps([
+        {"id": "a", "type": "text", "data": {"content": "Old"}}, {"broken": True}]))
+    db.add(page)
+    db.commit()
+    assert blocks.migrate_legacy_blocks(db) >= 1
+    db.refresh(page)
+    assert page.legacy_blocks == "[]"
+    assert [(row.key, row.type) for row in page.block_rows] == [("a", "text")]
+    assert blocks.load_blocks(db, [page.id])[page.id][0]["data"] == {"content": "Old"}
+
+
+def test_block_patch_rebuilds_only_its_page(client, db, site):
+    site_id, _ = site
+    run_build(db, site_id=site_id, workers=1)
+    page_id = _page_id(client, site_id, "home")
+    client.patch(f"/api/pages/{page_id}/blocks/h", json={"data": {"headline": "Patched"}})
+    assert run_build(db, site_id=site_id, workers=1)["rebuilt"] == ["home"]
@@ -0,0 +1,38 @@
+import os
+
+from backend.generator import run_build
+from backend.releases import list_releases
+
+
+def _read(output_dir: str, name: str) -> str:
+    with open(os.path.join(output_dir, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_second_build_is_a_no_op(db, site):
+    site_id, output_dir = site
+    first = run_build(db, site_id=site_id, workers=1)
+    assert sorted(first["rebuilt"]) == ["about", "home"]
+    assert os.path.exists(os.path.join(output_dir, "index.html"))
+    pages = {name: os.stat(os.path.join(output_dir, name)).st_ino for name in ("home.html", "about.html")}
+
+    second = run_build(db, site_id=site_id, workers=1)
+    assert second["rebuilt"] == [] and second["deleted"] == []
+    assert second["unchanged"] == 2
+    # The live release stays in place and no new one is kept
+    assert second["release"] == first["release"]
+    assert list_releases(output_dir)[-1] == first["release"]
+    assert {name: os.stat(os.path.join(output_dir, name)).st_ino for name in pages} == pages
+
+
+def test_edit_rebuilds_only_that_page(client, db, site):
+    site_id, output_dir = site
+    run_build(db, site_id=site_id, workers=1)
+    about = next(page for page in client.get(f"/api/pages?site_id={site_id}").json() if page["slug"] == "about")
+    client.put(f"/api/pages/{about['id']}", json={
+        "title": "About", "is_published": True,
+        "blocks": [{"id": "h", "type": "hero", "data": {"headline": "New headline"}}]})
+
+    report = run_build(db, site_id=site_id, workers=1)
+    assert report["rebuilt"] == ["about"]
+    assert "New headline" in _read(output_dir, "about.html")
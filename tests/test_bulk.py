@@ -0,0 +1,78 @@
+import io
+import json
+import zipfile
+
+from backend import bulk, models
+from backend.database import SessionLocal
+
+
+def _ndjson(*records) -> bytes:
+    return b"".join(json.dumps(record).encode() + b"\n" for record in records)
+
+
+def _pages(client, site_id):
+    return {page["slug"]: page for page in client.get(f"/api/pages?site_id={site_id}").json()}
+
+
+def test_import_reports_bad_lines_and_keeps_the_rest(client, site_id):
+    body = _ndjson({"title": "One", "blocks": [{"id": "h", "type": "hero", "data": {"headline": "Hi"}}]},
+                   {"title": "Two", "slug": "one"}) + b"{not json\n\n" + _ndjson({"slug": "no-title"})
+    response = client.post(f"/api/pages/bulk?site_id={site_id}", content=body)
+    report = response.json()
+    assert report["created"] == 2 and report["failed"] == 2
+    assert [error["source"] for error in report["errors"]] == ["line 3", "line 5"]
+    # A taken slug gets a suffix instead of failing the line
+    assert sorted(_pages(client, site_id)) == ["one", "one-2"]
+
+
+def test_export_round_trips_into_another_site(client, site_id):
+    client.post(f"/api/pages/bulk?site_id={site_id}", content=_ndjson(
+        {"title": "Home", "is_published": True, "is_homepage": True, "meta_description": "Welcome",
+         "blocks": [{"id": "h", "type": "hero", "data": {"headline": "Hi"}}]},
+        {"title": "Draft", "publish_at": "2030-01-01T09:00:00"}))
+    exported = client.get(f"/api/pages/bulk?site_id={site_id}")
+    assert exported.headers["content-type"].startswith(bulk.NDJSON_MEDIA_TYPE)
+    lines = [json.loads(line) for line in exported.text.splitlines()]
+    assert [line["slug"] for line in lines] == ["home", "draft"]
+    assert lines[0]["blocks"] == [{"id": "h", "type": "hero", "data": {"headline": "Hi"}}]
+    published = client.get(f"/api/pages/bulk?site_id={site_id}&published=true").text.splitlines()
+    assert [json.loads(line)["slug"] for line in published] == ["home"]
+
+    other = client.post("/api/sites", json={"name": f"Copy of {site_id}"}).json()["id"]
+    assert client.post(f"/api/pages/bulk?site_id={other}", content=exported.content).json()["created"] == 2
+    assert client.get(f"/api/pages/bulk?site_id={other}").text == exported.text
+
+
+def test_imports_are_inserted_in_batches(site_id):
+    importer = bulk.BulkImporter(SessionLocal, batch_size=2, site_id=site_id)
+    for number in range(5):
+        importer.add({"title": f"Batch {number}"}, f"record {number}")
+        if importer.needs_flush():
+            importer.flush()
+            assert importer.batch == []
+    report = importer.finish()
+    assert report["created"] == 5 and len(report["ids"]) == 5
+
+
+def test_export_reads_in_batches(client, site_id):
+    client.post(f"/api/pages/bulk?site_id={site_id}", content=_ndjson(*({"title": f"P{n}"} for n in range(5))))
+    chunks = list(bulk.export_ndjson(SessionLocal, batch_size=2, site_id=site_id))
+    assert [chunk.count(b"\n") for chunk in chunks] == [2, 2, 1]
+
+
+def test_zip_import(client, db, site_id):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("a.json", json.dumps({"title": "Single"}))
+        z.writestr("b.json", json.dumps([{"title": "Listed"}, {"blocks": "bad"}]))
+        z.writestr("c.ndjson", _ndjson({"title": "Lined"}))
+        z.writestr("d.json", "{broken")
+    response = client.post(f"/api/pages/bulk/zip?site_id={site_id}",
+                           files={"file": ("pages.zip", archive.getvalue(), "application/zip")})
+    report = response.json()
+    assert report["created"] == 3
+    assert sorted(error["source"] for error in report["errors"]) == ["b.json[1]", "d.json"]
+    assert db.query(models.Content).filter(models.Content.site_id == site_id).count() == 3
+
+    bad = client.post(f"/api/pages/bulk/zip?site_id={site_id}", files={"file": ("x.zip", b"nope", "application/zip")})
+    assert bad.status_code == 400
@@ -0,0 +1,99 @@
+import asyncio
+
+from starlette.requests import Request
+
+from backend.cache import ResponseCache
+
+
+def _request(path="/api/things", query=b"", headers=()):
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query,
+                    "headers": [(name.encode(), value.encode()) for name, value in headers]})
+
+
+def test_stats_answer_if_none_match_with_304(client, site_id):
+    url = f"/api/dashboard/stats?site_id={site_id}"
+    first = client.get(url)
+    assert first.json() == {"pages": 0, "published_pages": 0, "menus": 0}
+    etag = first.headers["etag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": f'W/{etag}, "other"'}).status_code == 304
+
+
+def test_page_writes_invalidate_stats_and_the_page(client, site_id):
+    url = f"/api/dashboard/stats?site_id={site_id}"
+    etag = client.get(url).headers["etag"]
+    page = client.post(f"/api/pages?site_id={site_id}", json={"title": "Cached", "is_published": True}).json()
+    stats = client.get(url, headers={"If-None-Match": etag})
+    assert stats.status_code == 200 and stats.json()["published_pages"] == 1
+
+    page_etag = client.get(f"/api/pages/{page['id']}").headers["etag"]
+    client.put(f"/api/pages/{page['id']}", json={"title": "Cached", "meta_description": "Changed",
+                                                 "is_published": True})
+    changed = client.get(f"/api/pages/{page['id']}", headers={"If-None-Match": page_etag})
+    assert changed.status_code == 200 and changed.json()["meta_description"] == "Changed"
+
+
+def test_menu_and_settings_writes_invalidate(client, site_id):
+    menus = client.get(f"/api/menus?site_id={site_id}")
+    assert menus.json() == []
+    menu = client.post(f"/api/menus?site_id={site_id}", json={"title": "Main", "items": []}).json()
+    assert [m["id"] for m in client.get(f"/api/menus?site_id={site_id}").json()] == [menu["id"]]
+    client.put(f"/api/menus/{menu['id']}", json={"title": "Renamed", "items": []})
+    assert client.get(f"/api/menus?site_id={site_id}").json()[0]["title"] == "Renamed"
+    assert client.get(f"/api/dashboard/stats?site_id={site_id}").json()["menus"] == 1
+
+    assert client.get(f"/api/settings?site_id={site_id}").json()["brand_primary"] == "#3b82f6"
+    client.put(f"/api/settings?site_id={site_id}", json={"brand_primary": "#000000", "brand_hover": "#111111"})
+    assert client.get(f"/api/settings?site_id={site_id}").json()["brand_primary"] == "#000000"
+
+
+def test_entries_are_shared_only_by_identical_queries():
+    cache = ResponseCache()
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        return {"n": len(calls)}
+
+    async def run():
+        await cache.respond(_request(query=b"a=1&b=2"), ("things",), produce)
+        await cache.respond(_request(query=b"b=2&a=1"), ("things",), produce)
+        await cache.respond(_request(query=b"a=2"), ("things",), produce)
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_response_built_during_a_write_is_not_kept():
+    cache = ResponseCache()
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        if len(calls) == 1:
+            # A write handler invalidates while this response is being built
+            cache.invalidate("things")
+        return {"n": len(calls)}
+
+    async def run():
+        first = await cache.respond(_request(), ("things",), produce)
+        second = await cache.respond(_request(), ("things",), produce)
+        third = await cache.respond(_request(), ("things",), produce)
+        return first, second, third
+    first, second, third = asyncio.run(run())
+    assert len(calls) == 2
+    assert first.headers["etag"] != second.headers["etag"] == third.headers["etag"]
+
+
+def test_entries_expire_after_the_ttl():
+    cache = ResponseCache(ttl=-1)
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        return []
+
+    async def run():
+        await cache.respond(_request(), ("things",), produce)
+        await cache.respond(_request(), ("things",), produce)
+    asyncio.run(run())
+    assert len(calls) == 2
@@ -0,0 +1,82 @@
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import compress
+from backend.compress import load_asset_manifest, precompress
+from backend.static import IMMUTABLE_CACHE, PrecompressedStaticFiles
+
+PAGE = b"<!DOCTYPE html><html><body>" + b"<p>Hello, compressed world.</p>" * 200 + b"</body></html>"
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "page.html").write_bytes(PAGE)
+    (tmp_path / "assets" / "site.0123456789ab.css").write_bytes(b"body{color:red}" * 100)
+    (tmp_path / "photo.png").write_bytes(b"\x89PNG not text")
+    return tmp_path
+
+
+def test_text_files_get_compressed_siblings(tree):
+    result = precompress(str(tree))
+    assert sorted(result["compressed"]) == ["assets/site.0123456789ab.css", "page.html"]
+    assert gzip.decompress((tree / "page.html.gz").read_bytes()) == PAGE
+    if compress.brotli is not None:
+        assert compress.brotli.decompress((tree / "page.html.br").read_bytes()) == PAGE
+    assert not (tree / "photo.png.gz").exists()
+    entry = load_asset_manifest(str(tree))["page.html"]
+    assert entry["size"] == len(PAGE) and entry["gzip"] == (tree / "page.html.gz").stat().st_size
+
+
+def test_unchanged_files_are_not_compressed_again(tree):
+    precompress(str(tree))
+    assert precompress(str(tree))["compressed"] == []
+    (tree / "page.html").write_bytes(PAGE + b"<!-- edit -->")
+    assert precompress(str(tree))["compressed"] == ["page.html"]
+
+
+def test_siblings_of_removed_files_are_removed(tree):
+    precompress(str(tree))
+    os.remove(tree / "page.html")
+    precompress(str(tree))
+    assert not (tree / "page.html.gz").exists()
+    assert "page.html" not in load_asset_manifest(str(tree))
+
+
+@pytest.fixture
+def http(tree):
+    precompress(str(tree))
+    app = FastAPI()
+    app.mount("/site", PrecompressedStaticFiles(directory=str(tree)), name="site")
+    return TestClient(app)
+
+
+def test_serves_the_precompressed_variant_with_etag(http, tree):
+    response = http.get("/site/page.html", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.content == PAGE
+    etag = response.headers["etag"]
+
+    plain = http.get("/site/page.html", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] != etag
+
+    cached = http.get("/site/page.html", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert cached.status_code == 304
+
+
+def test_fingerprinted_files_are_immutable(http):
+    response = http.get("/site/assets/site.0123456789ab.css", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE
+
+
+def test_build_bookkeeping_is_not_served(http):
+    assert http.get(f"/site/{compress.ASSET_MANIFEST_FILE}").status_code == 404
@@ -0,0 +1,77 @@
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from backend import fragments
+from backend.fragments import FragmentCache
+from backend.generator import load_site_context, render_page
+from backend.templating import TemplateRegistry
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = FragmentCache(max_entries=2, directory="")
+    cache.put("a", "<p>a</p>")
+    cache.put("b", "<p>b</p>")
+    assert cache.get("a") == ("<p>a</p>", "memory")
+    cache.put("c", "<p>c</p>")
+    assert cache.get("b") == (None, None)
+    assert cache.get("a")[1] == cache.get("c")[1] == "memory"
+
+
+def test_disk_tier_outlives_the_process_cache(tmp_path):
+    FragmentCache(directory=str(tmp_path)).put("ab12", "<p>kept</p>")
+    fresh = FragmentCache(directory=str(tmp_path))
+    assert fresh.get("ab12") == ("<p>kept</p>", "disk")
+    assert fresh.get("ab12") == ("<p>kept</p>", "memory")
+
+
+def test_prune_removes_unused_disk_entries(tmp_path):
+    cache = FragmentCache(directory=str(tmp_path))
+    cache.put("old1", "old")
+    cache.put("new1", "new")
+    stale = time.time() - 30 * 86400
+    os.utime(cache._path("old1"), (stale, stale))
+    assert cache.prune(max_age_days=14, force=True) == 1
+    assert not os.path.exists(cache._path("old1")) and os.path.exists(cache._path("new1"))
+
+
+@pytest.fixture
+def render(db, site_id, monkeypatch):
+    monkeypatch.setattr(fragments, "_cache", FragmentCache(directory=""))
+    templates = TemplateRegistry(cache_dir=None)
+    site = load_site_context(db, site_id)
+
+    def render(blocks, slug="page"):
+        stats = {"blocks": [], "errors": [], "fragments": {"memory": 0, "disk": 0, "miss": 0}}
+        page = {"slug": slug, "title": slug, "meta_description": None, "body": None,
+                "created_at": datetime(2024, 1, 1), "blocks": blocks, "media": {}}
+        return render_page(templates, page, site, stats), stats["fragments"]
+    return render
+
+
+def test_identical_blocks_render_once(render):
+    cta = {"id": "c", "type": "cta", "data": {"headline": "Sign up today"}}
+    first, first_stats = render([cta], "one")
+    second, second_stats = render([dict(cta, id="other")], "two")
+    assert first_stats["miss"] == 1 and second_stats == {"memory": 1, "disk": 0, "miss": 0}
+    assert "Sign up today" in second
+
+
+def test_changed_data_misses(render):
+    render([{"id": "c", "type": "cta", "data": {"headline": "Before"}}])
+    html, stats = render([{"id": "c", "type": "cta", "data": {"headline": "After"}}])
+    assert stats["miss"] == 1 and "After" in html
+
+
+def test_blocks_using_block_id_are_cached_per_position(render):
+    slider = {"id": "s", "type": "slider", "data": {"slides": []}}
+    text = {"id": "t", "type": "text", "data": {"content": "Intro"}}
+    render([slider])
+    html, stats = render([text, slider])
+    # The text block is new; the slider moved to block-1, so it can't reuse block-0's HTML
+    assert stats == {"memory": 0, "disk": 0, "miss": 2}
+    assert "new Swiper('.block-1'" in html and "block-0'" not in html
+    _, again = render([text, slider])
+    assert again == {"memory": 2, "disk": 0, "miss": 0}
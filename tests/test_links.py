@@ -0,0 +1,57 @@
+from backend.generator import run_build
+from backend.links import check_links, extract_links, file_checker, link_target
+from backend.media import UPLOADS_URL
+
+
+def test_extract_links_reduces_urls_to_site_files():
+    page = (f'<a href="/about.html#team">About</a><a href=\'./contact.html?x=1\'>C</a>'
+            f'<img src="{UPLOADS_URL}/ab/abc.jpg" srcset="a-480.webp 480w, a-960.webp 960w">'
+            '<a href="https://example.com/">Out</a><a href="#top">Top</a><a href="mailto:a@b.test">Mail</a>'
+            '<div data-href="ignored.html" data-src="ignored.png"></div><a href="my%20page.html">Space</a>')
+    assert extract_links(page) == ["a-480.webp", "a-960.webp", "about.html", "contact.html", "my page.html",
+                                   "uploads/ab/abc.jpg"]
+    assert link_target("//cdn.test/x.js") is None
+    assert link_target("/") is None
+
+
+def test_check_links_reports_dead_redirected_and_orphans():
+    report = check_links(
+        {"home": ["about.html", "index.html", "missing.html", "logo.png"],
+         "about": ["index.html", "old-news.html", "gone.png"],
+         "news": [], "lonely": ["about.html"]},
+        "home", {"old-news.html": "news.html"}, lambda target: target == "logo.png")
+    assert report["dead"] == [{"page": "about", "target": "gone.png"}, {"page": "home", "target": "missing.html"}]
+    assert report["redirected"] == [{"page": "about", "target": "old-news.html", "to": "news.html"}]
+    assert report["orphans"] == ["lonely"]
+    assert report["links"] == 5 and report["pages"] == 4
+
+
+def test_index_is_not_dead_without_a_homepage():
+    report = check_links({"a": ["index.html"], "b": ["a.html"]}, None, {}, lambda target: False)
+    assert report["dead_count"] == 0 and report["orphans"] == ["b"]
+
+
+def test_file_checker_stays_inside_the_site(tmp_path):
+    (tmp_path / "site").mkdir()
+    (tmp_path / "site" / "style.css").write_text("")
+    (tmp_path / "secret.txt").write_text("")
+    (tmp_path / "uploads").mkdir()
+    (tmp_path / "uploads" / "photo.jpg").write_text("")
+    exists = file_checker(str(tmp_path / "site"), str(tmp_path / "uploads"), extra=["sitemap.xml"])
+    assert exists("style.css") and exists("uploads/photo.jpg") and exists("sitemap.xml")
+    assert not exists("../secret.txt") and not exists("uploads/../secret.txt") and not exists("missing.css")
+
+
+def test_build_reports_links_and_follows_renames(client, db, site):
+    site_id, _ = site
+    pages = {page["slug"]: page for page in client.get(f"/api/pages?site_id={site_id}").json()}
+    client.put(f"/api/pages/{pages['home']['id']}", json={"title": "Home", "is_published": True, "blocks": [
+        {"id": "t", "type": "text", "data": {"content": '<a href="about.html">About</a> <a href="nope.html">x</a>'}}]})
+    report = run_build(db, site_id=site_id, workers=1)["links"]
+    assert report["dead"] == [{"page": "home", "target": "nope.html"}]
+    assert report["orphans"] == []
+
+    client.put(f"/api/pages/{pages['about']['id']}", json={"title": "About us", "is_published": True})
+    report = run_build(db, site_id=site_id, workers=1)["links"]
+    assert report["redirected"] == [{"page": "home", "target": "about.html", "to": "about-us.html"}]
+    assert report["dead_count"] == 1
@@ -0,0 +1,65 @@
+import io
+import os
+
+import pytest
+
+from backend import media
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 64
+
+
+def _bytes(prefix: bytes = b"") -> bytes:
+    # Uploads are shared by the whole run, so every test stores its own bytes
+    return prefix + os.urandom(32)
+
+
+def test_same_bytes_are_stored_once(tmp_path):
+    data = _bytes()
+    first = media.store_stream(io.BytesIO(data), "notes.txt", str(tmp_path))
+    second = media.store_stream(io.BytesIO(data), "copy.txt", str(tmp_path))
+    assert first["created"] and not second["created"]
+    assert second["relative"] == first["relative"] == f"{first['sha256'][:2]}/{first['sha256']}.txt"
+    assert open(first["path"], "rb").read() == data
+    assert sorted(os.listdir(tmp_path)) == [first["sha256"][:2]]
+
+
+def test_images_are_stored_under_their_detected_extension(tmp_path):
+    data = _bytes(JPEG)
+    first = media.store_stream(io.BytesIO(data), "photo.JPEG", str(tmp_path))
+    second = media.store_stream(io.BytesIO(data), "photo.jpg", str(tmp_path))
+    assert first["relative"].endswith(".jpg")
+    assert not second["created"] and second["relative"] == first["relative"]
+
+
+def test_other_extension_reuses_the_stored_file(tmp_path):
+    data = _bytes()
+    first = media.store_stream(io.BytesIO(data), "report.pdf", str(tmp_path))
+    second = media.store_stream(io.BytesIO(data), "report.bin", str(tmp_path))
+    assert not second["created"] and second["relative"] == first["relative"]
+
+
+def test_oversized_upload_leaves_nothing_behind(tmp_path):
+    with pytest.raises(media.UploadTooLarge):
+        media.store_stream(io.BytesIO(b"x" * 10), "big.txt", str(tmp_path), max_bytes=4)
+    assert os.listdir(tmp_path) == []
+
+
+def test_upload_is_registered_once_per_site(client, site_id):
+    data = _bytes()
+
+    def upload(name, site):
+        response = client.post(f"/api/upload?site_id={site}", files={"file": (name, data, "text/plain")})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    first = upload("a.txt", site_id)
+    again = upload("b.txt", site_id)
+    assert not first["deduplicated"] and again["deduplicated"]
+    assert again["id"] == first["id"] and again["url"] == first["url"]
+    listed = client.get(f"/api/media?site_id={site_id}").json()
+    assert [item["id"] for item in listed] == [first["id"]]
+
+    other_site = client.post("/api/sites", json={"name": f"Other {first['sha256'][:8]}"}).json()["id"]
+    elsewhere = upload("c.txt", other_site)
+    assert elsewhere["deduplicated"] and elsewhere["id"] != first["id"]
+    assert elsewhere["url"] == first["url"]
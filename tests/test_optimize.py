@@ -0,0 +1,69 @@
+import os
+
+from backend.generator import run_build
+from backend.optimize import FOLD_MARKER, minify_css, minify_html, optimize_page
+
+ASSETS = {"css": "assets/site.0123abcd.css", "swiper_js": "https://cdn.test/swiper.js",
+          "swiper_css": "https://cdn.test/swiper.css", "tailwind_cdn": "https://cdn.test/tailwind.js"}
+
+
+def _page(first_block: str, rest: str) -> str:
+    return ("<html><head>"
+            f'<link rel="stylesheet" href="{ASSETS["css"]}"><link rel="stylesheet" href="{ASSETS["swiper_css"]}">'
+            f'<script src="{ASSETS["tailwind_cdn"]}"></script><script src="{ASSETS["swiper_js"]}"></script>'
+            f'<script src="app.js"></script></head><body><header><img src="logo.png"></header>'
+            f"<main>{first_block}{FOLD_MARKER}{rest}</main><script>init();</script></body></html>")
+
+
+def test_minify_keeps_raw_elements():
+    html = "<div>\n   <p>a    b</p>  <!-- note -->\n</div><pre>  keep\n  this </pre><style>a { color : red ; }</style>"
+    assert minify_html(html) == "<div>\n<p>a b</p>\n</div><pre>  keep\n  this </pre><style>a{color:red}</style>"
+    assert minify_css("/* x */ .a , .b > p { margin : 0 ; }") == ".a,.b>p{margin:0}"
+
+
+def test_images_scripts_and_unused_swiper(tmp_path):
+    html, info = optimize_page(_page('<img src="hero.jpg">', '<img src="below.jpg">'), ASSETS, str(tmp_path),
+                               {"below.jpg": [640, 480]})
+    assert '<img src="logo.png" decoding="async">' in html
+    assert '<img src="hero.jpg" decoding="async" fetchpriority="high">' in html
+    assert '<img src="below.jpg" decoding="async" loading="lazy" width="640" height="480">' in html
+    assert info["lazy_images"] == 1
+    assert '<script src="app.js" defer></script>' in html
+    assert f'<script src="{ASSETS["tailwind_cdn"]}"></script>' in html
+    assert "swiper" not in html and sorted(info["dropped"]) == sorted([ASSETS["swiper_js"], ASSETS["swiper_css"]])
+    assert "addEventListener('DOMContentLoaded', function () {init();})" in html
+    assert FOLD_MARKER not in html
+
+
+def test_swiper_is_kept_for_sliders(tmp_path):
+    html, info = optimize_page(_page('<div class="swiper block-0"></div>', ""), ASSETS, str(tmp_path))
+    assert info["dropped"] == [] and f'src="{ASSETS["swiper_js"]}" defer' in html
+
+
+def test_critical_css_is_inlined(tmp_path):
+    css = tmp_path / ASSETS["css"]
+    css.parent.mkdir()
+    css.write_text("body{margin:0}.hero{color:red}.footer{color:blue}@media (min-width:640px){.hero{color:green}}")
+    html, info = optimize_page(_page('<div class="hero"></div>', '<div class="footer"></div>'), ASSETS,
+                               str(tmp_path))
+    assert "<style>body{margin:0}.hero{color:red}@media (min-width:640px){.hero{color:green}}</style>" in html
+    assert f'<link rel="preload" href="{ASSETS["css"]}" as="style"' in html
+    assert info["critical_css"] > 0
+
+
+def test_optimized_build_rebuilds_and_shrinks_pages(db, site):
+    site_id, output_dir = site
+    plain = run_build(db, site_id=site_id, workers=1, optimize=False)
+    assert "optimize" not in plain
+    with open(os.path.join(output_dir, "home.html"), encoding="utf-8") as f:
+        assert FOLD_MARKER not in f.read()
+
+    report = run_build(db, site_id=site_id, workers=1, optimize=True)
+    # Turning the pass on changes every page
+    assert sorted(report["rebuilt"]) == ["about", "home"]
+    assert report["optimize"]["pages"] == 2
+    assert report["optimize"]["bytes_after"] < report["optimize"]["bytes_before"]
+    with open(os.path.join(output_dir, "home.html"), encoding="utf-8") as f:
+        html = f.read()
+    assert FOLD_MARKER not in html and "  " not in html.split("<script", 1)[0]
+    assert run_build(db, site_id=site_id, workers=1, optimize=True)["rebuilt"] == []
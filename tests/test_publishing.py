@@ -0,0 +1,69 @@
+from datetime import datetime
+
+from backend import models
+from backend.database import SessionLocal
+from backend.publishing import PublishScheduler, apply_due, next_due
+
+# Far in the past, so nothing else in the run is due before these
+JAN_1 = datetime(1990, 1, 1, 9, 0)
+JAN_2 = datetime(1990, 1, 2, 9, 0)
+
+
+def _create(client, site_id, title, **fields):
+    response = client.post(f"/api/pages?site_id={site_id}", json={"title": title, **fields})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_schedule_is_validated_and_stored_as_utc(client, site_id):
+    bad = client.post(f"/api/pages?site_id={site_id}", json={
+        "title": "Backwards", "publish_at": "2030-01-02T00:00:00", "unpublish_at": "2030-01-01T00:00:00"})
+    assert bad.status_code == 422
+    page = _create(client, site_id, "Offset", publish_at="2030-01-01T10:00:00+02:00")
+    assert page["publish_at"] == "2030-01-01T08:00:00"
+
+
+def test_scheduled_changes_are_listed_soonest_first(client, site_id):
+    launch = _create(client, site_id, "Launch", publish_at="2030-03-01T00:00:00",
+                     unpublish_at="2030-04-01T00:00:00")
+    promo = _create(client, site_id, "Promo", is_published=True, unpublish_at="2030-02-01T00:00:00")
+    _create(client, site_id, "Plain")
+    listed = client.get(f"/api/pages/scheduled?site_id={site_id}").json()
+    assert [(item["page_id"], item["action"]) for item in listed] == [
+        (promo["id"], "unpublish"), (launch["id"], "publish"), (launch["id"], "unpublish")]
+
+
+def test_saving_without_schedule_fields_keeps_the_schedule(client, site_id):
+    page = _create(client, site_id, "Kept", publish_at="2030-03-01T00:00:00")
+    client.put(f"/api/pages/{page['id']}", json={"title": "Kept", "body": "edited"})
+    assert client.get(f"/api/pages/{page['id']}").json()["publish_at"] == "2030-03-01T00:00:00"
+    client.put(f"/api/pages/{page['id']}", json={"title": "Kept", "publish_at": None})
+    assert client.get(f"/api/pages/{page['id']}").json()["publish_at"] is None
+
+
+def test_apply_due_publishes_unpublishes_and_clears(client, db, site_id):
+    going_live = _create(client, site_id, "Going live", publish_at=JAN_1.isoformat())
+    ending = _create(client, site_id, "Ending", is_published=True, unpublish_at=JAN_1.isoformat())
+    brief = _create(client, site_id, "Brief", publish_at=JAN_1.isoformat(), unpublish_at=JAN_2.isoformat())
+    later = _create(client, site_id, "Later", publish_at="2030-01-01T00:00:00")
+    assert next_due(db) == JAN_1
+
+    changes = apply_due(db, now=JAN_2)[site_id]
+    assert sorted(changes) == sorted([(going_live["id"], "going-live", "publish"),
+                                      (ending["id"], "ending", "unpublish"),
+                                      (brief["id"], "brief", "publish"), (brief["id"], "brief", "unpublish")])
+    state = {page.id: page for page in db.query(models.Content).filter(models.Content.site_id == site_id)}
+    assert state[going_live["id"]].is_published and state[going_live["id"]].publish_at is None
+    assert not state[ending["id"]].is_published and state[ending["id"]].unpublish_at is None
+    # Due for both: the later change wins
+    assert not state[brief["id"]].is_published
+    assert not state[later["id"]].is_published and state[later["id"]].publish_at is not None
+    assert site_id not in apply_due(db, now=JAN_2)
+
+
+def test_scheduler_hands_changes_to_the_build(client, site_id):
+    page = _create(client, site_id, "Scheduled", publish_at=JAN_1.isoformat())
+    calls = []
+    scheduler = PublishScheduler(SessionLocal, lambda site, pages: calls.append((site, pages)))
+    scheduler.run_due()
+    assert (site_id, [(page["id"], "scheduled", "publish")]) in calls
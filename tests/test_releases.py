@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from backend import releases
+from backend.releases import (activate_release, atomic_write, list_releases, prune_releases, rollback_release,
+                              stage_release, uploads_dir)
+
+
+def _publish(output_dir: str, text: str) -> str:
+    staging = stage_release(output_dir)
+    # Staged files are hard links to the live ones: replace, never rewrite in place
+    with atomic_write(os.path.join(staging, "index.html"), "w") as f:
+        f.write(text)
+    activate_release(output_dir, staging)
+    return os.path.basename(staging)
+
+
+def _read(output_dir: str, name: str) -> str:
+    with open(os.path.join(output_dir, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def _served(output_dir: str) -> str:
+    with open(os.path.join(output_dir, "index.html"), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_rollback_serves_previous_release(tmp_path):
+    output_dir = str(tmp_path / "output")
+    first = _publish(output_dir, "one")
+    _publish(output_dir, "two")
+    assert _served(output_dir) == "two"
+
+    assert rollback_release(output_dir) == first
+    assert _served(output_dir) == "one"
+    # Nothing older than the first release
+    assert rollback_release(output_dir) is None
+
+
+def test_prune_keeps_live_release(tmp_path):
+    output_dir = str(tmp_path / "output")
+    names = [_publish(output_dir, str(n)) for n in range(4)]
+    assert list_releases(output_dir) == names[-releases.KEEP_RELEASES:]
+    prune_releases(output_dir, keep=0)
+    assert list_releases(output_dir) == names[-1:]
+    assert _served(output_dir) == "3"
+
+
+def test_list_releases_skips_other_directories(tmp_path):
+    output_dir = str(tmp_path / "output")
+    name = _publish(output_dir, "one")
+    os.makedirs(os.path.join(releases.releases_dir_for(output_dir), "backup"))
+    names = list_releases(output_dir)
+    assert names[-1] == name and "backup" not in names
+    assert os.path.isdir(uploads_dir())
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="releases need symlinks")
+def test_legacy_output_dir_becomes_first_release(tmp_path):
+    output_dir = tmp_path / "output"
+    (output_dir / "uploads").mkdir(parents=True)
+    (output_dir / "index.html").write_text("legacy", encoding="utf-8")
+    (output_dir / "uploads" / "a.txt").write_text("file", encoding="utf-8")
+
+    _publish(str(output_dir), "new")
+    assert os.path.islink(output_dir)
+    assert (output_dir / "uploads" / "a.txt").read_text(encoding="utf-8") == "file"
+    assert rollback_release(str(output_dir)) is not None
+    assert _served(str(output_dir)) == "legacy"
+
+
+def test_rollback_restores_previous_build(client, db, site):
+    site_id, output_dir = site
+    assert client.post(f"/api/builds/rollback?site_id={site_id}").status_code == 409
+    first = client.post(f"/api/generate?site_id={site_id}").json()["report"]["release"]
+    home = next(page for page in client.get(f"/api/pages?site_id={site_id}").json() if page["slug"] == "home")
+    client.put(f"/api/pages/{home['id']}", json={
+        "title": "Home", "is_published": True,
+        "blocks": [{"id": "h", "type": "hero", "data": {"headline": "Second headline"}}]})
+    second = client.post(f"/api/generate?site_id={site_id}").json()["report"]["release"]
+    assert second != first
+    assert "Second headline" in _read(output_dir, "home.html")
+
+    response = client.post(f"/api/builds/rollback?site_id={site_id}")
+    assert response.status_code == 200, response.text
+    assert response.json()["release"] == first
+    assert "Home headline" in _read(output_dir, "home.html")
+    assert "Home headline" in _read(output_dir, "index.html")
@@ -0,0 +1,69 @@
+from backend import revisions
+
+
+def _save(client, page_id, site_id, **fields):
+    response = client.put(f"/api/pages/{page_id}?site_id={site_id}", json=fields)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_every_revision_is_reconstructed(client, db, site_id, monkeypatch):
+    # Short snapshot chains, so reconstruction crosses snapshots and diffs
+    monkeypatch.setattr(revisions, "REVISION_SNAPSHOT_INTERVAL", 3)
+    page = client.post(f"/api/pages?site_id={site_id}", json={
+        "title": "History", "body": "line 0",
+        "blocks": [{"id": "t", "type": "text", "data": {"content": "<p>v0</p>"}}]}).json()
+    saved = [page]
+    for n in range(1, 8):
+        saved.append(_save(client, page["id"], site_id, title="History" if n < 6 else "Renamed",
+                           body="\n".join(f"line {i}" for i in range(n + 1)),
+                           blocks=[{"id": "t", "type": "text", "data": {"content": f"<p>v{n}</p>"}}]))
+
+    listed = client.get(f"/api/pages/{page['id']}/revisions", params={"limit": 100}).json()["items"]
+    numbers = sorted(item["number"] for item in listed)
+    assert numbers == list(range(1, len(saved) + 1))
+    assert any(not item["is_snapshot"] for item in listed)
+    assert sum(item["is_snapshot"] for item in listed) > 1
+
+    for number, expected in zip(numbers, saved):
+        document = revisions.load_revision(db, page["id"], number)
+        assert document["title"] == expected["title"]
+        assert document["slug"] == expected["slug"]
+        assert document["body"] == expected["body"]
+        assert [block["data"] for block in document["blocks"]] == [block["data"] for block in expected["blocks"]]
+        response = client.get(f"/api/pages/{page['id']}/revisions/{number}")
+        assert response.status_code == 200
+        assert response.json()["body"] == expected["body"]
+
+    assert revisions.load_revision(db, page["id"], len(saved) + 1) is None
+
+
+def test_unchanged_save_adds_no_revision(client, site_id):
+    page = client.post(f"/api/pages?site_id={site_id}", json={"title": "Same", "body": "x"}).json()
+    _save(client, page["id"], site_id, title="Same", body="x")
+    listed = client.get(f"/api/pages/{page['id']}/revisions").json()["items"]
+    assert [item["number"] for item in listed] == [1]
+
+
+def test_restore_brings_back_old_content(client, site_id):
+    page = client.post(f"/api/pages?site_id={site_id}", json={"title": "Restore me", "body": "first"}).json()
+    _save(client, page["id"], site_id, title="Restore me", body="second")
+
+    response = client.post(f"/api/pages/{page['id']}/revisions/1/restore")
+    assert response.status_code == 200, response.text
+    assert response.json()["body"] == "first"
+    newest = client.get(f"/api/pages/{page['id']}/revisions").json()["items"][0]
+    assert newest["number"] == 3 and newest["restored_from"] == 1
+
+
+def test_compaction_keeps_newest_revisions_readable(client, db, site_id, monkeypatch):
+    monkeypatch.setattr(revisions, "REVISION_SNAPSHOT_INTERVAL", 4)
+    page = client.post(f"/api/pages?site_id={site_id}", json={"title": "Compact", "body": "0"}).json()
+    for n in range(1, 10):
+        _save(client, page["id"], site_id, title="Compact", body=str(n))
+
+    revisions.compact_revisions(db, [page["id"]], keep=3)
+    listed = client.get(f"/api/pages/{page['id']}/revisions").json()["items"]
+    assert [item["number"] for item in listed] == [10, 9, 8]
+    for number in (8, 9, 10):
+        assert revisions.load_revision(db, page["id"], number)["body"] == str(number - 1)
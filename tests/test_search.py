@@ -0,0 +1,67 @@
+import json
+import os
+
+from backend.generator import run_build
+from backend.search import SEARCH_INDEX_FILE, build_client_index, match_expression, normalize_words
+
+
+def _create(client, site_id, title, **fields):
+    response = client.post(f"/api/pages?site_id={site_id}", json={"title": title, **fields})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _search(client, site_id, q, **params):
+    response = client.get("/api/search", params={"q": q, "site_id": site_id, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_finds_block_text_by_prefix(client, site_id):
+    _create(client, site_id, "Pricing", blocks=[
+        {"id": "p", "type": "pricing", "data": {"plans": [{"name": "Starter", "ctaLink": "/signup-zebra"}]}}])
+    assert [r["slug"] for r in _search(client, site_id, "start")] == ["pricing"]
+    # Links are not indexed as text
+    assert _search(client, site_id, "zebra") == []
+
+
+def test_title_matches_rank_first_and_snippets_are_escaped(client, site_id):
+    _create(client, site_id, "Gardening tips", body="<p>Water daily.</p>")
+    _create(client, site_id, "Notes", body="<p>Some <b>gardening</b> & more</p>", is_published=True)
+    results = _search(client, site_id, "gardening")
+    assert [r["slug"] for r in results] == ["gardening-tips", "notes"]
+    assert "<mark>gardening</mark>" in results[1]["snippet"] and "&amp;" in results[1]["snippet"]
+    assert [r["slug"] for r in _search(client, site_id, "gardening", published="true")] == ["notes"]
+    # Other sites' pages are never returned
+    other = client.post("/api/sites", json={"name": f"Search {site_id}"}).json()["id"]
+    assert _search(client, other, "gardening") == []
+
+
+def test_edits_are_reindexed(client, site_id):
+    page = _create(client, site_id, "Changing", blocks=[{"id": "t", "type": "text", "data": {"content": "walrus"}}])
+    assert len(_search(client, site_id, "walrus")) == 1
+    client.patch(f"/api/pages/{page['id']}/blocks/t", json={"data": {"content": "narwhal"}})
+    assert _search(client, site_id, "walrus") == []
+    assert len(_search(client, site_id, "narwhal")) == 1
+
+
+def test_match_expression():
+    assert match_expression('say "hi" there') == '"say" "hi" "there"*'
+    assert match_expression("  -- ") is None
+
+
+def test_client_index_scores_title_above_body():
+    index = build_client_index([("a", "Café guide", "", "coffee beans"), ("b", "Beans", "", "cafe")])
+    assert index["pages"][0] == ["a.html", "Café guide", "coffee beans"]
+    # Without a description the start of the body stands in for it
+    assert index["terms"]["cafe"] == [0, 10, 1, 5]
+    assert normalize_words("Crème Brûlée a") == ["creme", "brulee"]
+
+
+def test_build_writes_the_client_index(db, site):
+    site_id, output_dir = site
+    run_build(db, site_id=site_id, workers=1)
+    with open(os.path.join(output_dir, SEARCH_INDEX_FILE), encoding="utf-8") as f:
+        index = json.load(f)
+    assert sorted(page[0] for page in index["pages"]) == ["about.html", "home.html"]
+    assert "headline" in index["terms"]
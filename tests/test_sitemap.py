@@ -0,0 +1,78 @@
+import gzip
+import os
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+from backend import sitemap
+from backend.sitemap import SITEMAP_FILE, write_sitemaps
+
+NS = {"s": sitemap.XMLNS}
+
+
+def _entries(count: int):
+    return [(f"/page-{n}.html", datetime(2026, 1, 1 + n % 28, 10, 0)) for n in range(count)]
+
+
+def _parse(path: str) -> ET.Element:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return ET.fromstring(f.read())
+
+
+def test_small_site_gets_one_urlset_with_lastmod(tmp_path):
+    result = write_sitemaps(str(tmp_path), _entries(3), site_url="https://example.test")
+    assert result["written"] == [SITEMAP_FILE]
+    root = _parse(str(tmp_path / SITEMAP_FILE))
+    assert root.tag == f"{{{sitemap.XMLNS}}}urlset"
+    urls = root.findall("s:url", NS)
+    assert [url.find("s:loc", NS).text for url in urls] == [f"https://example.test/page-{n}.html" for n in range(3)]
+    assert urls[2].find("s:lastmod", NS).text == "2026-01-03"
+
+
+def test_large_site_is_sharded_under_an_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(sitemap, "SITEMAP_MAX_URLS", 4)
+    result = write_sitemaps(str(tmp_path), _entries(10))
+    assert sorted(result["files"]) == ["sitemap-1.xml", "sitemap-2.xml", "sitemap-3.xml", SITEMAP_FILE]
+    index = _parse(str(tmp_path / SITEMAP_FILE))
+    assert index.tag == f"{{{sitemap.XMLNS}}}sitemapindex"
+    assert [entry.find("s:loc", NS).text for entry in index] == ["/sitemap-1.xml", "/sitemap-2.xml", "/sitemap-3.xml"]
+    # Each shard's lastmod is the newest of its URLs
+    assert index[0].find("s:lastmod", NS).text == "2026-01-04"
+    shard_urls = [len(_parse(str(tmp_path / f"sitemap-{n}.xml")).findall("s:url", NS)) for n in (1, 2, 3)]
+    assert shard_urls == [4, 4, 2]
+
+
+def test_unchanged_shards_are_not_rewritten(tmp_path, monkeypatch):
+    monkeypatch.setattr(sitemap, "SITEMAP_MAX_URLS", 4)
+    first = write_sitemaps(str(tmp_path), _entries(10))
+    entries = _entries(10)
+    entries[9] = ("/page-9.html", datetime(2026, 6, 1))
+    second = write_sitemaps(str(tmp_path), entries, previous=first["files"])
+    assert second["written"] == ["sitemap-3.xml", SITEMAP_FILE]
+
+    # Shrinking back to one file removes the shards
+    third = write_sitemaps(str(tmp_path), _entries(2), previous=second["files"])
+    assert sorted(third["removed"]) == ["sitemap-1.xml", "sitemap-2.xml", "sitemap-3.xml"]
+    assert not os.path.exists(tmp_path / "sitemap-1.xml")
+
+
+def test_compressed_shards(tmp_path):
+    result = write_sitemaps(str(tmp_path), _entries(3), compress=True)
+    assert sorted(result["files"]) == ["sitemap-1.xml.gz", SITEMAP_FILE]
+    assert len(_parse(str(tmp_path / "sitemap-1.xml.gz")).findall("s:url", NS)) == 3
+    # Identical content compresses to identical bytes, so nothing is rewritten
+    again = write_sitemaps(str(tmp_path), _entries(3), previous=result["files"], compress=True)
+    assert again["written"] == []
+
+
+def test_built_site_lists_published_pages_with_their_update_date(client, db, site):
+    from backend.generator import run_build
+    site_id, output_dir = site
+    draft = client.post(f"/api/pages?site_id={site_id}", json={"title": "Draft"})
+    assert draft.status_code == 200
+    run_build(db, site_id=site_id, workers=1)
+    urls = _parse(os.path.join(output_dir, SITEMAP_FILE)).findall("s:url", NS)
+    locs = sorted(url.find("s:loc", NS).text for url in urls)
+    assert locs == ["https://example.test/about.html", "https://example.test/home.html"]
+    today = datetime.now(timezone.utc).date().isoformat()
+    assert {url.find("s:lastmod", NS).text for url in urls} == {today}
@@ -0,0 +1,77 @@
+import io
+import os
+
+from backend import releases, sites
+from backend.generator import run_build
+from backend.releases import activate_release, atomic_write, list_releases, rollback_release, stage_release
+
+
+def _publish(output_dir: str, text: str) -> str:
+    staging = stage_release(output_dir)
+    with atomic_write(os.path.join(staging, "index.html"), "w") as f:
+        f.write(text)
+    activate_release(output_dir, staging)
+    return os.path.basename(staging)
+
+
+def _served(output_dir: str) -> str:
+    with open(os.path.join(output_dir, "index.html"), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_sites_keep_their_releases_apart(tmp_path, monkeypatch):
+    default_dir = str(tmp_path / "output")
+    site_dir = str(tmp_path / "sites" / "acme")
+    monkeypatch.setenv("RELEASES_DIR", str(tmp_path / "releases"))
+    monkeypatch.setattr(sites, "OUTPUT_DIR", default_dir)
+
+    site_first = _publish(site_dir, "acme one")
+    _publish(site_dir, "acme two")
+    default_first = _publish(default_dir, "default one")
+    for n in range(releases.KEEP_RELEASES + 1):
+        _publish(default_dir, f"default {n}")
+
+    assert releases.releases_dir_for(default_dir) == str(tmp_path / "releases")
+    assert releases.releases_dir_for(site_dir) != releases.releases_dir_for(default_dir)
+    # Pruning the default site left the other site's releases alone
+    assert _served(site_dir) == "acme two"
+    assert site_first in list_releases(site_dir)
+    assert default_first not in list_releases(default_dir)
+    assert not set(list_releases(site_dir)) & set(list_releases(default_dir))
+
+    # Rolling one site back never picks up the other's release
+    assert rollback_release(site_dir) == site_first
+    assert _served(site_dir) == "acme one"
+    assert _served(default_dir) == f"default {releases.KEEP_RELEASES}"
+
+
+def test_rollback_of_one_site_leaves_the_default_site_alone(client, db, site, tmp_path, monkeypatch):
+    from backend.sites import OUTPUT_DIR
+    site_id, output_dir = site
+    monkeypatch.setenv("RELEASES_DIR", str(tmp_path / "releases"))
+    for _ in range(3):
+        run_build(db, force=True, workers=1)
+    first = run_build(db, site_id=site_id, workers=1)["release"]
+    run_build(db, site_id=site_id, force=True, workers=1)
+    run_build(db, force=True, workers=1)
+    default_release = os.path.realpath(OUTPUT_DIR)
+
+    assert client.post(f"/api/builds/rollback?site_id={site_id}").json()["release"] == first
+    assert os.path.realpath(OUTPUT_DIR) == default_release
+    assert first not in list_releases(OUTPUT_DIR)
+    assert not set(list_releases(output_dir)) & set(list_releases(OUTPUT_DIR))
+
+
+def test_every_site_release_links_the_shared_uploads(client, db, site):
+    site_id, output_dir = site
+    upload = client.post(f"/api/upload?site_id={site_id}",
+                         files={"file": ("note.txt", io.BytesIO(b"shared"), "text/plain")})
+    assert upload.status_code == 200, upload.text
+    relative = upload.json()["url"].split("/uploads/", 1)[1]
+
+    run_build(db, site_id=site_id, workers=1)
+    run_build(db, workers=1)
+    for tree in (output_dir, sites.OUTPUT_DIR):
+        assert os.path.realpath(os.path.join(tree, "uploads")) == os.path.realpath(releases.uploads_dir())
+        with open(os.path.join(tree, "uploads", relative), "rb") as f:
+            assert f.read() == b"shared"